@@ -1,9 +1,12 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
 from django.utils.html import format_html
 
 from accounting import models
+from accounting.disbursement import generate_disbursement
 from utils.admin_filters import (
-    YearFilter, WeekNumberFilter
+    YearFilter, WeekNumberFilter, TotalFilter
 )
 from utils.excel import get_excel_response
 
@@ -14,8 +17,8 @@ class PayrollAdmin(admin.ModelAdmin):
         'agreement_name',
         'employee_name',
         'skip_payment',
-        'weekly_rate',
-        'daily_rate',
+        'snapshot_weekly_rate',
+        'snapshot_daily_rate',
         'thursday_assistance',
         'friday_assistance',
         'saturday_assistance',
@@ -23,26 +26,27 @@ class PayrollAdmin(admin.ModelAdmin):
         'monday_assistance',
         'tuesday_assistance',
         'wednesday_assistance',
-        'worked_days',
-        'no_attendance_days',
-        'no_attendance_penalty',
-        'penalties_amount',
-        'bonuses_amount',
-        'other_amount',
-        'extra_unpaid_hours_amount',
-        'subtotal',
-        'discount_amount',
+        'snapshot_worked_days',
+        'snapshot_no_attendance_days',
+        'snapshot_no_attendance_penalty',
+        'snapshot_penalties_amount',
+        'snapshot_bonuses_amount',
+        'snapshot_other_amount',
+        'snapshot_extra_unpaid_hours_amount',
+        'snapshot_subtotal',
+        'snapshot_discount_amount',
         'discount_loans',
         'location',
         'bank',
         'card_number',
-        'total',
+        'snapshot_total',
         'paid',
     )
     list_filter = (
         'weekly_assistance__service',
         WeekNumberFilter,
         YearFilter,
+        TotalFilter,
         'skip_payment'
     )
     list_editable = (
@@ -59,8 +63,14 @@ class PayrollAdmin(admin.ModelAdmin):
     readonly_fields = (
         'discount_loans',
     )
+    list_select_related = (
+        'weekly_assistance__service__agreement',
+        'weekly_assistance__service__employee',
+    )
     year_filter_field = "weekly_assistance__start_date"
     week_filter_field = "weekly_assistance__week_number"
+    week_key_filter_field = "weekly_assistance__week_key"
+    total_filter_field = "snapshot_total"
     
     # reusable methods
     def __get_boolean_icon__(self, value: bool):
@@ -121,6 +131,7 @@ class PayrollAdmin(admin.ModelAdmin):
     def export_excel(self, request, queryset):
         """ Export the selected payrolls to an excel file with custom styles """
         
+        queryset = queryset.select_related(*self.list_select_related)
         return get_excel_response(queryset, "Nómina Semana")
     
     export_excel.short_description = 'Exportar a Excel'
@@ -135,13 +146,14 @@ class PayrollSummaryAdmin(admin.ModelAdmin):
         'skip_payment',
         'bank',
         'card_number',
-        'total',
+        'snapshot_total',
         'paid',
     )
     list_filter = (
         'weekly_assistance__service',
         WeekNumberFilter,
         YearFilter,
+        TotalFilter,
         'skip_payment'
     )
     list_editable = (
@@ -155,5 +167,95 @@ class PayrollSummaryAdmin(admin.ModelAdmin):
     ordering = (
         'id',
     )
+    list_select_related = (
+        'weekly_assistance__service__agreement',
+        'weekly_assistance__service__employee',
+    )
     year_filter_field = "weekly_assistance__start_date"
-    week_filter_field = "weekly_assistance__week_number"
\ No newline at end of file
+    week_filter_field = "weekly_assistance__week_number"
+    week_key_filter_field = "weekly_assistance__week_key"
+    total_filter_field = "snapshot_total"
+    
+    # Custom actions
+    def create_disbursement(self, request, queryset):
+        """ Generate the bank disbursement files of the selected payrolls """
+        
+        week_keys = set(queryset.values_list(
+            'weekly_assistance__week_key', flat=True
+        ))
+        if len(week_keys) != 1:
+            self.message_user(
+                request,
+                'Selecciona nóminas de una sola semana',
+                messages.ERROR,
+            )
+            return
+        
+        week_key = week_keys.pop()
+        try:
+            batch = generate_disbursement(
+                week_number=week_key % 100,
+                year=week_key // 100,
+                layout=settings.DISBURSEMENT_LAYOUT,
+                payrolls=queryset,
+            )
+        except ValidationError as error:
+            self.message_user(request, " ".join(error.messages), messages.ERROR)
+            return
+        self.message_user(
+            request,
+            f'{batch}: {batch.files.count()} archivos, '
+            f'{batch.rows_count} registros, total {batch.total_amount}',
+            messages.SUCCESS,
+        )
+    
+    create_disbursement.short_description = 'Generar archivos de dispersión'
+    actions = [create_disbursement]
+
+
+class DisbursementFileInline(admin.TabularInline):
+    model = models.DisbursementFile
+    extra = 0
+    can_delete = False
+    fields = (
+        'bank',
+        'file',
+        'rows_count',
+        'total_amount',
+        'checksum',
+    )
+    readonly_fields = fields
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(models.DisbursementBatch)
+class DisbursementBatchAdmin(admin.ModelAdmin):
+    list_display = (
+        'week_number',
+        'year',
+        'layout',
+        'rows_count',
+        'total_amount',
+        'checksum',
+        'created_at',
+    )
+    list_filter = (
+        'week_number',
+        'year',
+        'layout',
+    )
+    readonly_fields = (
+        'week_number',
+        'year',
+        'layout',
+        'rows_count',
+        'total_amount',
+        'checksum',
+        'created_at',
+    )
+    inlines = [DisbursementFileInline]
+    
+    def has_add_permission(self, request):
+        return False
@@ -5,3 +5,7 @@ class AccountingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounting'
     verbose_name = 'Contabilidad'
+
+    def ready(self):
+        # Recalculate payrolls when the assistances change
+        from accounting import signals  # noqa: F401
@@ -0,0 +1,308 @@
+from django.conf import settings
+from django.db.models import Q, Sum
+
+from assistance import models as assistance_models
+from core import catalog
+
+# Extra payment categories used in the payroll, and the sign of each amount
+EXTRAS_CATEGORIES = {
+    "penalties_amount": ("Penalización", -1),
+    "bonuses_amount": ("Bono", 1),
+    "other_amount": ("Otro", 1),
+    "discount_amount": ("Descuento por robo o daño", -1),
+}
+
+# Version of the extra payments and assistances in this process,
+# updated by the accounting signals (used to reset the memoized figures)
+extras_version = 0
+
+WEEK_DAYS = [
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+    "monday",
+    "tuesday",
+    "wednesday",
+]
+
+
+def calculate_figures(
+    weekly_rate: float,
+    weekly_attendances: int,
+    hours: int,
+    worked_days: int,
+    extras: dict,
+    extra_unpaid_hours: int,
+    discount_loans: float,
+) -> dict:
+    """ Calculate all the payroll figures from its base values
+
+    Args:
+        weekly_rate (float): Weekly rate of the employee
+        weekly_attendances (int): Work days in the schedule of the service
+        hours (int): Work hours per day in the schedule of the service
+        worked_days (int): Days attended in the week
+        extras (dict): Extra payments totals by category name
+        extra_unpaid_hours (int): Extra unpaid hours in the week
+        discount_loans (float): Loans discounted in the payroll
+
+    Returns:
+        dict: Payroll figures, with the same names as the Payroll properties
+    """
+
+    figures = {
+        "weekly_rate": weekly_rate,
+        "worked_days": worked_days,
+    }
+
+    # Rates
+    daily_rate = int(weekly_rate / weekly_attendances * 100) / 100
+    hour_rate = daily_rate / hours
+    figures["daily_rate"] = daily_rate
+    figures["hour_rate"] = hour_rate
+
+    # No attendance
+    no_attendance_days = max(weekly_attendances - worked_days, 0)
+    figures["no_attendance_days"] = no_attendance_days
+    figures["no_attendance_penalty"] = (
+        - no_attendance_days * settings.PENALTY_NO_ATTENDANCE
+    )
+
+    # Extra payments
+    for field_name, (category_name, sign) in EXTRAS_CATEGORIES.items():
+        amount = extras.get(category_name) or 0
+        figures[field_name] = sign * amount
+
+    # Extra unpaid hours
+    extra_hours_base_amount = extra_unpaid_hours * hour_rate
+    extra_hours_amount = extra_hours_base_amount * settings.EXTRA_HOUR_RATE
+    figures["extra_unpaid_hours_amount"] = int(extra_hours_amount * 100) / 100
+
+    # Subtotal
+    subtotal = float(weekly_rate)
+    subtotal += float(figures["no_attendance_penalty"])
+    subtotal += float(figures["penalties_amount"])
+    subtotal += float(figures["bonuses_amount"])
+    subtotal += float(figures["other_amount"])
+    subtotal += float(figures["extra_unpaid_hours_amount"])
+    if subtotal < 0:
+        subtotal = 0
+    else:
+        subtotal = int(subtotal * 100) / 100
+    figures["subtotal"] = subtotal
+
+    # Total
+    total = float(subtotal)
+    total += float(figures["discount_amount"])
+    total += float(discount_loans)
+    total = int(total * 100) / 100
+    if total < 0:
+        total = 0
+    figures["total"] = total
+
+    return figures
+
+
+def mark_extras_changed() -> None:
+    """ Update the extras version, so the payrolls memoized figures
+    query again the extra payments and unpaid hours """
+
+    global extras_version
+    extras_version += 1
+
+
+class PayrollCalculator:
+    """ Calculate the figures of many payrolls with a few aggregate queries:
+    one for the payrolls with the rate and schedule columns, one for the
+    extra payments by category and one for the extra unpaid hours
+    """
+
+    def __init__(self, payrolls=None, week_number: int = None, year: int = None):
+        """ Set the payrolls to calculate
+
+        Args:
+            payrolls (QuerySet): Payrolls to calculate
+            week_number (int): Week number of the payrolls (if no queryset)
+            year (int): Year of the payrolls week (optional)
+        """
+
+        if payrolls is None:
+
+            # Import accounting models avoiding circular imports
+            from accounting.models import Payroll
+
+            if year:
+                payrolls = Payroll.objects.filter(
+                    weekly_assistance__week_key=year * 100 + week_number
+                )
+            else:
+                payrolls = Payroll.objects.filter(
+                    weekly_assistance__week_number=week_number
+                )
+
+        self.payrolls = payrolls
+        self.figures = None
+
+    # reusable methods
+    @staticmethod
+    def get_extras_totals(weekly_assistances_ids: list) -> dict:
+        """ Return the extra payments totals by category name,
+        grouped by weekly assistance
+
+        Args:
+            weekly_assistances_ids (list): Ids of the weekly assistances
+
+        Returns:
+            dict: {weekly_assistance_id: {category_name: total}}
+        """
+
+        # Categories ids from the catalog (no join with the categories table)
+        categories_names = [
+            category_name for category_name, _ in EXTRAS_CATEGORIES.values()
+        ]
+        totals_fields = {}
+        for index, category_name in enumerate(categories_names):
+            category = catalog.get_by_name(
+                assistance_models.ExtraPaymentCategory, category_name
+            )
+            category_id = category.id if category else None
+            totals_fields[f"total_{index}"] = Sum(
+                "amount", filter=Q(category_id=category_id)
+            )
+        rows = assistance_models.ExtraPayment.objects.filter(
+            assistance__weekly_assistance_id__in=weekly_assistances_ids
+        ).values("assistance__weekly_assistance_id").annotate(**totals_fields)
+
+        extras_totals = {}
+        for row in rows:
+            extras_totals[row["assistance__weekly_assistance_id"]] = {
+                category_name: row[f"total_{index}"]
+                for index, category_name in enumerate(categories_names)
+            }
+        return extras_totals
+
+    @staticmethod
+    def get_extra_unpaid_hours(weekly_assistances_ids: list) -> dict:
+        """ Return the extra unpaid hours grouped by weekly assistance
+
+        Args:
+            weekly_assistances_ids (list): Ids of the weekly assistances
+
+        Returns:
+            dict: {weekly_assistance_id: extra unpaid hours}
+        """
+
+        rows = assistance_models.Assistance.objects.filter(
+            weekly_assistance_id__in=weekly_assistances_ids
+        ).values("weekly_assistance_id").annotate(
+            hours=Sum("extra_unpaid_hours")
+        )
+        return {row["weekly_assistance_id"]: row["hours"] or 0 for row in rows}
+
+    @classmethod
+    def get_payroll_extras(cls, weekly_assistance_id: int) -> tuple:
+        """ Return the extras totals and the extra unpaid hours
+        of a single weekly assistance (2 queries)
+
+        Args:
+            weekly_assistance_id (int): Id of the weekly assistance
+
+        Returns:
+            tuple: (extras totals by category name, extra unpaid hours)
+        """
+
+        extras = cls.get_extras_totals([weekly_assistance_id])
+        extra_unpaid_hours = cls.get_extra_unpaid_hours([weekly_assistance_id])
+        return (
+            extras.get(weekly_assistance_id, {}),
+            extra_unpaid_hours.get(weekly_assistance_id, 0),
+        )
+
+    @classmethod
+    def get_payroll_figures(
+        cls, payroll, extras: dict = None, extra_unpaid_hours: int = None
+    ) -> dict:
+        """ Calculate the figures of a single payroll, using its loaded
+        employee and schedule (2 queries if the extras are not provided)
+
+        Args:
+            payroll (Payroll): Payroll to calculate
+            extras (dict): Extras totals by category name (optional)
+            extra_unpaid_hours (int): Extra unpaid hours (optional)
+
+        Returns:
+            dict: Payroll figures
+        """
+
+        weekly_assistance = payroll.weekly_assistance
+        service = weekly_assistance.service
+        if extras is None:
+            extras, extra_unpaid_hours = cls.get_payroll_extras(weekly_assistance.id)
+
+        return calculate_figures(
+            weekly_rate=service.employee.weekly_rate,
+            weekly_attendances=service.schedule.weekly_attendances,
+            hours=service.schedule.hours,
+            worked_days=weekly_assistance.get_worked_days(),
+            extras=extras,
+            extra_unpaid_hours=extra_unpaid_hours,
+            discount_loans=payroll.discount_loans,
+        )
+
+    # Custom methods
+    def get_figures(self) -> dict:
+        """ Calculate the figures of all the payrolls
+
+        Returns:
+            dict: {payroll_id: payroll figures}
+        """
+
+        if self.figures is not None:
+            return self.figures
+
+        # Payrolls with rate and schedule columns
+        days_fields = [f"weekly_assistance__{day}" for day in WEEK_DAYS]
+        rows = list(self.payrolls.values(
+            "id",
+            "discount_loans",
+            "weekly_assistance_id",
+            "weekly_assistance__service__employee__weekly_rate",
+            "weekly_assistance__service__schedule__weekly_attendances",
+            "weekly_assistance__service__schedule__hours",
+            *days_fields,
+        ))
+
+        # Extras and unpaid hours of all the weeks
+        weekly_assistances_ids = [row["weekly_assistance_id"] for row in rows]
+        extras = self.get_extras_totals(weekly_assistances_ids)
+        extra_unpaid_hours = self.get_extra_unpaid_hours(weekly_assistances_ids)
+
+        self.figures = {}
+        for row in rows:
+            weekly_assistance_id = row["weekly_assistance_id"]
+            self.figures[row["id"]] = calculate_figures(
+                weekly_rate=row["weekly_assistance__service__employee__weekly_rate"],
+                weekly_attendances=row[
+                    "weekly_assistance__service__schedule__weekly_attendances"
+                ],
+                hours=row["weekly_assistance__service__schedule__hours"],
+                worked_days=sum([row[day_field] for day_field in days_fields]),
+                extras=extras.get(weekly_assistance_id, {}),
+                extra_unpaid_hours=extra_unpaid_hours.get(weekly_assistance_id, 0),
+                discount_loans=row["discount_loans"],
+            )
+
+        return self.figures
+
+    def attach(self, payrolls) -> None:
+        """ Save the calculated figures in each payroll instance,
+        so the payroll properties don't run their own queries
+
+        Args:
+            payrolls (iterable): Payroll instances to update
+        """
+
+        figures = self.get_figures()
+        for payroll in payrolls:
+            payroll.figures = figures.get(payroll.id)
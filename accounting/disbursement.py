@@ -0,0 +1,258 @@
+import csv
+import hashlib
+import io
+import tempfile
+import unicodedata
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils.text import slugify
+
+from accounting import models as accounting_models
+
+# Columns of the fixed width layout: (name, width, alignment, fill, strict)
+# Free text columns are truncated, strict columns (account and amount)
+# raise a validation error instead
+FIXED_WIDTH_COLUMNS = [
+    ("card_number", 16, "<", " ", True),
+    ("name", 40, "<", " ", False),
+    ("amount", 15, ">", "0", True),
+    ("reference", 20, "<", " ", False),
+]
+
+CSV_HEADER = ["tarjeta", "nombre", "monto", "referencia"]
+
+
+def get_ascii_text(text: str) -> str:
+    """ Return the text in uppercase, without accents or special characters
+
+    Args:
+        text (str): Original text
+
+    Returns:
+        str: ASCII text
+    """
+
+    text = unicodedata.normalize("NFKD", text)
+    return text.encode("ascii", "ignore").decode("ascii").upper()
+
+
+class DisbursementWriter:
+    """ Write the rows of one bank in a temporary file, calculating
+    its checksum, rows count and total amount """
+
+    def __init__(self, batch, bank_id: int, batch_hash):
+        """ Create the temporary file of the bank
+
+        Args:
+            batch (DisbursementBatch): Batch of the file
+            bank_id (int): Id of the bank (None for employees without bank)
+            batch_hash (hashlib._Hash): Hash of the whole batch
+        """
+
+        self.batch = batch
+        self.bank_id = bank_id
+        self.batch_hash = batch_hash
+        self.hash = hashlib.sha256()
+        self.rows_count = 0
+        self.total_amount = Decimal("0")
+        self.temp_file = tempfile.TemporaryFile()
+
+        if batch.layout == "csv":
+            self.write_line(self.get_csv_line(CSV_HEADER))
+
+    def get_csv_line(self, values: list) -> str:
+        """ Return a csv line with the values """
+
+        line = io.StringIO()
+        csv.writer(line, lineterminator="\n").writerow(values)
+        return line.getvalue()
+
+    def get_fixed_width_line(self, values: dict) -> str:
+        """ Return a fixed width line with the values
+
+        Raises:
+            ValidationError: A value of a strict column doesn't fit it
+        """
+
+        line = ""
+        for name, width, alignment, fill, strict in FIXED_WIDTH_COLUMNS:
+            value = str(values[name])
+            if len(value) > width:
+                if strict:
+                    raise ValidationError(
+                        f"El valor '{value}' de {values['name']} no cabe "
+                        f"en la columna {name} ({width} caracteres)"
+                    )
+                value = value[:width]
+            line += f"{value:{fill}{alignment}{width}}"
+        return line + "\n"
+
+    def write_line(self, line: str):
+        """ Write a line in the file and update the checksums """
+
+        data = line.encode("utf-8")
+        self.temp_file.write(data)
+        self.hash.update(data)
+        self.batch_hash.update(data)
+
+    def write_row(self, row: dict):
+        """ Write a payment row
+
+        Args:
+            row (dict): Row with card_number, name and total
+        """
+
+        amount = Decimal(str(round(row["total"], 2))).quantize(Decimal("0.01"))
+        name = " ".join(filter(None, [
+            row["name"], row["last_name_1"], row["last_name_2"]
+        ]))
+        reference = f"NOMINA SEMANA {self.batch.week_number}"
+
+        if self.batch.layout == "csv":
+            line = self.get_csv_line([
+                row["card_number"] or "", name, amount, reference
+            ])
+        else:
+            line = self.get_fixed_width_line({
+                "card_number": row["card_number"] or "",
+                "name": get_ascii_text(name),
+                "amount": int(amount * 100),
+                "reference": reference,
+            })
+        self.write_line(line)
+
+        self.rows_count += 1
+        self.total_amount += amount
+
+    def close(self):
+        """ Save the file in the storage and register it in the batch
+
+        Returns:
+            DisbursementFile: Saved disbursement file
+        """
+
+        disbursement_file = accounting_models.DisbursementFile(
+            batch=self.batch,
+            bank_id=self.bank_id,
+            rows_count=self.rows_count,
+            total_amount=self.total_amount,
+            checksum=self.hash.hexdigest(),
+        )
+        bank_name = disbursement_file.bank.name if self.bank_id else "sin-banco"
+        extension = "csv" if self.batch.layout == "csv" else "txt"
+        file_name = f"semana-{self.batch.week_number}-{slugify(bank_name)}.{extension}"
+
+        self.temp_file.seek(0)
+        disbursement_file.file.save(file_name, File(self.temp_file), save=False)
+        disbursement_file.save()
+        self.temp_file.close()
+
+        return disbursement_file
+
+
+def get_disbursement_rows(payrolls):
+    """ Return the payments by employee, ordered by bank
+    (single joined and aggregated query, read in chunks)
+
+    Args:
+        payrolls (QuerySet): Payrolls to pay
+
+    Returns:
+        iterator: Rows with bank_id, card_number, employee names and total
+    """
+
+    employee_path = "weekly_assistance__service__employee"
+    return payrolls.filter(
+        skip_payment=False,
+        paid=False,
+    ).values(
+        bank_id=F(f"{employee_path}__bank_id"),
+        employee_id=F(f"{employee_path}__id"),
+        card_number=F(f"{employee_path}__card_number"),
+        name=F(f"{employee_path}__name"),
+        last_name_1=F(f"{employee_path}__last_name_1"),
+        last_name_2=F(f"{employee_path}__last_name_2"),
+    ).annotate(
+        total=Sum("snapshot_total"),
+    ).filter(
+        total__gt=0,
+    ).order_by(
+        "bank_id",
+        "employee_id",
+    ).iterator(chunk_size=2000)
+
+
+def generate_disbursement(
+    week_number: int, year: int = None, layout: str = "csv", payrolls=None
+):
+    """ Generate one disbursement file per bank with the payrolls of a week
+    (skipped, paid and without total payrolls are excluded)
+
+    Args:
+        week_number (int): Week number of the payrolls
+        year (int): Year of the payrolls (optional)
+        layout (str): Files layout ('csv' or 'fixed')
+        payrolls (QuerySet): Payrolls to pay (default: all the week payrolls)
+
+    Raises:
+        ValidationError: An account or amount doesn't fit the fixed
+            width layout (nothing is saved)
+
+    Returns:
+        DisbursementBatch: Generated batch, with its files
+    """
+
+    if payrolls is None:
+        payrolls = accounting_models.Payroll.objects.all()
+    if year:
+        payrolls = payrolls.filter(
+            weekly_assistance__week_key=year * 100 + week_number
+        )
+    else:
+        payrolls = payrolls.filter(weekly_assistance__week_number=week_number)
+
+    # Update figures pending to calculate
+    accounting_models.Payroll.recalculate(payrolls.filter(is_dirty=True))
+
+    with transaction.atomic():
+        batch = accounting_models.DisbursementBatch.objects.create(
+            week_number=week_number,
+            year=year,
+            layout=layout,
+        )
+        batch_hash = hashlib.sha256()
+
+        # Write the rows, changing the file when the bank changes
+        writer = None
+        try:
+            for row in get_disbursement_rows(payrolls):
+                if writer is None or writer.bank_id != row["bank_id"]:
+                    if writer:
+                        writer.close()
+                    writer = DisbursementWriter(batch, row["bank_id"], batch_hash)
+                writer.write_row(row)
+        except ValidationError:
+
+            # Remove the files already saved (the batch is rolled back)
+            writer.temp_file.close()
+            for disbursement_file in batch.files.all():
+                disbursement_file.file.delete(save=False)
+            raise
+        if writer:
+            writer.close()
+
+        # Save batch totals
+        files_totals = batch.files.aggregate(
+            rows_count=Sum("rows_count"),
+            total_amount=Sum("total_amount"),
+        )
+        batch.rows_count = files_totals["rows_count"] or 0
+        batch.total_amount = files_totals["total_amount"] or 0
+        batch.checksum = batch_hash.hexdigest()
+        batch.save()
+
+    return batch
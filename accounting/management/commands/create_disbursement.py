@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.disbursement import generate_disbursement
+from utils.dates import get_week_key
+
+
+class Command(BaseCommand):
+    help = "Generate the bank disbursement files (one per bank) of a week"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--week",
+            type=int,
+            required=True,
+            help="Week number of the payrolls",
+        )
+        parser.add_argument(
+            "--year",
+            type=int,
+            help="Year of the payrolls (default: year of the current week)",
+        )
+        parser.add_argument(
+            "--layout",
+            choices=["csv", "fixed"],
+            default=settings.DISBURSEMENT_LAYOUT,
+            help="Layout of the files: csv or fixed width",
+        )
+
+    def handle(self, *args, **options):
+
+        try:
+            batch = generate_disbursement(
+                week_number=options["week"],
+                year=options["year"] or get_week_key() // 100,
+                layout=options["layout"],
+            )
+        except ValidationError as error:
+            raise CommandError(error.messages[0]) from error
+
+        for disbursement_file in batch.files.all():
+            print(
+                f"{disbursement_file}: {disbursement_file.file.name} "
+                f"(total {disbursement_file.total_amount})"
+            )
+        print(
+            f"Batch {batch.id}: {batch.rows_count} rows, "
+            f"total {batch.total_amount}, checksum {batch.checksum}"
+        )
@@ -1,22 +1,246 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
 from django.core.management.base import BaseCommand
-from django.utils import timezone
+from django.db import connections, transaction
+from django.db.models import Sum
 
 from assistance import models as assistance_models
 from accounting import models as accounting_models
+from accounting.calculator import PayrollCalculator
 from employees import models as employees_models
 
+DISCOUNT_CATEGORY = "Descuento por robo o daño"
+
+
+def create_payrolls_bulk(week_key: int, agreements_ids: list = None) -> dict:
+    """ Create the payrolls and loans of a week with bulk queries,
+    in a single transaction
+
+    Args:
+        week_key (int): Week key (year and week number) of the weekly assistances
+        agreements_ids (list): Only create payrolls of these agreements (optional)
+
+    Returns:
+        dict: Number of weekly assistances, payrolls and loans created
+    """
+
+    weekly_assistances = assistance_models.WeeklyAssistance.objects.filter(
+        week_key=week_key
+    )
+    if agreements_ids is not None:
+        weekly_assistances = weekly_assistances.filter(
+            service__agreement_id__in=agreements_ids
+        )
+    weekly_assistances = list(
+        weekly_assistances.values("id", "service__employee_id")
+    )
+
+    with transaction.atomic():
+
+        # Skip existing payrolls (one query)
+        existing_ids = set(
+            accounting_models.Payroll.objects.filter(
+                weekly_assistance_id__in=[row["id"] for row in weekly_assistances]
+            ).values_list("weekly_assistance_id", flat=True)
+        )
+        new_weekly_assistances = [
+            row for row in weekly_assistances if row["id"] not in existing_ids
+        ]
+        employees_ids = {
+            row["id"]: row["service__employee_id"] for row in new_weekly_assistances
+        }
+
+        # Create payrolls and calculate them
+        accounting_models.Payroll.objects.bulk_create(
+            [
+                accounting_models.Payroll(weekly_assistance_id=weekly_assistance_id)
+                for weekly_assistance_id in employees_ids
+            ],
+            batch_size=500,
+        )
+        payrolls = accounting_models.Payroll.objects.filter(
+            weekly_assistance_id__in=list(employees_ids)
+        )
+        payrolls_weeks = dict(payrolls.values_list("id", "weekly_assistance_id"))
+        figures = PayrollCalculator(payrolls).get_figures()
+
+        # Outstanding loans of the employees (one query)
+        loans_totals = dict(
+            employees_models.Loan.objects.filter(
+                employee_id__in=set(employees_ids.values()), amount__lt=0
+            ).values("employee_id").annotate(
+                total=Sum("amount")
+            ).values_list("employee_id", "total")
+        )
+
+        # Discounts notes of the payrolls without total (one query)
+        no_total_weeks = [
+            payrolls_weeks[payroll_id]
+            for payroll_id, payroll_figures in figures.items()
+            if payroll_figures["total"] == 0
+        ]
+        discounts_notes = {}
+        discounts = assistance_models.ExtraPayment.objects.filter(
+            category__name=DISCOUNT_CATEGORY,
+            assistance__weekly_assistance_id__in=no_total_weeks,
+        ).order_by("id").values_list("assistance__weekly_assistance_id", "notes")
+        for weekly_assistance_id, notes in discounts:
+            discounts_notes.setdefault(weekly_assistance_id, "")
+            discounts_notes[weekly_assistance_id] += f"\n{notes}"
+
+        # Calculate loans and payroll discounts
+        loans = []
+        discount_loans = {}
+        for payroll_id, payroll_figures in figures.items():
+            weekly_assistance_id = payrolls_weeks[payroll_id]
+            employee_id = employees_ids[weekly_assistance_id]
+            payroll_total = payroll_figures["total"]
+
+            if payroll_total == 0:
+                # Create loan for unpaid discounts
+                loan_details = f"{DISCOUNT_CATEGORY}."
+                notes = discounts_notes.get(weekly_assistance_id, "").strip()
+                if notes:
+                    loan_details += f" Detalles: \n{notes}"
+                loans.append(employees_models.Loan(
+                    employee_id=employee_id,
+                    amount=payroll_figures["discount_amount"],
+                    details=loan_details,
+                ))
+                continue
+
+            # Discount loans from total
+            loans_total = loans_totals.get(employee_id) or 0
+            if abs(loans_total) < payroll_total:
+                loans.append(employees_models.Loan(
+                    employee_id=employee_id,
+                    amount=abs(loans_total),
+                    details="Pago de préstamo total por nómina",
+                ))
+                discount_loans[payroll_id] = loans_total
+            else:
+                loans.append(employees_models.Loan(
+                    employee_id=employee_id,
+                    amount=payroll_total,
+                    details="Pago de préstamo parcial por nómina",
+                ))
+                discount_loans[payroll_id] = -payroll_total
+
+        # Save loans and update employees balances
+        employees_models.Loan.objects.bulk_create(loans, batch_size=500)
+        balances = {}
+        for loan in loans:
+            balances.setdefault(loan.employee_id, 0)
+            balances[loan.employee_id] += float(loan.amount)
+        employees_models.Employee.update_balances(balances)
+
+        # Save payrolls discounts and final figures
+        accounting_models.Payroll.objects.bulk_update(
+            [
+                accounting_models.Payroll(id=payroll_id, discount_loans=amount)
+                for payroll_id, amount in discount_loans.items()
+            ],
+            ["discount_loans"],
+            batch_size=500,
+        )
+        accounting_models.Payroll.recalculate(payrolls)
+
+    return {
+        "weekly_assistances": len(weekly_assistances),
+        "payrolls": len(figures),
+        "loans": len(loans),
+    }
+
+
+def create_payrolls_worker(week_key: int, agreements_ids: list) -> dict:
+    """ Create the payrolls of some agreements in a worker process
+
+    Args:
+        week_key (int): Week key (year and week number) of the weekly assistances
+        agreements_ids (list): Agreements to process in this worker
+
+    Returns:
+        dict: Number of weekly assistances, payrolls and loans created
+    """
+    try:
+        return create_payrolls_bulk(week_key, agreements_ids)
+    finally:
+        connections.close_all()
+
 
 class Command(BaseCommand):
     help = "Create a payroll for each wmployee / weekly asistance"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Create all the payrolls and loans with bulk queries",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Worker processes in bulk mode (payrolls split by agreement)",
+        )
+
+    def handle_bulk(self, week_key: int, workers: int):
+        """ Create the payrolls of the week in bulk mode and print a summary
+
+        Args:
+            week_key (int): Week key (year and week number) of the weekly assistances
+            workers (int): Number of worker processes
+        """
+
+        start_time = time.perf_counter()
+
+        if workers <= 1:
+            results = [create_payrolls_bulk(week_key)]
+        else:
+            # Split agreements between workers
+            agreements_ids = list(
+                assistance_models.WeeklyAssistance.objects.filter(
+                    week_key=week_key
+                ).values_list("service__agreement_id", flat=True).distinct()
+            )
+            agreements_groups = [
+                agreements_ids[index::workers] for index in range(workers)
+            ]
+            agreements_groups = [group for group in agreements_groups if group]
+
+            # Close connections before fork (each worker opens its own)
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=len(agreements_groups),
+                mp_context=get_context("fork"),
+            ) as executor:
+                results = list(executor.map(
+                    create_payrolls_worker,
+                    [week_key] * len(agreements_groups),
+                    agreements_groups,
+                ))
+
+        # Print summary
+        elapsed = time.perf_counter() - start_time
+        totals = {
+            key: sum([result[key] for result in results])
+            for key in ["weekly_assistances", "payrolls", "loans"]
+        }
+        throughput = totals["payrolls"] / elapsed if elapsed else 0
+        print(
+            f"Created {totals['payrolls']} payrolls and {totals['loans']} loans "
+            f"from {totals['weekly_assistances']} weekly assistances "
+            f"in {elapsed:.2f}s ({throughput:.1f} payrolls/s, "
+            f"{len(results)} workers)"
+        )
+
     def handle(self, *args, **options):
 
-        # Get last week of the year
-        year = timezone.now().year
+        # Get last week (highest week key, from the index)
         last_weekly_assistance = (
-            assistance_models.WeeklyAssistance.objects.filter(start_date__year=year)
-            .order_by("week_number")
-            .last()
+            assistance_models.WeeklyAssistance.objects.order_by("week_key").last()
         )
 
         # End if no weekly assistances
@@ -24,17 +248,25 @@ class Command(BaseCommand):
             print("No weekly assistances found")
             return
 
-        last_week_number = last_weekly_assistance.week_number
-        print(f"Last week of the year: {last_week_number}")
+        last_week_key = last_weekly_assistance.week_key
+        print(
+            f"Last week: {last_weekly_assistance.week_number} "
+            f"({last_week_key // 100})"
+        )
+
+        if options["bulk"]:
+            self.handle_bulk(last_week_key, options["workers"])
+            return
 
         # Get weekly assistances of the last week
         weekly_assistances = assistance_models.WeeklyAssistance.objects.filter(
-            week_number=last_week_number
+            week_key=last_week_key
         )
         print(f"Found {weekly_assistances.count()} weekly assistances")
 
         # Create each payroll
-        for weekly_assistance in weekly_assistances:
+        payrolls = []
+        for weekly_assistance in weekly_assistances.select_related("service__employee"):
 
             employee = weekly_assistance.service.employee
 
@@ -49,8 +281,22 @@ class Command(BaseCommand):
             payroll = accounting_models.Payroll.objects.create(
                 weekly_assistance=weekly_assistance,
             )
+            payrolls.append(payroll)
             print(f"Created payroll for {employee}")
 
+        # Calculate all the new payrolls at once
+        PayrollCalculator(
+            accounting_models.Payroll.objects.filter(
+                id__in=[payroll.id for payroll in payrolls]
+            )
+        ).attach(payrolls)
+
+        # Discount loans and pending discounts
+        for payroll in payrolls:
+
+            weekly_assistance = payroll.weekly_assistance
+            employee = weekly_assistance.service.employee
+
             # Get current total
             payroll_total = payroll.total
             print(f"\tPayroll total is {payroll_total} for {employee}")
@@ -61,23 +307,16 @@ class Command(BaseCommand):
                 print(f"\tChecking discounts for {employee}")
 
                 # Get discounts total
-                assitances = assistance_models.Assistance.objects.filter(
-                    weekly_assistance=weekly_assistance
-                )
-                extra_payment_category = (
-                    assistance_models.ExtraPaymentCategory.objects.get(
-                        name="Descuento por robo o daño"
-                    )
-                )
                 discounts = assistance_models.ExtraPayment.objects.filter(
-                    category=extra_payment_category, assistance__in=assitances
+                    category__name="Descuento por robo o daño",
+                    assistance__weekly_assistance=weekly_assistance,
                 )
 
                 if not discounts.exists():
                     print(f"\tNo discounts found for {employee}")
 
                 # Get discounts total and notes
-                discounts_total = sum([discount.amount for discount in discounts])
+                discounts_total = - payroll.discount_amount
                 discounts_notes = "".join([
                     f"\n{discount.notes}" for discount in discounts
                 ])
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from accounting import models as accounting_models
+from utils.dates import get_week_key
+
+
+class Command(BaseCommand):
+    help = "Recalculate the figures snapshot of the payrolls pending to calculate"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--week",
+            type=int,
+            help="Recalculate all the payrolls (not paid) of this week number",
+        )
+        parser.add_argument(
+            "--year",
+            type=int,
+            help="Year of the week (default: year of the current week)",
+        )
+
+    def handle(self, *args, **options):
+
+        payrolls = accounting_models.Payroll.objects.filter(is_dirty=True)
+        if options["week"]:
+            year = options["year"] or get_week_key() // 100
+            payrolls = accounting_models.Payroll.objects.filter(
+                weekly_assistance__week_key=year * 100 + options["week"],
+            )
+
+        recalculated = accounting_models.Payroll.recalculate(payrolls)
+        print(f"Recalculated {recalculated} payrolls")
@@ -0,0 +1,83 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0009_payroll_paid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payroll',
+            name='calculated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fecha de cálculo'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='is_dirty',
+            field=models.BooleanField(default=True, verbose_name='Pendiente de recalcular'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_bonuses_amount',
+            field=models.FloatField(default=0, verbose_name='Bonos'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_daily_rate',
+            field=models.FloatField(default=0, verbose_name='Salario diario'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_discount_amount',
+            field=models.FloatField(default=0, verbose_name='Descuentos por robo o daño'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_extra_unpaid_hours_amount',
+            field=models.FloatField(default=0, verbose_name='Horas extras'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_no_attendance_days',
+            field=models.IntegerField(default=0, verbose_name='Faltas'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_no_attendance_penalty',
+            field=models.FloatField(default=0, verbose_name='Penalización por faltas'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_other_amount',
+            field=models.FloatField(default=0, verbose_name='Otros'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_penalties_amount',
+            field=models.FloatField(default=0, verbose_name='Otras penalizaciones'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_subtotal',
+            field=models.FloatField(default=0, verbose_name='Subtotal'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_total',
+            field=models.FloatField(default=0, verbose_name='A pagar'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_weekly_rate',
+            field=models.FloatField(default=0, verbose_name='Salario semanal'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='snapshot_worked_days',
+            field=models.IntegerField(default=0, verbose_name='Días trabajados'),
+        ),
+    ]
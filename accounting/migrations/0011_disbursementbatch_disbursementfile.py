@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:34
+
+import accounting.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0034_alter_employee_languages'),
+        ('accounting', '0010_payroll_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisbursementBatch',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('week_number', models.IntegerField(verbose_name='Semana')),
+                ('year', models.IntegerField(blank=True, null=True, verbose_name='Año')),
+                ('layout', models.CharField(choices=[('csv', 'CSV'), ('fixed', 'Ancho fijo')], default='csv', max_length=10, verbose_name='Formato')),
+                ('rows_count', models.IntegerField(default=0, verbose_name='Registros')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Monto total')),
+                ('checksum', models.CharField(blank=True, max_length=64, verbose_name='Checksum (SHA-256)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+            ],
+            options={
+                'verbose_name': 'Lote de dispersión',
+                'verbose_name_plural': 'Lotes de dispersión',
+            },
+        ),
+        migrations.CreateModel(
+            name='DisbursementFile',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('file', models.FileField(storage=accounting.models.get_disbursement_storage, upload_to='disbursements/', verbose_name='Archivo')),
+                ('rows_count', models.IntegerField(default=0, verbose_name='Registros')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Monto total')),
+                ('checksum', models.CharField(max_length=64, verbose_name='Checksum (SHA-256)')),
+                ('bank', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='employees.bank', verbose_name='Banco')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='accounting.disbursementbatch', verbose_name='Lote')),
+            ],
+            options={
+                'verbose_name': 'Archivo de dispersión',
+                'verbose_name_plural': 'Archivos de dispersión',
+            },
+        ),
+    ]
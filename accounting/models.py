@@ -1,7 +1,36 @@
-from django.db import models
 from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
 
 from assistance import models as assistance_models
+from employees import models as employees_models
+from accounting import calculator
+from accounting.calculator import PayrollCalculator
+
+# Payroll figures saved in the snapshot fields (snapshot_<name>)
+SNAPSHOT_FIELDS = [
+    'weekly_rate',
+    'daily_rate',
+    'worked_days',
+    'no_attendance_days',
+    'no_attendance_penalty',
+    'penalties_amount',
+    'bonuses_amount',
+    'other_amount',
+    'extra_unpaid_hours_amount',
+    'subtotal',
+    'discount_amount',
+    'total',
+]
+
+# Disbursement files layouts
+DISBURSEMENT_LAYOUTS = [
+    ('csv', 'CSV'),
+    ('fixed', 'Ancho fijo'),
+]
 
 
 class Payroll(models.Model):
@@ -32,6 +61,71 @@ class Payroll(models.Model):
         verbose_name='Pagado',
     )
     
+    # Snapshot of the payroll figures (frozen when paid)
+    snapshot_weekly_rate = models.FloatField(
+        default=0,
+        verbose_name='Salario semanal',
+    )
+    snapshot_daily_rate = models.FloatField(
+        default=0,
+        verbose_name='Salario diario',
+    )
+    snapshot_worked_days = models.IntegerField(
+        default=0,
+        verbose_name='Días trabajados',
+    )
+    snapshot_no_attendance_days = models.IntegerField(
+        default=0,
+        verbose_name='Faltas',
+    )
+    snapshot_no_attendance_penalty = models.FloatField(
+        default=0,
+        verbose_name='Penalización por faltas',
+    )
+    snapshot_penalties_amount = models.FloatField(
+        default=0,
+        verbose_name='Otras penalizaciones',
+    )
+    snapshot_bonuses_amount = models.FloatField(
+        default=0,
+        verbose_name='Bonos',
+    )
+    snapshot_other_amount = models.FloatField(
+        default=0,
+        verbose_name='Otros',
+    )
+    snapshot_extra_unpaid_hours_amount = models.FloatField(
+        default=0,
+        verbose_name='Horas extras',
+    )
+    snapshot_subtotal = models.FloatField(
+        default=0,
+        verbose_name='Subtotal',
+    )
+    snapshot_discount_amount = models.FloatField(
+        default=0,
+        verbose_name='Descuentos por robo o daño',
+    )
+    snapshot_total = models.FloatField(
+        default=0,
+        verbose_name='A pagar',
+    )
+    is_dirty = models.BooleanField(
+        default=True,
+        verbose_name='Pendiente de recalcular',
+    )
+    calculated_at = models.DateTimeField(
+        verbose_name='Fecha de cálculo',
+        null=True,
+        blank=True,
+    )
+    
+    # Figures loaded in bulk with PayrollCalculator.attach
+    figures = None
+    
+    # Memoized figures of this instance (both reset on save and refresh)
+    figures_context = None
+    
     class Meta:
         verbose_name = 'Nómina'
         verbose_name_plural = 'Nóminas'
@@ -40,44 +134,142 @@ class Payroll(models.Model):
         skip_value = "Sí" if self.skip_payment else "No"
         return f'{self.weekly_assistance} (Omitir: {skip_value})'
     
+    def save(self, *args, **kwargs):
+        """ Update the figures snapshot (only if not paid yet) """
+        
+        self.figures = None
+        self.figures_context = None
+        if not self.paid or self.is_dirty:
+            self.set_snapshot(PayrollCalculator.get_payroll_figures(self))
+        
+        super(Payroll, self).save(*args, **kwargs)
+    
+    def refresh_from_db(self, *args, **kwargs):
+        """ Reset the loaded and memoized figures when refreshing
+        the instance """
+        
+        self.figures = None
+        self.figures_context = None
+        super(Payroll, self).refresh_from_db(*args, **kwargs)
+    
     # reusable methods
-    def __get_extras__(self, category_name: str) -> assistance_models.ExtraPayment:
-        """ Return the extra payments of the employee
+    def __get_figure__(self, name: str) -> float:
+        """ Return a payroll figure from the calculator
+        (already calculated figures are used when available)
         
         Args:
-            category_name (str): Category name of the extra payment
+            name (str): Name of the figure (e.g. 'total')
         
         Returns:
-            QuerySet: Extra payments of the employee
+            float: Value of the figure
         """
-        assistances = assistance_models.Assistance.objects.filter(
-            weekly_assistance=self.weekly_assistance
-        )
-        extras_category = assistance_models.ExtraPaymentCategory.objects.get(
-            name=category_name
-        )
-        extras = assistance_models.ExtraPayment.objects.filter(
-            assistance__in=assistances,
-            category=extras_category
+        if self.figures is None:
+            return self.__get_context__()['figures'][name]
+        return self.figures[name]
+    
+    def __get_context__(self) -> dict:
+        """ Return the memoized figures of the payroll. The extras are
+        queried once (until they change), and the figures are calculated
+        again only if the rate, schedule or attendance changed
+        
+        Returns:
+            dict: Memoized context (extras, unpaid hours and figures)
+        """
+        
+        weekly_assistance = self.weekly_assistance
+        service = weekly_assistance.service
+        extras_key = (weekly_assistance.id, calculator.extras_version)
+        inputs = (
+            service.employee.weekly_rate,
+            service.schedule.weekly_attendances,
+            service.schedule.hours,
+            weekly_assistance.get_worked_days(),
+            self.discount_loans,
         )
-        return extras
+        
+        # Query extras (only the first time or when they changed)
+        context = self.figures_context
+        if context is None or context['extras_key'] != extras_key:
+            extras, extra_unpaid_hours = PayrollCalculator.get_payroll_extras(
+                weekly_assistance.id
+            )
+            context = {
+                'extras_key': extras_key,
+                'extras': extras,
+                'extra_unpaid_hours': extra_unpaid_hours,
+                'inputs': None,
+                'figures': None,
+            }
+            self.figures_context = context
+        
+        # Calculate figures (only when the inputs changed)
+        if context['inputs'] != inputs:
+            context['figures'] = PayrollCalculator.get_payroll_figures(
+                self,
+                extras=context['extras'],
+                extra_unpaid_hours=context['extra_unpaid_hours'],
+            )
+            context['inputs'] = inputs
+        
+        return context
+    
+    # Custom methods
+    def set_snapshot(self, figures: dict):
+        """ Save the figures in the snapshot fields (without saving the payroll)
+        
+        Args:
+            figures (dict): Payroll figures from the calculator
+        """
+        for field_name in SNAPSHOT_FIELDS:
+            setattr(self, f'snapshot_{field_name}', figures[field_name])
+        self.is_dirty = False
+        self.calculated_at = timezone.now()
     
-    def __get_extras_amount__(self, category_name: str) -> float:
-        """ Return the total amount of the extra payments
+    @classmethod
+    def recalculate(cls, payrolls) -> int:
+        """ Recalculate the snapshot of the payrolls not paid yet
+        (or pending to calculate) with a few queries
         
         Args:
-            category_name (str): Category name of the extra payment
+            payrolls (QuerySet): Payrolls to recalculate
         
         Returns:
-            float: Total amount of the extra payments
+            int: Number of payrolls recalculated
         """
-        extras = self.__get_extras__(category_name)
-        if not extras:
-            total = 0
-        total = sum([extra.amount for extra in extras])
-        return total
+        payrolls = payrolls.filter(Q(paid=False) | Q(is_dirty=True))
+        figures = PayrollCalculator(payrolls).get_figures()
+        
+        # Update only the snapshot fields
+        updated_payrolls = []
+        for payroll_id, payroll_figures in figures.items():
+            payroll = cls(id=payroll_id)
+            payroll.set_snapshot(payroll_figures)
+            updated_payrolls.append(payroll)
+        update_fields = [f'snapshot_{field_name}' for field_name in SNAPSHOT_FIELDS]
+        update_fields += ['is_dirty', 'calculated_at']
+        cls.objects.bulk_update(updated_payrolls, update_fields, batch_size=500)
+        
+        return len(updated_payrolls)
+    
+    @classmethod
+    def refresh_weekly_assistances(cls, weekly_assistances_ids: list) -> int:
+        """ Mark as dirty and recalculate the payrolls (not paid)
+        of the weekly assistances
+        
+        Args:
+            weekly_assistances_ids (list): Ids of the changed weekly assistances
+        
+        Returns:
+            int: Number of payrolls recalculated
+        """
+        payrolls = cls.objects.filter(
+            weekly_assistance_id__in=weekly_assistances_ids,
+            paid=False,
+        )
+        if not payrolls.update(is_dirty=True):
+            return 0
+        return cls.recalculate(payrolls)
     
-    # Custom methods
     def get_day_assistance(self, day: str) -> bool:
         """ get the assistance of the employee in a specific day
 
@@ -95,12 +287,7 @@ class Payroll(models.Model):
         Returns:
             float: Hourly rate of the employee
         """
-        hours = self.weekly_assistance.service.schedule.hours
-        hour_rate = self.daily_rate / hours
-        print("hours", hours)
-        print("daily_rate", self.daily_rate)
-        print("hour_rate", hour_rate)
-        return hour_rate
+        return self.__get_figure__('hour_rate')
     
     def get_data_header(self) -> list:
         """ get the header of the payroll data
@@ -139,7 +326,7 @@ class Payroll(models.Model):
         ]
         
     def get_data_list(self) -> list:
-        """ get the data of the payroll
+        """ get the data of the payroll (figures from the snapshot)
         
         Returns:
             list: Data of the payroll
@@ -149,8 +336,8 @@ class Payroll(models.Model):
             self.agreement_name,
             self.employee_name,
             "sí" if self.skip_payment else "no",
-            self.weekly_rate,
-            self.daily_rate,
+            self.snapshot_weekly_rate,
+            self.snapshot_daily_rate,
             'a' if self.get_day_assistance('thursday') else 'f',
             'a' if self.get_day_assistance('friday') else 'f',
             'a' if self.get_day_assistance('saturday') else 'f',
@@ -158,20 +345,20 @@ class Payroll(models.Model):
             'a' if self.get_day_assistance('monday') else 'f',
             'a' if self.get_day_assistance('tuesday') else 'f',
             'a' if self.get_day_assistance('wednesday') else 'f',
-            self.worked_days,
-            self.no_attendance_days,
-            self.no_attendance_penalty,
-            self.penalties_amount,
-            self.bonuses_amount,
-            self.other_amount,
-            self.extra_unpaid_hours_amount,
-            self.subtotal,
-            self.discount_amount,
+            self.snapshot_worked_days,
+            self.snapshot_no_attendance_days,
+            self.snapshot_no_attendance_penalty,
+            self.snapshot_penalties_amount,
+            self.snapshot_bonuses_amount,
+            self.snapshot_other_amount,
+            self.snapshot_extra_unpaid_hours_amount,
+            self.snapshot_subtotal,
+            self.snapshot_discount_amount,
             self.discount_loans,
             self.location,
             self.bank,
             self.card_number,
-            self.total,
+            self.snapshot_total,
         ]
         
     def get_is_highlighted(self) -> bool:
@@ -208,7 +395,7 @@ class Payroll(models.Model):
         Returns:
             float: Weekly rate of the employee
         """
-        return self.weekly_assistance.service.employee.weekly_rate
+        return self.__get_figure__('weekly_rate')
     
     @property
     def daily_rate(self) -> float:
@@ -217,9 +404,7 @@ class Payroll(models.Model):
         Returns:
             float: Daily rate of the employee
         """
-        work_days = self.weekly_assistance.service.schedule.weekly_attendances
-        weekly_rate = self.weekly_assistance.service.employee.weekly_rate
-        return int(weekly_rate / work_days * 100) / 100
+        return self.__get_figure__('daily_rate')
     
     @property
     def worked_days(self) -> int:
@@ -228,7 +413,7 @@ class Payroll(models.Model):
         Returns:
             int: Total of worked days
         """
-        return self.weekly_assistance.get_worked_days()
+        return self.__get_figure__('worked_days')
     
     @property
     def no_attendance_days(self) -> int:
@@ -237,7 +422,7 @@ class Payroll(models.Model):
         Returns:
             int: Total of days without attendance
         """
-        return self.weekly_assistance.get_no_attendance_days()
+        return self.__get_figure__('no_attendance_days')
     
     @property
     def no_attendance_penalty(self) -> float:
@@ -246,7 +431,7 @@ class Payroll(models.Model):
         Returns:
             float: Total amount of the no attendance penalty
         """
-        return - self.no_attendance_days * settings.PENALTY_NO_ATTENDANCE
+        return self.__get_figure__('no_attendance_penalty')
     
     @property
     def penalties_amount(self) -> float:
@@ -255,7 +440,7 @@ class Payroll(models.Model):
         Returns:
             float: Total amount of the penalties
         """
-        return - self.__get_extras_amount__('Penalización')
+        return self.__get_figure__('penalties_amount')
     
     @property
     def bonuses_amount(self) -> float:
@@ -264,7 +449,7 @@ class Payroll(models.Model):
         Returns:
             float: Total amount of the bonuses
         """
-        return self.__get_extras_amount__('Bono')
+        return self.__get_figure__('bonuses_amount')
     
     @property
     def other_amount(self) -> float:
@@ -273,7 +458,7 @@ class Payroll(models.Model):
         Returns:
             float: Total amount of the other extras
         """
-        return self.__get_extras_amount__('Otro')
+        return self.__get_figure__('other_amount')
     
     @property
     def extra_unpaid_hours_amount(self) -> float:
@@ -282,16 +467,7 @@ class Payroll(models.Model):
         Returns:
             float: Total amount of the extra hours
         """
-        assistances = assistance_models.Assistance.objects.filter(
-            weekly_assistance=self.weekly_assistance
-        )
-        extra_unpaid_hours = sum([
-            assistance.extra_unpaid_hours for assistance in assistances
-        ])
-        extra_hours_base_amount = extra_unpaid_hours * self.get_hour_rate()
-        extra_hours_amount = extra_hours_base_amount * settings.EXTRA_HOUR_RATE
-        extra_hours_amount_fixed = int(extra_hours_amount * 100) / 100
-        return extra_hours_amount_fixed
+        return self.__get_figure__('extra_unpaid_hours_amount')
     
     @property
     def subtotal(self) -> float:
@@ -302,17 +478,7 @@ class Payroll(models.Model):
         Returns:
             float: Subtotal of the payroll
         """
-        subtotal = float(self.weekly_rate)
-        subtotal += float(self.no_attendance_penalty)
-        subtotal += float(self.penalties_amount)
-        subtotal += float(self.bonuses_amount)
-        subtotal += float(self.other_amount)
-        subtotal += float(self.extra_unpaid_hours_amount)
-        
-        if subtotal < 0:
-            return 0
-        
-        return int(subtotal * 100) / 100
+        return self.__get_figure__('subtotal')
     
     @property
     def discount_amount(self) -> float:
@@ -321,7 +487,7 @@ class Payroll(models.Model):
         Returns:
             float: Total amount of the discounts
         """
-        return - self.__get_extras_amount__('Descuento por robo o daño')
+        return self.__get_figure__('discount_amount')
     
     @property
     def location(self) -> str:
@@ -357,13 +523,7 @@ class Payroll(models.Model):
         Returns:
             float: Total amount of the payroll
         """
-        total = float(self.subtotal)
-        total += float(self.discount_amount)
-        total += float(self.discount_loans)
-        total = int(total * 100) / 100
-        if total < 0:
-            return 0
-        return total
+        return self.__get_figure__('total')
     
     @property
     def week_number(self) -> int:
@@ -402,4 +562,100 @@ class PayrollSummary(Payroll):
         verbose_name_plural = 'Resúmenes de nómina'
         
     def __str__(self):
-        return f'(Resumen) {self.weekly_assistance}'
\ No newline at end of file
+        return f'(Resumen) {self.weekly_assistance}'
+
+def get_disbursement_storage():
+    """ Storage for the disbursement files (private storage if available) """
+    
+    private_storage = getattr(settings, 'PRIVATE_FILE_STORAGE', None)
+    if private_storage:
+        return import_string(private_storage)()
+    return default_storage
+
+
+class DisbursementBatch(models.Model):
+    id = models.AutoField(primary_key=True)
+    week_number = models.IntegerField(
+        verbose_name='Semana',
+    )
+    year = models.IntegerField(
+        verbose_name='Año',
+        null=True,
+        blank=True,
+    )
+    layout = models.CharField(
+        max_length=10,
+        choices=DISBURSEMENT_LAYOUTS,
+        default='csv',
+        verbose_name='Formato',
+    )
+    rows_count = models.IntegerField(
+        default=0,
+        verbose_name='Registros',
+    )
+    total_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Monto total',
+    )
+    checksum = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name='Checksum (SHA-256)',
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Fecha de creación',
+        auto_now_add=True,
+    )
+    
+    class Meta:
+        verbose_name = 'Lote de dispersión'
+        verbose_name_plural = 'Lotes de dispersión'
+        
+    def __str__(self):
+        return f'Dispersión semana {self.week_number} ({self.created_at:%Y-%m-%d %H:%M})'
+    
+    
+class DisbursementFile(models.Model):
+    id = models.AutoField(primary_key=True)
+    batch = models.ForeignKey(
+        DisbursementBatch,
+        on_delete=models.CASCADE,
+        related_name='files',
+        verbose_name='Lote',
+    )
+    bank = models.ForeignKey(
+        employees_models.Bank,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name='Banco',
+    )
+    file = models.FileField(
+        upload_to='disbursements/',
+        storage=get_disbursement_storage,
+        verbose_name='Archivo',
+    )
+    rows_count = models.IntegerField(
+        default=0,
+        verbose_name='Registros',
+    )
+    total_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Monto total',
+    )
+    checksum = models.CharField(
+        max_length=64,
+        verbose_name='Checksum (SHA-256)',
+    )
+    
+    class Meta:
+        verbose_name = 'Archivo de dispersión'
+        verbose_name_plural = 'Archivos de dispersión'
+        
+    def __str__(self):
+        bank_name = self.bank.name if self.bank else 'Sin banco'
+        return f'{bank_name} ({self.rows_count} registros)'
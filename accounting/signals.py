@@ -0,0 +1,44 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from accounting import calculator
+from accounting import models as accounting_models
+from assistance import models as assistance_models
+from assistance.signals import weekly_assistances_updated
+
+
+@receiver(post_save, sender=assistance_models.WeeklyAssistance)
+def refresh_payroll_weekly_assistance(sender, instance, **kwargs):
+    """ Recalculate the payroll of the updated weekly assistance """
+    accounting_models.Payroll.refresh_weekly_assistances([instance.id])
+
+
+@receiver(post_save, sender=assistance_models.Assistance)
+@receiver(post_delete, sender=assistance_models.Assistance)
+def refresh_payroll_assistance(sender, instance, **kwargs):
+    """ Recalculate the payroll of the week of the updated assistance """
+    calculator.mark_extras_changed()
+    if instance.weekly_assistance_id:
+        accounting_models.Payroll.refresh_weekly_assistances(
+            [instance.weekly_assistance_id]
+        )
+
+
+@receiver(post_save, sender=assistance_models.ExtraPayment)
+@receiver(post_delete, sender=assistance_models.ExtraPayment)
+def refresh_payroll_extra_payment(sender, instance, **kwargs):
+    """ Recalculate the payroll of the week of the updated extra payment """
+    calculator.mark_extras_changed()
+    weekly_assistances_ids = assistance_models.Assistance.objects.filter(
+        id=instance.assistance_id
+    ).values_list("weekly_assistance_id", flat=True)
+    accounting_models.Payroll.refresh_weekly_assistances(
+        list(weekly_assistances_ids)
+    )
+
+
+@receiver(weekly_assistances_updated)
+def refresh_payroll_weekly_assistances(sender, weekly_assistances_ids, **kwargs):
+    """ Recalculate the payrolls of the weekly assistances updated in bulk """
+    calculator.mark_extras_changed()
+    accounting_models.Payroll.refresh_weekly_assistances(weekly_assistances_ids)
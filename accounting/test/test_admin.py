@@ -9,6 +9,8 @@ import openpyxl
 from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 
+from accounting import models as accounting_models
+from assistance import models as assistance_models
 from utils.dates import get_current_week
 from utils import test_data
 from core.test_base.test_admin import TestAdminBase
@@ -170,6 +172,31 @@ class PayrollAdminTest(TestCase):
         self.assertEqual(img_saturday["src"], "/static/admin/img/icon-no.svg")
         self.assertEqual(img_sunday["src"], "/static/admin/img/icon-yes.svg")
 
+    def test_custom_filters_week_key(self):
+        """ Validate week filter excludes the same week number of other years """
+
+        # Move a payroll to the same week of the last year
+        weekly_assistance = self.weekly_assistances[2]
+        assistance_models.WeeklyAssistance.objects.filter(
+            id=weekly_assistance.id
+        ).update(week_key=weekly_assistance.week_key - 100)
+
+        # Login as admin
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+
+        # Open list page with the current week
+        response = self.client.get(
+            self.endpoint,
+            {
+                "week_number": weekly_assistance.week_number,
+                "year": weekly_assistance.week_key // 100,
+            },
+        )
+
+        payrolls_ids = [payroll.id for payroll in response.context["cl"].result_list]
+        self.assertNotIn(self.payrolls[2].id, payrolls_ids)
+        self.assertIn(self.payrolls[3].id, payrolls_ids)
+
     def test_action_export_excel(self):
         """ Validate excel generated in export action """
         
@@ -190,7 +217,9 @@ class PayrollAdminTest(TestCase):
             "attachment; filename=export.xlsx", response["Content-Disposition"]
         )
         
-        workbook = openpyxl.load_workbook(BytesIO(response.content))
+        workbook = openpyxl.load_workbook(
+            BytesIO(b"".join(response.streaming_content))
+        )
         worksheet = workbook.active
 
         # Check the sheet title
@@ -205,6 +234,63 @@ class PayrollAdminTest(TestCase):
         self.assertEqual([cell.value for cell in worksheet[1]], header)
         self.assertEqual([cell.value for cell in worksheet[2]], data_row)
 
+    def test_action_export_excel_all_rows(self):
+        """ Validate all rows and columns widths in the exported excel """
+        
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        response = self.client.post(
+            self.endpoint,
+            {
+                "action": "export_excel",
+                "_selected_action": [payroll.id for payroll in self.payrolls],
+            },
+        )
+        workbook = openpyxl.load_workbook(
+            BytesIO(b"".join(response.streaming_content))
+        )
+        worksheet = workbook.active
+        
+        # Validate rows
+        self.assertEqual(worksheet.max_row, len(self.payrolls) + 1)
+        
+        # Validate columns widths (longest value + padding)
+        header = self.payrolls[0].get_data_header()
+        for col_num, title in enumerate(header, start=1):
+            column_letter = openpyxl.utils.get_column_letter(col_num)
+            column_values = [
+                str(cell.value) for cell in worksheet[column_letter] if cell.value
+            ]
+            width = max([len(value) for value in column_values]) + 4
+            self.assertEqual(
+                worksheet.column_dimensions[column_letter].width, width
+            )
+
+
+class PayrollSummaryAdminTest(TestCase):
+    """Test custom features in admin/payrollsummary """
+
+    def setUp(self):
+        PayrollAdminTest.setUp(self)
+        self.endpoint = "/admin/accounting/payrollsummary/"
+
+    def test_action_create_disbursement(self):
+        """ Validate disbursement batch created from the selected payrolls """
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        response = self.client.post(
+            self.endpoint,
+            {
+                "action": "create_disbursement",
+                "_selected_action": [self.payrolls[2].id, self.payrolls[3].id],
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        batch = accounting_models.DisbursementBatch.objects.get()
+        week_key = self.payrolls[2].weekly_assistance.week_key
+        self.assertEqual(batch.week_number, week_key % 100)
+        self.assertEqual(batch.year, week_key // 100)
+
 
 class PayrollAdminSeleniumTest(TestAdminBase):
     """ Test Payroll admin customization and mtehods """
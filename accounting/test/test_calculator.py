@@ -0,0 +1,105 @@
+from django.test import TestCase
+from django.core.management import call_command
+
+from accounting import models as accounting_models
+from accounting.calculator import PayrollCalculator
+from core import catalog
+from assistance import models as assistance_models
+from utils import test_data
+
+
+class PayrollCalculatorTest(TestCase):
+    """Test payroll figures calculated in bulk"""
+
+    def setUp(self):
+
+        # Load initial data
+        call_command("apps_loaddata")
+
+        # Create payrolls with attendance, extras and unpaid hours
+        self.payrolls = []
+        for employee_num in range(3):
+            employee = test_data.create_employee(
+                curp=f"CURP{employee_num}",
+                ine=f"INE{employee_num}",
+                phone=f"PHONE{employee_num}",
+            )
+            service = test_data.create_service(employee=employee)
+            weekly_assistance = test_data.create_weekly_assistance(service=service)
+            weekly_assistance.monday = True
+            weekly_assistance.tuesday = employee_num > 0
+            weekly_assistance.save()
+
+            assistance = test_data.create_assistance(
+                weekly_assistance=weekly_assistance
+            )
+            assistance.extra_unpaid_hours = employee_num
+            assistance.save()
+            for category_name in ["Penalización", "Bono", "Otro"]:
+                category = assistance_models.ExtraPaymentCategory.objects.get(
+                    name=category_name
+                )
+                test_data.create_extra_payment(
+                    assistance=assistance,
+                    category=category,
+                    amount=10 * (employee_num + 1),
+                )
+
+            self.payrolls.append(
+                test_data.create_payroll(weekly_assistance=weekly_assistance)
+            )
+
+        self.fields = [
+            "weekly_rate",
+            "daily_rate",
+            "worked_days",
+            "no_attendance_days",
+            "no_attendance_penalty",
+            "penalties_amount",
+            "bonuses_amount",
+            "other_amount",
+            "extra_unpaid_hours_amount",
+            "subtotal",
+            "discount_amount",
+            "total",
+        ]
+
+    def test_figures_match_properties(self):
+        """Validate bulk figures are the same as the single payroll properties"""
+
+        figures = PayrollCalculator(accounting_models.Payroll.objects.all()).get_figures()
+
+        for payroll in self.payrolls:
+            payroll = accounting_models.Payroll.objects.get(id=payroll.id)
+            for field in self.fields:
+                self.assertEqual(figures[payroll.id][field], getattr(payroll, field))
+
+    def test_figures_query_count(self):
+        """Validate the figures query count doesn't depend on the payrolls count"""
+
+        # Load extra payments categories catalog
+        catalog.get_all(assistance_models.ExtraPaymentCategory)
+
+        with self.assertNumQueries(3):
+            PayrollCalculator(accounting_models.Payroll.objects.all()).get_figures()
+
+    def test_figures_by_week(self):
+        """Validate payrolls filtered by week number"""
+
+        week_number = self.payrolls[0].weekly_assistance.week_number
+        figures = PayrollCalculator(week_number=week_number).get_figures()
+        self.assertEqual(
+            set(figures.keys()),
+            set([payroll.id for payroll in self.payrolls])
+        )
+
+    def test_attach(self):
+        """Validate properties read the attached figures without queries"""
+
+        payrolls = accounting_models.Payroll.objects.all()
+        PayrollCalculator(payrolls).attach(payrolls)
+
+        with self.assertNumQueries(0):
+            for payroll in payrolls:
+                for field in self.fields:
+                    getattr(payroll, field)
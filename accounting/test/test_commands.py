@@ -1,7 +1,11 @@
+import hashlib
+
 from django.test import TestCase
 from django.core.management import call_command
+from django.core.management.base import CommandError
 
 from accounting import models as accounting_models
+from accounting.calculator import WEEK_DAYS
 from employees import models as employees_models
 from assistance import models as assistance_models
 from utils import test_data
@@ -54,6 +58,24 @@ class CommandCreatePayrolls(TestCase):
             )
             self.assertEqual(payroll.count(), 1)
             
+    def test_run_last_week_key(self):
+        """ Validate payrolls are only created for the last week (year and week) """
+        
+        # Move a weekly assistance to the same week of the last year
+        weekly_assistance = self.weekly_assistances[1]
+        assistance_models.WeeklyAssistance.objects.filter(
+            id=weekly_assistance.id
+        ).update(week_key=weekly_assistance.week_key - 100)
+        
+        call_command("create_payrolls")
+        
+        # Validate only the current week payroll
+        payrolls = accounting_models.Payroll.objects.all()
+        self.assertEqual(payrolls.count(), 1)
+        self.assertEqual(
+            payrolls[0].weekly_assistance.id, self.weekly_assistances[0].id
+        )
+    
     def test_run_without_weekly_assistance(self):
         """ Validate no payrolls created """
         
@@ -312,4 +334,254 @@ class CommandCreatePayrolls(TestCase):
         )
         self.assertEqual(loan_paid.details, "Pago de préstamo parcial por nómina")
         
-        
\ No newline at end of file
+        
+
+class CommandCreatePayrollsBulk(TestCase):
+    """ Validate payrolls and loans created in bulk mode """
+
+    def setUp(self):
+
+        # Create the same initial data
+        CommandCreatePayrolls.setUp(self)
+
+    def test_run_bulk_discount_loan(self):
+        """ Create an employee loan with the "Descuento por robo o daño"
+        extra payments if the payroll total is 0
+        """
+
+        # Get main data
+        weekly_assistance = self.weekly_assistances[0]
+        assistance = assistance_models.Assistance.objects.filter(
+            weekly_assistance=weekly_assistance
+        ).first()
+        employee = weekly_assistance.service.employee
+        details = [
+            "Robo de herramientas.",
+            "Daño de herramientas.",
+        ]
+
+        # Create extra payments
+        extra_payment_category = assistance_models.ExtraPaymentCategory.objects.get(
+            name="Descuento por robo o daño"
+        )
+        for detail in details:
+            test_data.create_extra_payment(
+                category=extra_payment_category,
+                assistance=assistance,
+                amount=100,
+                notes=detail,
+            )
+
+        call_command("create_payrolls", "--bulk")
+
+        # Validate loan created
+        loans = employees_models.Loan.objects.filter(
+            employee=employee,
+        )
+        self.assertEqual(loans.count(), 1)
+        loan = loans.first()
+        self.assertEqual(float(loan.amount), -200)
+        details_text = "Descuento por robo o daño. Detalles: "
+        details_text += "".join([f"\n{detail}" for detail in details])
+        self.assertEqual(loan.details, details_text)
+
+    def test_run_bulk_twice(self):
+        """ Validate payrolls and loans are not duplicated """
+
+        call_command("create_payrolls", "--bulk")
+        call_command("create_payrolls", "--bulk")
+
+        payrolls = accounting_models.Payroll.objects.all()
+        self.assertEqual(payrolls.count(), 2)
+        loans = employees_models.Loan.objects.all()
+        self.assertEqual(loans.count(), 2)
+
+    def test_run_bulk_employee_balance(self):
+        """ Validate employee balance updated with the bulk loans """
+
+        # Get main data
+        weekly_assistance = self.weekly_assistances[0]
+        employee = weekly_assistance.service.employee
+        weekly_assistance.monday = True
+        weekly_assistance.tuesday = True
+        weekly_assistance.wednesday = True
+        weekly_assistance.thursday = True
+        weekly_assistance.friday = True
+        weekly_assistance.saturday = True
+        weekly_assistance.sunday = True
+        weekly_assistance.save()
+
+        # Create loan to employee
+        employees_models.Loan.objects.create(
+            employee=employee,
+            amount=-150,
+            details="Descuento de prueba",
+        )
+
+        call_command("create_payrolls", "--bulk")
+
+        # Validate payroll snapshot and balance
+        payroll = accounting_models.Payroll.objects.get(
+            weekly_assistance=weekly_assistance
+        )
+        self.assertEqual(payroll.discount_loans, -100)
+        self.assertEqual(payroll.snapshot_total, 0)
+        self.assertFalse(payroll.is_dirty)
+        employee.refresh_from_db()
+        self.assertEqual(employee.balance, -50)
+
+
+class CommandCreateDisbursement(TestCase):
+    
+    def setUp(self):
+        
+        # Create initial data
+        call_command("apps_loaddata")
+        self.banks = [
+            employees_models.Bank.objects.create(name="Banco A"),
+            employees_models.Bank.objects.create(name="Banco B"),
+        ]
+        
+        # Payrolls: 2 in bank A, 1 in bank B, 1 skipped and 1 paid
+        payrolls_data = [
+            (self.banks[0], False, False),
+            (self.banks[0], False, False),
+            (self.banks[1], False, False),
+            (self.banks[1], True, False),
+            (self.banks[1], False, True),
+        ]
+        self.payrolls = []
+        for employee_num, (bank, skip_payment, paid) in enumerate(payrolls_data):
+            employee = test_data.create_employee(
+                curp=f"CURP{employee_num}",
+                ine=f"INE{employee_num}",
+                phone=f"PHONE{employee_num}",
+            )
+            employees_models.Employee.objects.filter(id=employee.id).update(
+                bank=bank,
+                card_number=f"000000000000000{employee_num}",
+                weekly_rate=700,
+            )
+            employee.refresh_from_db()
+            service = test_data.create_service(employee=employee)
+            weekly_assistance = test_data.create_weekly_assistance(service=service)
+            for day in WEEK_DAYS:
+                setattr(weekly_assistance, day, True)
+            weekly_assistance.save()
+            
+            payroll = test_data.create_payroll(
+                skip_payment=skip_payment,
+                weekly_assistance=weekly_assistance,
+            )
+            payroll.paid = paid
+            payroll.save()
+            self.payrolls.append(payroll)
+            
+        self.week_number = self.payrolls[0].weekly_assistance.week_number
+        
+    def get_lines(self, disbursement_file) -> list:
+        """ Return the lines of a disbursement file """
+        
+        with disbursement_file.file.open("rb") as file:
+            return file.read().decode("utf-8").splitlines()
+        
+    def test_run_files_per_bank(self):
+        """ Validate one file per bank, without skipped or paid payrolls """
+        
+        call_command("create_disbursement", "--week", str(self.week_number))
+        
+        batch = accounting_models.DisbursementBatch.objects.get()
+        self.assertEqual(batch.rows_count, 3)
+        self.assertEqual(batch.total_amount, 3 * 700)
+        
+        files = {
+            disbursement_file.bank: disbursement_file
+            for disbursement_file in batch.files.all()
+        }
+        self.assertEqual(files[self.banks[0]].rows_count, 2)
+        self.assertEqual(files[self.banks[1]].rows_count, 1)
+        
+        # Validate csv content (header and rows)
+        lines = self.get_lines(files[self.banks[1]])
+        self.assertEqual(lines[0], "tarjeta,nombre,monto,referencia")
+        self.assertEqual(
+            lines[1],
+            f"0000000000000002,John Doe,700.00,NOMINA SEMANA {self.week_number}"
+        )
+        
+    def test_run_fixed_width(self):
+        """ Validate fixed width layout """
+        
+        call_command(
+            "create_disbursement",
+            "--week", str(self.week_number),
+            "--layout", "fixed",
+        )
+        
+        disbursement_file = accounting_models.DisbursementFile.objects.get(
+            bank=self.banks[1]
+        )
+        lines = self.get_lines(disbursement_file)
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(len(lines[0]), 16 + 40 + 15 + 20)
+        self.assertEqual(lines[0][:16], "0000000000000002")
+        self.assertEqual(lines[0][16:56].strip(), "JOHN DOE")
+        self.assertEqual(lines[0][56:71], "000000000070000")
+        
+    def test_run_fixed_width_truncate_name(self):
+        """ Validate long names truncated to the column width """
+        
+        employee = self.payrolls[2].weekly_assistance.service.employee
+        employees_models.Employee.objects.filter(id=employee.id).update(
+            last_name_1="Hernandez Montes de Oca",
+            last_name_2="Fernandez de Cordoba",
+        )
+        
+        call_command(
+            "create_disbursement",
+            "--week", str(self.week_number),
+            "--layout", "fixed",
+        )
+        
+        disbursement_file = accounting_models.DisbursementFile.objects.get(
+            bank=self.banks[1]
+        )
+        line = self.get_lines(disbursement_file)[0]
+        self.assertEqual(len(line), 16 + 40 + 15 + 20)
+        self.assertEqual(line[16:56], "JOHN HERNANDEZ MONTES DE OCA FERNANDEZ D")
+        self.assertEqual(line[56:71], "000000000070000")
+        
+    def test_run_fixed_width_card_too_long(self):
+        """ Validate error (and no batch) when a card number doesn't fit
+        its column """
+        
+        employee = self.payrolls[2].weekly_assistance.service.employee
+        employees_models.Employee.objects.filter(id=employee.id).update(
+            card_number="000000000000000002",
+        )
+        
+        with self.assertRaises(CommandError):
+            call_command(
+                "create_disbursement",
+                "--week", str(self.week_number),
+                "--layout", "fixed",
+            )
+        
+        self.assertFalse(accounting_models.DisbursementBatch.objects.exists())
+        self.assertFalse(accounting_models.DisbursementFile.objects.exists())
+        
+    def test_run_checksum(self):
+        """ Validate the files and batch checksums """
+        
+        call_command("create_disbursement", "--week", str(self.week_number))
+        
+        batch = accounting_models.DisbursementBatch.objects.get()
+        batch_hash = hashlib.sha256()
+        for disbursement_file in batch.files.order_by("bank_id"):
+            with disbursement_file.file.open("rb") as file:
+                content = file.read()
+            self.assertEqual(
+                hashlib.sha256(content).hexdigest(), disbursement_file.checksum
+            )
+            batch_hash.update(content)
+        self.assertEqual(batch_hash.hexdigest(), batch.checksum)
@@ -4,6 +4,8 @@ from django.utils import timezone
 from django.conf import settings
 
 from utils import test_data
+from accounting import models as accounting_models
+from accounting.calculator import PayrollCalculator
 from assistance import models as assistance_models
 from employees import models as employees_models
 
@@ -439,4 +441,182 @@ class PayrollTest(TestCase):
         )
         self.assertEqual(self.payroll.total, 0)
         
-        
\ No newline at end of file
+        
+
+class PayrollMemoizedFiguresTest(TestCase):
+    """ Test memoized figures in each payroll instance """
+    
+    def setUp(self):
+        
+        # Load initial data
+        call_command("apps_loaddata")
+        
+        self.payroll = test_data.create_payroll()
+        self.assistance = test_data.create_assistance(
+            weekly_assistance=self.payroll.weekly_assistance
+        )
+        test_data.create_extra_payment(
+            assistance=self.assistance,
+            category=assistance_models.ExtraPaymentCategory.objects.get(
+                name="Bono"
+            ),
+            amount=50,
+        )
+        self.fields = [
+            "weekly_rate",
+            "daily_rate",
+            "worked_days",
+            "no_attendance_days",
+            "no_attendance_penalty",
+            "penalties_amount",
+            "bonuses_amount",
+            "other_amount",
+            "extra_unpaid_hours_amount",
+            "subtotal",
+            "discount_amount",
+            "total",
+        ]
+        
+        # Payroll with the employee loaded and the schedules catalog
+        self.payroll = accounting_models.Payroll.objects.select_related(
+            "weekly_assistance__service__employee"
+        ).get(id=self.payroll.id)
+        self.payroll.weekly_assistance.service.schedule
+        
+    def test_query_count(self):
+        """ Validate all the figures use 2 queries (extras and unpaid hours)
+        and then are reused """
+        
+        with self.assertNumQueries(2):
+            for field in self.fields:
+                getattr(self.payroll, field)
+            self.payroll.get_hour_rate()
+        
+        with self.assertNumQueries(0):
+            for field in self.fields:
+                getattr(self.payroll, field)
+                
+    def test_reset_extras_changed(self):
+        """ Validate figures are updated when the extras change """
+        
+        self.assertEqual(self.payroll.bonuses_amount, 50)
+        test_data.create_extra_payment(
+            assistance=self.assistance,
+            category=assistance_models.ExtraPaymentCategory.objects.get(
+                name="Bono"
+            ),
+            amount=20,
+        )
+        self.assertEqual(self.payroll.bonuses_amount, 70)
+    
+    def test_reset_refresh(self):
+        """ Validate memoized figures are reset when refreshing the payroll """
+        
+        self.assertEqual(self.payroll.bonuses_amount, 50)
+        self.payroll.refresh_from_db()
+        self.assertIsNone(self.payroll.figures_context)
+    
+    def test_reset_attached_figures(self):
+        """ Validate figures attached in bulk are reset on save and refresh """
+        
+        PayrollCalculator(
+            accounting_models.Payroll.objects.filter(id=self.payroll.id)
+        ).attach([self.payroll])
+        self.assertIsNotNone(self.payroll.figures)
+        self.payroll.save()
+        self.assertIsNone(self.payroll.figures)
+        
+        PayrollCalculator(
+            accounting_models.Payroll.objects.filter(id=self.payroll.id)
+        ).attach([self.payroll])
+        self.payroll.refresh_from_db()
+        self.assertIsNone(self.payroll.figures)
+        self.assertEqual(self.payroll.bonuses_amount, 50)
+    
+    
+class PayrollSnapshotTest(TestCase):
+    """Test stored figures snapshot in payroll"""
+
+    def setUp(self):
+
+        # Load initial data
+        call_command("apps_loaddata")
+
+        self.payroll = test_data.create_payroll()
+        self.assistance = test_data.create_assistance(
+            weekly_assistance=self.payroll.weekly_assistance,
+        )
+        self.bonus_category = assistance_models.ExtraPaymentCategory.objects.get(
+            name="Bono"
+        )
+
+    def test_snapshot_created(self):
+        """Validate snapshot saved when the payroll is created"""
+
+        self.payroll.refresh_from_db()
+        self.assertFalse(self.payroll.is_dirty)
+        self.assertIsNotNone(self.payroll.calculated_at)
+        self.assertEqual(self.payroll.snapshot_total, self.payroll.total)
+
+    def test_snapshot_updated_extra_payment(self):
+        """Validate snapshot updated when an extra payment is saved"""
+
+        test_data.create_extra_payment(
+            assistance=self.assistance, category=self.bonus_category, amount=50
+        )
+
+        self.payroll.refresh_from_db()
+        self.assertEqual(self.payroll.snapshot_bonuses_amount, 50)
+        self.assertEqual(self.payroll.snapshot_subtotal, self.payroll.subtotal)
+
+    def test_snapshot_updated_assistance(self):
+        """Validate snapshot updated when an assistance is saved"""
+
+        self.assistance.extra_unpaid_hours = 2
+        self.assistance.save()
+
+        self.payroll.refresh_from_db()
+        self.assertEqual(
+            self.payroll.snapshot_extra_unpaid_hours_amount,
+            self.payroll.extra_unpaid_hours_amount,
+        )
+        self.assertGreater(self.payroll.snapshot_extra_unpaid_hours_amount, 0)
+
+    def test_snapshot_frozen_paid(self):
+        """Validate snapshot not updated after the payroll is paid"""
+
+        self.payroll.paid = True
+        self.payroll.save()
+
+        test_data.create_extra_payment(
+            assistance=self.assistance, category=self.bonus_category, amount=50
+        )
+        employee = self.payroll.weekly_assistance.service.employee
+        employee.weekly_rate = 5000
+        employee.save()
+        call_command("recalculate_payrolls")
+
+        self.payroll.refresh_from_db()
+        self.assertEqual(self.payroll.snapshot_bonuses_amount, 0)
+        self.assertEqual(self.payroll.snapshot_weekly_rate, 100)
+
+    def test_snapshot_only_affected_payroll(self):
+        """Validate only the payroll of the changed week is recalculated"""
+
+        # Other service of the same employee (one weekly assistance per
+        # service and week)
+        other_payroll = test_data.create_payroll(
+            weekly_assistance=test_data.create_weekly_assistance(
+                service=test_data.create_service(
+                    employee=self.payroll.weekly_assistance.service.employee
+                )
+            )
+        )
+        other_calculated_at = other_payroll.calculated_at
+
+        test_data.create_extra_payment(
+            assistance=self.assistance, category=self.bonus_category, amount=50
+        )
+
+        other_payroll.refresh_from_db()
+        self.assertEqual(other_payroll.calculated_at, other_calculated_at)
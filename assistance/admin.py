@@ -1,10 +1,18 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.shortcuts import render
+from django.urls import path
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.html import format_html
 
-from assistance import models
+from assistance import models, rollups
+from assistance.coverage import get_agreements_counts, get_coverage_gaps
 from utils.admin_filters import (
     TodayDateFilter, YearFilter, WeekNumberFilter
 )
+from utils.dates import get_week_key
 from utils.excel import get_excel_response
 
 
@@ -46,6 +54,28 @@ class AssistanceAdmin(admin.ModelAdmin):
     list_editable = ('attendance', 'extra_paid_hours',
                      'extra_unpaid_hours', 'notes')
 
+    def changelist_view(self, request, extra_context=None):
+        """ Save the list_editable changes in batch, in a single transaction
+        (one bulk update and one recalculation per weekly assistance) """
+        
+        if request.method != "POST" or "_save" not in request.POST:
+            return super().changelist_view(request, extra_context)
+        
+        request.assistances_batch = []
+        with transaction.atomic():
+            response = super().changelist_view(request, extra_context)
+            models.Assistance.bulk_save(request.assistances_batch)
+        return response
+    
+    def save_model(self, request, obj, form, change):
+        """ Collect the list_editable changes, to save them in batch """
+        
+        assistances_batch = getattr(request, "assistances_batch", None)
+        if change and assistances_batch is not None:
+            assistances_batch.append(obj)
+            return
+        super().save_model(request, obj, form, change)
+
     # Custom fields
     def company(self, obj):
         """ Return the company name """
@@ -76,6 +106,34 @@ class AssistanceAdmin(admin.ModelAdmin):
     employee.short_description = 'Empleado'
     custom_links.short_description = 'Acciones'
 
+    # Custom views
+    def get_urls(self):
+        """ Setup custom urls """
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                "coverage-gaps/",
+                self.admin_site.admin_view(self.coverage_gaps),
+                name="assistance_coverage_gaps",
+            ),
+        ]
+        return custom_urls + urls
+
+    def coverage_gaps(self, request):
+        """ Custom view with the services without attendance today """
+
+        # Check if user has the required permission
+        if not request.user.has_perm("assistance.view_assistance"):
+            raise PermissionDenied
+
+        gaps = get_coverage_gaps()
+        context = self.admin_site.each_context(request)
+        context["gaps"] = gaps
+        context["agreements_counts"] = get_agreements_counts(gaps)
+        context["title"] = "Servicios sin cobertura"
+
+        return render(request, "assistance/coverage-gaps.html", context)
+
 
 @admin.register(models.WeeklyAssistance)
 class WeeklyAssistanceAdmin(admin.ModelAdmin):
@@ -127,6 +185,7 @@ class WeeklyAssistanceAdmin(admin.ModelAdmin):
         'notes',
     )
     year_filter_field = "start_date"
+    week_key_filter_field = "week_key"
 
     # Custom fields
     def company_name(self, obj):
@@ -163,6 +222,7 @@ class WeeklyAssistanceAdmin(admin.ModelAdmin):
     def export_excel(self, request, queryset):
         """ Export the queryset to an Excel file with custom styles """
         
+        queryset = queryset.select_related('service__agreement', 'service__employee')
         return get_excel_response(queryset, "Asistencias Semana")
 
     export_excel.short_description = 'Exportar a Excel'
@@ -201,4 +261,125 @@ class ExtraPaymentAdmin(admin.ModelAdmin):
         'created_at',
         'updated_at',
     )
-    raw_id_fields = ('assistance',)
\ No newline at end of file
+    raw_id_fields = ('assistance',)
+
+
+@admin.register(models.CheckIn)
+class CheckInAdmin(admin.ModelAdmin):
+    """ QR check-ins queue admin (read only) """
+
+    list_display = (
+        'code',
+        'scanned_at',
+        'processed_at',
+        'error',
+    )
+    search_fields = (
+        'code',
+    )
+    list_filter = (
+        'processed_at',
+    )
+    ordering = ('-id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(models.AttendanceWeekRollup)
+class AttendanceWeekRollupAdmin(admin.ModelAdmin):
+    """ Weekly attendance rollups admin (read only) and absences report """
+
+    list_display = (
+        'week_key',
+        'agreement',
+        'employee',
+        'expected_attendances',
+        'attendances',
+        'absences',
+        'extra_paid_hours',
+        'extra_unpaid_hours',
+    )
+    search_fields = (
+        'agreement__company_name',
+        'employee__name',
+        'employee__last_name_1',
+        'employee__last_name_2',
+    )
+    list_filter = (
+        'agreement__company_name',
+    )
+    list_select_related = ('agreement', 'employee')
+    ordering = ('-week_key',)
+
+    report_groups = {
+        "agreement": "Empresa",
+        "employee": "Empleado",
+        "week": "Semana",
+    }
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    # Custom views
+    def get_urls(self):
+        """ Setup custom urls """
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                "report/",
+                self.admin_site.admin_view(self.attendance_report),
+                name="assistance_attendance_report",
+            ),
+        ]
+        return custom_urls + urls
+
+    def attendance_report(self, request):
+        """ Custom view with the absences by agreement, employee or week
+        (last year by default) """
+
+        # Check if user has the required permission
+        if not request.user.has_perm("assistance.view_attendanceweekrollup"):
+            raise PermissionDenied
+
+        # Filters (impossible dates show the form with an error)
+        today = timezone.localdate()
+        error = None
+        try:
+            start = parse_date(request.GET.get("start", "")) \
+                or today - timezone.timedelta(days=365)
+            end = parse_date(request.GET.get("end", "")) or today
+        except ValueError:
+            error = "Fecha inválida, revisa las fechas del reporte"
+            start = today - timezone.timedelta(days=365)
+            end = today
+        group = request.GET.get("group")
+        if group not in self.report_groups:
+            group = "agreement"
+
+        context = self.admin_site.each_context(request)
+        context["report"] = []
+        if not error:
+            context["report"] = rollups.get_report(
+                get_week_key(start), get_week_key(end), group
+            )
+        context["error"] = error
+        context["start"] = start
+        context["end"] = end
+        context["group"] = group
+        context["groups"] = self.report_groups
+        context["group_label"] = self.report_groups[group]
+        context["title"] = "Reporte de faltas"
+
+        return render(
+            request,
+            "assistance/attendance-report.html",
+            context,
+            status=400 if error else 200,
+        )
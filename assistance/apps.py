@@ -5,3 +5,7 @@ class AssistanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'assistance'
     verbose_name = 'Asistencias'
+
+    def ready(self):
+        # Register the changed weeks of the attendance rollups
+        from assistance import signals  # noqa: F401
@@ -0,0 +1,80 @@
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from assistance import models as assistance_models
+from services import models as services_models
+from utils import payroll_calendar
+
+
+def get_coverage_gaps(now=None) -> list:
+    """ Return the services without attendance today whose schedule
+    already started (single query with two correlated subqueries)
+
+    Args:
+        now (datetime): Current date and time (default: now)
+
+    Returns:
+        list: Rows with the service, agreement, employee and schedule data,
+            and "has_assistance" (False: missing assistance,
+            True: assistance without attendance)
+    """
+
+    if now is None:
+        now = timezone.now()
+    now = timezone.localtime(now)
+    calendar_day = payroll_calendar.get_day(now)
+
+    today_assistances = assistance_models.Assistance.objects.filter(
+        weekly_assistance__service=OuterRef("pk"),
+        weekly_assistance__week_key=calendar_day.week_key,
+        date=calendar_day.date,
+    )
+    services = services_models.Service.objects.filter(
+        schedule__start_time__lte=now.time(),
+    ).annotate(
+        has_assistance=Exists(today_assistances),
+        has_attendance=Exists(today_assistances.filter(attendance=True)),
+    ).filter(
+        has_attendance=False,
+    ).order_by(
+        "agreement__company_name",
+        "schedule__start_time",
+        "id",
+    )
+
+    return list(services.values(
+        "id",
+        "location",
+        "has_assistance",
+        "agreement_id",
+        "agreement__company_name",
+        "employee__name",
+        "employee__last_name_1",
+        "employee__last_name_2",
+        "schedule__name",
+        "schedule__start_time",
+    ))
+
+
+def get_agreements_counts(gaps: list) -> dict:
+    """ Count the coverage gaps of each agreement
+
+    Args:
+        gaps (list): Rows returned by get_coverage_gaps
+
+    Returns:
+        dict: {company name: {"missing": int, "absent": int, "total": int}}
+    """
+
+    counts = {}
+    for gap in gaps:
+        agreement_counts = counts.setdefault(
+            gap["agreement__company_name"],
+            {"missing": 0, "absent": 0, "total": 0},
+        )
+        if gap["has_assistance"]:
+            agreement_counts["absent"] += 1
+        else:
+            agreement_counts["missing"] += 1
+        agreement_counts["total"] += 1
+    return counts
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assistance.coverage import get_agreements_counts, get_coverage_gaps
+
+
+class Command(BaseCommand):
+    help = 'List the services without attendance today after the shift start'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--summary',
+            action='store_true',
+            help='Print only the counts by agreement',
+        )
+    
+    def handle(self, *args, **options):
+        
+        start_time = time.perf_counter()
+        gaps = get_coverage_gaps()
+        elapsed = time.perf_counter() - start_time
+        
+        # Services without attendance
+        if not options['summary']:
+            for gap in gaps:
+                employee = " ".join(filter(None, [
+                    gap["employee__name"],
+                    gap["employee__last_name_1"],
+                    gap["employee__last_name_2"],
+                ]))
+                status = "No attendance" if gap["has_assistance"] \
+                    else "Missing assistance"
+                print(
+                    f"{gap['agreement__company_name']} - {gap['location']} "
+                    f"({gap['schedule__name']} {gap['schedule__start_time']:%H:%M}) "
+                    f"- {employee}: {status}"
+                )
+        
+        # Counts by agreement
+        for company_name, counts in get_agreements_counts(gaps).items():
+            print(
+                f"{company_name}: {counts['total']} uncovered services "
+                f"({counts['missing']} missing, {counts['absent']} absent)"
+            )
+        print(f"Found {len(gaps)} coverage gaps in {elapsed:.3f}s")
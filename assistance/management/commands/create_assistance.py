@@ -1,42 +1,39 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from assistance.models import Assistance, WeeklyAssistance
+from assistance.models import Assistance
 from services import models as services_models
-from utils.dates import get_current_week
 
 
 class Command(BaseCommand):
     help = 'Create a daily assistance for each service'
     
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Assistances created in each query',
+        )
+    
     def handle(self, *args, **options):
         
-        services = services_models.Service.objects.all()
+        start_time = time.perf_counter()
+        result = Assistance.create_day(batch_size=options['batch_size'])
         
-        for service in services:
-            
-            print(f"Service: {service}")
-            
-            # Get or create weekly assistance
-            week_number = get_current_week()
-            weekly_assistance = WeeklyAssistance.objects.get(
-                service=service,
-                week_number=week_number,
-            )
-            
-            today = timezone.now().date()
-            assistance = Assistance.objects.filter(
-                date=today,
-                weekly_assistance=weekly_assistance
+        # Print summary
+        elapsed = time.perf_counter() - start_time
+        print(
+            f"Created {result['created']} assistances for "
+            f"{timezone.localdate()} ({result['existing']} already existed) "
+            f"in {elapsed:.2f}s"
+        )
+        weekly_assistances_num = result['created'] + result['existing']
+        services_num = services_models.Service.objects.count()
+        if services_num > weekly_assistances_num:
+            print(
+                f"{services_num - weekly_assistances_num} services without "
+                "weekly assistance (run create_weekly_assistance)"
             )
-            if assistance:
-                # Skip this service
-                print("\tAssistance already exists")
-            else:
-                # Create new asistance for today
-                assistance = Assistance.objects.create(
-                    attendance=False,
-                    weekly_assistance=weekly_assistance
-                )
-                assistance.save()
-                print("\tCreated assistance")
\ No newline at end of file
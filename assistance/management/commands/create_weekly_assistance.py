@@ -1,31 +1,32 @@
+import time
+
 from django.core.management.base import BaseCommand
 
 from assistance import models as assistance_models
-from services import models as services_models
-from utils.dates import get_current_week
 
 
 class Command(BaseCommand):
-    help = 'Create a daily assistance for each service'
+    help = 'Create a weekly assistance for each service'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Weekly assistances created in each query',
+        )
     
     def handle(self, *args, **options):
-        services = services_models.Service.objects.all()
         
-        for service in services:
-            
-            print(f"Service: {service}")
-            
-            weekly_assistance = assistance_models.WeeklyAssistance.objects.filter(
-                service=service,
-                week_number=get_current_week()
-            )
-            if weekly_assistance:
-                # Skip week creation
-                print("\tWeekly assistance already exists")
-            else:
-                # Create new weekly assistance
-                weekly_assistance = assistance_models.WeeklyAssistance(
-                    service=service,
-                )
-                weekly_assistance.save()
-                print("\tCreated weekly assistance")
\ No newline at end of file
+        start_time = time.perf_counter()
+        result = assistance_models.WeeklyAssistance.create_week(
+            batch_size=options['batch_size']
+        )
+        
+        # Print summary
+        elapsed = time.perf_counter() - start_time
+        print(
+            f"Created {result['created']} weekly assistances for "
+            f"{result['created'] + result['existing']} services "
+            f"({result['existing']} already existed) in {elapsed:.2f}s"
+        )
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from assistance.models import CheckIn
+
+
+class Command(BaseCommand):
+    help = 'Register the attendances of the queued QR check-ins'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Check-ins registered in each batch',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep waiting for new check-ins',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1,
+            help='Seconds to wait when the queue is empty (with --loop)',
+        )
+    
+    def handle(self, *args, **options):
+        
+        while True:
+            start_time = time.perf_counter()
+            check_ins = CheckIn.process_pending(options['batch_size'])
+            
+            if check_ins:
+                self.print_metrics(check_ins, time.perf_counter() - start_time)
+            elif not options['loop']:
+                break
+            else:
+                time.sleep(options['sleep'])
+    
+    def print_metrics(self, check_ins: list, elapsed: float):
+        """ Print the batch size, errors and lag (time from scan to register)
+        
+        Args:
+            check_ins (list): Processed check-ins
+            elapsed (float): Seconds to process the batch
+        """
+        
+        lags = [
+            (check_in.processed_at - check_in.scanned_at).total_seconds()
+            for check_in in check_ins
+        ]
+        errors = sum(1 for check_in in check_ins if check_in.error)
+        pending = CheckIn.objects.filter(processed_at__isnull=True).count()
+        print(
+            f"{timezone.now():%Y-%m-%d %H:%M:%S} "
+            f"Processed {len(check_ins)} check-ins ({errors} errors) "
+            f"in {elapsed:.2f}s - lag avg {sum(lags) / len(lags):.1f}s, "
+            f"max {max(lags):.1f}s - {pending} pending"
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from assistance import rollups
+from assistance.models import AttendanceRollupChange, WeeklyAssistance
+
+
+class Command(BaseCommand):
+    help = 'Refresh the attendance rollups of the changed weeks'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild the rollups of all the weeks',
+        )
+    
+    def handle(self, *args, **options):
+        
+        start_time = time.perf_counter()
+        
+        # Register all the weeks as changed
+        if options['all']:
+            week_keys = WeeklyAssistance.objects.values_list(
+                'week_key', flat=True
+            ).distinct()
+            AttendanceRollupChange.mark_weeks(week_keys)
+        
+        week_keys = rollups.refresh_changed_weeks()
+        
+        elapsed = time.perf_counter() - start_time
+        for week_key in week_keys:
+            print(f"Refreshed week {week_key}")
+        print(f"Refreshed {len(week_keys)} weeks in {elapsed:.2f}s")
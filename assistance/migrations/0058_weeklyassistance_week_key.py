@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def get_week(date) -> tuple:
+    """ Return the week key (year * 100 + week number) and week number
+    of a date, using Thursday as the first day of the week """
+
+    if date.weekday() < 3:
+        date = date - timedelta(days=date.weekday() + 3)
+    year, week_number, _ = date.isocalendar()
+    return year * 100 + week_number, week_number
+
+
+def backfill_week_key(apps, schema_editor):
+    """ Calculate the week key from the first attendance date of each
+    weekly assistance (the start date was overwritten on every save),
+    or from the start date if it has no assistances """
+
+    WeeklyAssistance = apps.get_model("assistance", "WeeklyAssistance")
+    weekly_assistances = WeeklyAssistance.objects.annotate(
+        first_date=Min("assistance__date")
+    ).values_list("id", "first_date", "start_date").order_by("id")
+    updated = []
+    for weekly_assistance_id, first_date, start_date in weekly_assistances.iterator(
+        chunk_size=1000
+    ):
+        week_key, week_number = get_week(first_date or start_date)
+        updated.append(WeeklyAssistance(
+            id=weekly_assistance_id,
+            week_key=week_key,
+            week_number=week_number,
+        ))
+
+        if len(updated) == 1000:
+            WeeklyAssistance.objects.bulk_update(
+                updated, ["week_key", "week_number"]
+            )
+            updated = []
+    WeeklyAssistance.objects.bulk_update(updated, ["week_key", "week_number"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assistance", "0057_alter_extrapayment_amount"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="weeklyassistance",
+            name="week_key",
+            field=models.IntegerField(
+                null=True,
+                editable=False,
+                help_text="Año y número de semana (ej. 202452)",
+                verbose_name="Semana (año y número)",
+            ),
+        ),
+        migrations.RunPython(backfill_week_key, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="weeklyassistance",
+            name="week_key",
+            field=models.IntegerField(
+                db_index=True,
+                editable=False,
+                help_text="Año y número de semana (ej. 202452)",
+                verbose_name="Semana (año y número)",
+            ),
+        ),
+    ]
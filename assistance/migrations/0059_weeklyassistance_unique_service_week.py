@@ -0,0 +1,121 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:47
+
+from django.db import migrations, models
+from django.db.models import Count
+
+WEEK_DAYS = [
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+    "monday",
+    "tuesday",
+    "wednesday",
+]
+
+
+def merge_duplicated_weeks(apps, schema_editor):
+    """ Merge the weekly assistances of the same service and week
+    (legacy rows saved on different days of a week) before the unique
+    constraint: the assistances are moved to the kept row (the oldest one),
+    with the attendances, extra hours and notes of all, and only one
+    payroll of the week is kept """
+
+    WeeklyAssistance = apps.get_model("assistance", "WeeklyAssistance")
+    Assistance = apps.get_model("assistance", "Assistance")
+    Payroll = apps.get_model("accounting", "Payroll")
+
+    duplicated_weeks = WeeklyAssistance.objects.values(
+        "service_id", "week_key"
+    ).annotate(
+        rows=Count("id")
+    ).filter(rows__gt=1).order_by()
+
+    for duplicated_week in duplicated_weeks:
+        weekly_assistances = list(WeeklyAssistance.objects.filter(
+            service_id=duplicated_week["service_id"],
+            week_key=duplicated_week["week_key"],
+        ).order_by("id"))
+        kept = weekly_assistances[0]
+        merged = weekly_assistances[1:]
+        merged_ids = [weekly_assistance.id for weekly_assistance in merged]
+
+        # Join the week data in the kept row
+        notes = [kept.notes] if kept.notes else []
+        for weekly_assistance in merged:
+            for day in WEEK_DAYS:
+                if getattr(weekly_assistance, day):
+                    setattr(kept, day, True)
+            kept.total_extra_paid_hours += weekly_assistance.total_extra_paid_hours
+            kept.total_extra_unpaid_hours += weekly_assistance.total_extra_unpaid_hours
+            if weekly_assistance.notes:
+                notes.append(weekly_assistance.notes)
+        kept.notes = "\n".join(notes) if notes else kept.notes
+        kept.save(update_fields=WEEK_DAYS + [
+            "total_extra_paid_hours",
+            "total_extra_unpaid_hours",
+            "notes",
+        ])
+
+        # Move the assistances and keep one payroll of the week
+        Assistance.objects.filter(weekly_assistance_id__in=merged_ids).update(
+            weekly_assistance_id=kept.id
+        )
+        merge_payrolls(Payroll, kept.id, merged_ids)
+        WeeklyAssistance.objects.filter(id__in=merged_ids).delete()
+
+
+def merge_payrolls(Payroll, kept_id: int, merged_ids: list):
+    """ Keep a single payroll in the merged week, so the employee is not
+    paid twice: the paid payroll if any (untouched, its figures are frozen)
+    or the oldest unpaid one (recalculated with the merged week). The other
+    unpaid payrolls are deleted
+    
+    Raises:
+        RuntimeError: More than one payroll of the week is already paid
+            (must be solved manually before migrating)
+    """
+    
+    payrolls = list(Payroll.objects.filter(
+        weekly_assistance_id__in=[kept_id] + merged_ids
+    ).order_by("-paid", "id"))
+    if not payrolls:
+        return
+    
+    paid_ids = [payroll.id for payroll in payrolls if payroll.paid]
+    if len(paid_ids) > 1:
+        raise RuntimeError(
+            f"Weekly assistances {[kept_id] + merged_ids} are the same week "
+            f"and have more than one paid payroll ({paid_ids}): "
+            "solve them manually before migrating"
+        )
+    
+    kept_payroll = payrolls[0]
+    Payroll.objects.filter(
+        id__in=[payroll.id for payroll in payrolls[1:]]
+    ).delete()
+    if kept_payroll.paid:
+        Payroll.objects.filter(id=kept_payroll.id).update(
+            weekly_assistance_id=kept_id
+        )
+    else:
+        Payroll.objects.filter(id=kept_payroll.id).update(
+            weekly_assistance_id=kept_id,
+            is_dirty=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistance', '0058_weeklyassistance_week_key'),
+        ('accounting', '0010_payroll_snapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicated_weeks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='weeklyassistance',
+            constraint=models.UniqueConstraint(fields=('service', 'week_key'), name='unique_weekly_assistance_service_week'),
+        ),
+    ]
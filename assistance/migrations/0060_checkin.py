@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistance', '0059_weeklyassistance_unique_service_week'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckIn',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('code', models.CharField(max_length=6, verbose_name='Código de empleado')),
+                ('scanned_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha de escaneo')),
+                ('processed_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Fecha de registro')),
+                ('error', models.CharField(blank=True, max_length=255, null=True, verbose_name='Error')),
+            ],
+            options={
+                'verbose_name': 'Registro QR',
+                'verbose_name_plural': 'Registros QR',
+            },
+        ),
+    ]
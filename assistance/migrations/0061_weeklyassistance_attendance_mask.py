@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:03
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+WEEK_DAYS = [
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+    "monday",
+    "tuesday",
+    "wednesday",
+]
+
+
+def backfill_attendance_mask(apps, schema_editor):
+    """ Calculate the attendance mask and worked days from the week day
+    flags (single UPDATE) """
+
+    WeeklyAssistance = apps.get_model("assistance", "WeeklyAssistance")
+    attendance_mask = Value(0)
+    worked_days = Value(0)
+    for bit, day_name in enumerate(WEEK_DAYS):
+        attendance_mask = attendance_mask + Case(
+            When(**{day_name: True}, then=Value(1 << bit)), default=Value(0)
+        )
+        worked_days = worked_days + Case(
+            When(**{day_name: True}, then=Value(1)), default=Value(0)
+        )
+    WeeklyAssistance.objects.update(
+        attendance_mask=attendance_mask,
+        worked_days=worked_days,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistance', '0060_checkin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weeklyassistance',
+            name='attendance_mask',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Un bit por día de la semana, desde el jueves (bit 0)', verbose_name='Días asistidos (bits)'),
+        ),
+        migrations.AddField(
+            model_name='weeklyassistance',
+            name='worked_days',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Días trabajados'),
+        ),
+        migrations.RunPython(backfill_attendance_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0011_schedule_hours_schedule_weekly_attendances'),
+        ('employees', '0034_alter_employee_languages'),
+        ('assistance', '0061_weeklyassistance_attendance_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceRollupChange',
+            fields=[
+                ('week_key', models.IntegerField(primary_key=True, serialize=False, verbose_name='Semana (año y número)')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha de cambio')),
+            ],
+            options={
+                'verbose_name': 'Semana pendiente de resumir',
+                'verbose_name_plural': 'Semanas pendientes de resumir',
+            },
+        ),
+        migrations.CreateModel(
+            name='AttendanceWeekRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('week_key', models.IntegerField(db_index=True, verbose_name='Semana (año y número)')),
+                ('expected_attendances', models.IntegerField(default=0, verbose_name='Asistencias esperadas')),
+                ('attendances', models.IntegerField(default=0, verbose_name='Asistencias')),
+                ('absences', models.IntegerField(default=0, verbose_name='Faltas')),
+                ('extra_paid_hours', models.IntegerField(default=0, verbose_name='Horas extras pagadas')),
+                ('extra_unpaid_hours', models.IntegerField(default=0, verbose_name='Horas extras no pagadas')),
+                ('agreement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='services.agreement', verbose_name='Contrato')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='employees.employee', verbose_name='Empleado')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='services.service', verbose_name='Servicio')),
+                ('weekly_assistance', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='assistance.weeklyassistance', verbose_name='Asistencia semanal')),
+            ],
+            options={
+                'verbose_name': 'Resumen semanal de asistencia',
+                'verbose_name_plural': 'Resúmenes semanales de asistencia',
+            },
+        ),
+        migrations.CreateModel(
+            name='AttendanceDayRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField(db_index=True, verbose_name='Fecha')),
+                ('week_key', models.IntegerField(db_index=True, verbose_name='Semana (año y número)')),
+                ('services', models.IntegerField(default=0, verbose_name='Servicios')),
+                ('expected_attendances', models.FloatField(default=0, help_text='Asistencias semanales de los horarios / 7', verbose_name='Asistencias esperadas')),
+                ('attendances', models.IntegerField(default=0, verbose_name='Asistencias')),
+                ('extra_paid_hours', models.IntegerField(default=0, verbose_name='Horas extras pagadas')),
+                ('extra_unpaid_hours', models.IntegerField(default=0, verbose_name='Horas extras no pagadas')),
+                ('agreement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='services.agreement', verbose_name='Contrato')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de asistencia',
+                'verbose_name_plural': 'Resúmenes diarios de asistencia',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='attendancedayrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'agreement'), name='unique_attendance_day_rollup'),
+        ),
+    ]
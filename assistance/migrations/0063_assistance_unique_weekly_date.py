@@ -0,0 +1,74 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:57
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def merge_duplicated_assistances(apps, schema_editor):
+    """ Merge the assistances of the same weekly assistance and date
+    (simultaneous scans or merged weeks) before the unique constraint:
+    the oldest one is kept, with the attendance, extra hours and notes
+    of all, and the rollups of the week are marked to refresh """
+
+    Assistance = apps.get_model("assistance", "Assistance")
+    AttendanceRollupChange = apps.get_model("assistance", "AttendanceRollupChange")
+
+    duplicated_days = Assistance.objects.filter(
+        weekly_assistance__isnull=False
+    ).values(
+        "weekly_assistance_id", "date"
+    ).annotate(
+        rows=Count("id")
+    ).filter(rows__gt=1).order_by()
+
+    changed_week_keys = set()
+    for duplicated_day in duplicated_days:
+        assistances = list(Assistance.objects.filter(
+            weekly_assistance_id=duplicated_day["weekly_assistance_id"],
+            date=duplicated_day["date"],
+        ).select_related("weekly_assistance").order_by("id"))
+        kept = assistances[0]
+        merged = assistances[1:]
+
+        # Join the day data in the kept row
+        notes = [kept.notes] if kept.notes else []
+        for assistance in merged:
+            kept.attendance = kept.attendance or assistance.attendance
+            kept.extra_paid_hours += assistance.extra_paid_hours
+            kept.extra_unpaid_hours += assistance.extra_unpaid_hours
+            if assistance.notes:
+                notes.append(assistance.notes)
+        kept.notes = "\n".join(notes) if notes else kept.notes
+        kept.save(update_fields=[
+            "attendance",
+            "extra_paid_hours",
+            "extra_unpaid_hours",
+            "notes",
+        ])
+
+        Assistance.objects.filter(
+            id__in=[assistance.id for assistance in merged]
+        ).delete()
+        changed_week_keys.add(kept.weekly_assistance.week_key)
+
+    for week_key in changed_week_keys:
+        AttendanceRollupChange.objects.update_or_create(
+            week_key=week_key,
+            defaults={"changed_at": timezone.now()},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assistance', '0062_attendance_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicated_assistances, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='assistance',
+            constraint=models.UniqueConstraint(fields=('weekly_assistance', 'date'), name='unique_assistance_weekly_date'),
+        ),
+    ]
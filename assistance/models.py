@@ -1,8 +1,37 @@
 from django.utils import timezone
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (
+    Case, Count, Exists, F, OuterRef, Q, Sum, Value, When
+)
+from django.db.models.functions import Greatest
+from assistance.signals import weekly_assistances_updated
 from services import models as services_models
-from utils.dates import get_week_day, get_current_week
+from utils import payroll_calendar
+from utils.dates import get_week_day
+
+
+# Week days of the weekly assistances, by bit of the attendance mask
+ATTENDANCE_DAYS = [
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+    "monday",
+    "tuesday",
+    "wednesday",
+]
+ALL_DAYS_MASK = (1 << len(ATTENDANCE_DAYS)) - 1
+
+# Assistance fields summarized in the weekly assistance
+WEEKLY_FIELDS = [
+    "date",
+    "attendance",
+    "extra_paid_hours",
+    "extra_unpaid_hours",
+    "notes",
+    "weekly_assistance_id",
+]
 
 
 class Assistance(models.Model):
@@ -49,43 +78,361 @@ class Assistance(models.Model):
     class Meta:
         verbose_name = 'Asistencia diaria'
         verbose_name_plural = 'Asistencias diarias'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['weekly_assistance', 'date'],
+                name='unique_assistance_weekly_date',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.date} - {self.weekly_assistance}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """ Keep the loaded values, to detect the changed fields """
+        
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def get_changed_fields(self) -> set:
+        """ Get the fields that affect the weekly assistance and changed
+        since the object was loaded (the fields with a value in new objects)
+        
+        Returns:
+            set: Changed field names
+        """
+        
+        loaded_values = getattr(self, "loaded_values", None)
+        if self._state.adding or loaded_values is None:
+            return {
+                field_name for field_name in WEEKLY_FIELDS
+                if getattr(self, field_name) not in (None, 0)
+            }
+        return {
+            field_name for field_name in WEEKLY_FIELDS
+            if field_name in loaded_values
+            and loaded_values[field_name] != getattr(self, field_name)
+        }
+    
     def save(self, *args, **kwargs):
+        """ Save the assistance, updating the week day, extra hours and notes
+        of the weekly assistance only when they change """
         
-        # Update weekly assistance data when change
-        if (self.id):
-
-            # Update weekday status
-            day_name = get_week_day(self.date, "en")
-            setattr(self.weekly_assistance, day_name, self.attendance)
+        changed_fields = self.get_changed_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            changed_fields &= {
+                self._meta.get_field(field_name).attname
+                for field_name in update_fields
+            }
+        
+        with transaction.atomic():
+            if changed_fields and self.weekly_assistance_id:
+                self.__update_weekly_assistance__(changed_fields)
             super(Assistance, self).save(*args, **kwargs)
-            
-            # Update weekly paid hours
-            all_weekly_assistances = Assistance.objects.filter(
-                weekly_assistance=self.weekly_assistance
+        
+        self.loaded_values = {
+            field_name: getattr(self, field_name) for field_name in WEEKLY_FIELDS
+        }
+    
+    @classmethod
+    def create_day(cls, batch_size: int = 1000, date=None) -> dict:
+        """ Create the missing assistances of today, without attendance,
+        for the weekly assistances of the current week (one anti-join
+        query, bulk insert and one week day update)
+        
+        Args:
+            batch_size (int): Assistances created in each query
+            date (date): Day to create (default: today)
+        
+        Returns:
+            dict: Number of assistances created and already existing
+        """
+        
+        calendar_day = payroll_calendar.get_day(date)
+        today = calendar_day.date
+        
+        # Weekly assistances of the week without assistance today
+        weekly_assistances = WeeklyAssistance.objects.filter(
+            week_key=calendar_day.week_key
+        )
+        today_assistances = cls.objects.filter(
+            weekly_assistance=OuterRef('pk'),
+            date=today,
+        )
+        missing_ids = list(
+            weekly_assistances.filter(
+                ~Exists(today_assistances)
+            ).order_by('id').values_list('id', flat=True)
+        )
+        
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        date=today,
+                        attendance=False,
+                        weekly_assistance_id=weekly_assistance_id,
+                    )
+                    for weekly_assistance_id in missing_ids
+                ],
+                batch_size=batch_size,
             )
-            self.weekly_assistance.total_extra_paid_hours = sum(
-                [assistance.extra_paid_hours for assistance in all_weekly_assistances]
+            WeeklyAssistance.update_days([
+                (weekly_assistance_id, today, False)
+                for weekly_assistance_id in missing_ids
+            ])
+        
+        if missing_ids:
+            weekly_assistances_updated.send(
+                sender=cls,
+                weekly_assistances_ids=missing_ids,
             )
-            
-            # Update weekly unpaid hours
-            self.weekly_assistance.total_extra_unpaid_hours = sum(
-                [assistance.extra_unpaid_hours for assistance in all_weekly_assistances]
+        
+        return {
+            "created": len(missing_ids),
+            "existing": weekly_assistances.count() - len(missing_ids),
+        }
+    
+    @classmethod
+    def bulk_save(cls, assistances: list) -> None:
+        """ Save many loaded assistances with a single bulk update and
+        recalculate once each affected weekly assistance
+        
+        Args:
+            assistances (list): Changed assistances (loaded from the database)
+        """
+        
+        changed_assistances = []
+        changed_fields = set()
+        for assistance in assistances:
+            assistance_changed_fields = assistance.get_changed_fields()
+            if assistance_changed_fields:
+                changed_assistances.append(assistance)
+                changed_fields |= assistance_changed_fields
+        if not changed_assistances:
+            return
+        
+        # Weekly assistances of the assistances, before and after the changes
+        weekly_assistances_ids = set()
+        for assistance in changed_assistances:
+            loaded_values = getattr(assistance, "loaded_values", None) or {}
+            weekly_assistances_ids.add(loaded_values.get("weekly_assistance_id"))
+            weekly_assistances_ids.add(assistance.weekly_assistance_id)
+        weekly_assistances_ids.discard(None)
+        
+        with transaction.atomic():
+            cls.objects.bulk_update(
+                changed_assistances, sorted(changed_fields), batch_size=500
             )
             
-            # Update comments
-            all_comments = [
-                assistance.notes for assistance in all_weekly_assistances
-            ]
-            all_comments = list(filter(lambda note: note is not None, all_comments))
-            self.weekly_assistance.notes = "\n".join(all_comments)
+            # Week days of the changed assistances, clearing first the days
+            # of their previous dates or weeks
+            days_attendances = []
+            for assistance in changed_assistances:
+                loaded_values = getattr(assistance, "loaded_values", None) or {}
+                old_weekly_assistance_id = loaded_values.get("weekly_assistance_id")
+                old_date = loaded_values.get("date")
+                if old_weekly_assistance_id and old_date and (
+                    old_weekly_assistance_id != assistance.weekly_assistance_id
+                    or old_date != assistance.date
+                ):
+                    days_attendances.append(
+                        (old_weekly_assistance_id, old_date, False)
+                    )
+            WeeklyAssistance.update_days(days_attendances + [
+                (assistance.weekly_assistance_id, assistance.date,
+                 assistance.attendance)
+                for assistance in changed_assistances
+                if assistance.weekly_assistance_id
+            ])
             
-        # Save the object
-        self.weekly_assistance.save()
-        super(Assistance, self).save(*args, **kwargs)
+            # Totals and notes of the weeks (one query)
+            weekly_assistances = {
+                weekly_assistance_id: WeeklyAssistance(
+                    id=weekly_assistance_id,
+                    total_extra_paid_hours=0,
+                    total_extra_unpaid_hours=0,
+                    notes="",
+                )
+                for weekly_assistance_id in weekly_assistances_ids
+            }
+            all_notes = {
+                weekly_assistance_id: []
+                for weekly_assistance_id in weekly_assistances_ids
+            }
+            week_assistances = cls.objects.filter(
+                weekly_assistance_id__in=weekly_assistances_ids
+            ).order_by("id").values_list(
+                "weekly_assistance_id",
+                "extra_paid_hours",
+                "extra_unpaid_hours",
+                "notes",
+            )
+            for weekly_assistance_id, paid, unpaid, notes in week_assistances:
+                weekly_assistance = weekly_assistances[weekly_assistance_id]
+                weekly_assistance.total_extra_paid_hours += paid
+                weekly_assistance.total_extra_unpaid_hours += unpaid
+                if notes is not None:
+                    all_notes[weekly_assistance_id].append(notes)
+            for weekly_assistance_id, notes in all_notes.items():
+                weekly_assistances[weekly_assistance_id].notes = "\n".join(notes)
+            WeeklyAssistance.objects.bulk_update(
+                weekly_assistances.values(),
+                ["total_extra_paid_hours", "total_extra_unpaid_hours", "notes"],
+                batch_size=500,
+            )
+        
+        for assistance in changed_assistances:
+            assistance.loaded_values = {
+                field_name: getattr(assistance, field_name)
+                for field_name in WEEKLY_FIELDS
+            }
+        
+        weekly_assistances_updated.send(
+            sender=cls,
+            weekly_assistances_ids=list(weekly_assistances_ids),
+        )
+    
+    def __update_weekly_assistance__(self, changed_fields: set):
+        """ Update the weekly assistance with queries, before saving the
+        assistance (so its post_save handlers see the updated week)
+        
+        Args:
+            changed_fields (set): Changed field names
+        """
+        
+        loaded_values = getattr(self, "loaded_values", None) or {}
+        old_weekly_assistance_id = loaded_values.get("weekly_assistance_id")
+        if self._state.adding:
+            old_weekly_assistance_id = None
+        moved = old_weekly_assistance_id != self.weekly_assistance_id
+        
+        # Week day status (clearing the day of the previous date or week)
+        if changed_fields & {"date", "attendance", "weekly_assistance_id"}:
+            days_attendances = []
+            old_date = loaded_values.get("date")
+            if (
+                old_weekly_assistance_id and old_date
+                and changed_fields & {"date", "weekly_assistance_id"}
+            ):
+                days_attendances.append(
+                    (old_weekly_assistance_id, old_date, False)
+                )
+                if not moved:
+                    self.__set_weekly_value__(
+                        get_week_day(old_date, "en"), False
+                    )
+            days_attendances.append(
+                (self.weekly_assistance_id, self.date, self.attendance)
+            )
+            WeeklyAssistance.update_days(days_attendances)
+            self.__set_weekly_value__(
+                get_week_day(self.date, "en"), self.attendance
+            )
+        
+        # Extra hours (delta updates)
+        hours_fields = ["extra_paid_hours", "extra_unpaid_hours"]
+        if changed_fields & set(hours_fields + ["weekly_assistance_id"]):
+            old_hours = {
+                field_name: loaded_values.get(field_name) or 0
+                for field_name in hours_fields
+            }
+            new_hours = {
+                field_name: getattr(self, field_name) or 0
+                for field_name in hours_fields
+            }
+            if old_weekly_assistance_id and moved:
+                self.__add_weekly_hours__(
+                    old_weekly_assistance_id,
+                    {name: -hours for name, hours in old_hours.items()},
+                )
+            if not old_weekly_assistance_id or moved:
+                self.__add_weekly_hours__(self.weekly_assistance_id, new_hours)
+            else:
+                self.__add_weekly_hours__(self.weekly_assistance_id, {
+                    name: new_hours[name] - old_hours[name]
+                    for name in hours_fields
+                })
+        
+        # Notes (one query with the notes of the week)
+        if "notes" in changed_fields or (old_weekly_assistance_id and moved):
+            if old_weekly_assistance_id and moved:
+                WeeklyAssistance.objects.filter(
+                    id=old_weekly_assistance_id
+                ).update(notes=self.__get_weekly_notes__(
+                    old_weekly_assistance_id
+                ))
+            notes = self.__get_weekly_notes__(
+                self.weekly_assistance_id, self.notes
+            )
+            WeeklyAssistance.objects.filter(
+                id=self.weekly_assistance_id
+            ).update(notes=notes)
+            self.__set_weekly_value__("notes", notes)
+    
+    def __add_weekly_hours__(self, weekly_assistance_id: int, hours: dict):
+        """ Add extra hours to the totals of a weekly assistance
+        
+        Args:
+            weekly_assistance_id (int): Id of the weekly assistance
+            hours (dict): Hours to add by assistance field name
+        """
+        
+        totals = {
+            f"total_{field_name}": F(f"total_{field_name}") + value
+            for field_name, value in hours.items()
+            if value
+        }
+        if not totals:
+            return
+        WeeklyAssistance.objects.filter(id=weekly_assistance_id).update(**totals)
+        
+        # Update the loaded weekly assistance too
+        is_current = weekly_assistance_id == self.weekly_assistance_id
+        if is_current and self.__is_weekly_loaded__():
+            for field_name, value in hours.items():
+                total_name = f"total_{field_name}"
+                total = getattr(self.weekly_assistance, total_name) + value
+                setattr(self.weekly_assistance, total_name, total)
+    
+    def __get_weekly_notes__(self, weekly_assistance_id: int, notes=None) -> str:
+        """ Get the notes of the assistances of a week, joined by lines
+        
+        Args:
+            weekly_assistance_id (int): Id of the weekly assistance
+            notes (str): Notes of this assistance (not saved yet)
+        
+        Returns:
+            str: Joined notes
+        """
+        
+        assistances = Assistance.objects.filter(
+            weekly_assistance_id=weekly_assistance_id,
+            notes__isnull=False,
+        )
+        if self.id:
+            assistances = assistances.exclude(id=self.id)
+        all_notes = list(assistances.order_by("id").values_list("id", "notes"))
+        if notes is not None:
+            all_notes.append((self.id or float("inf"), notes))
+        all_notes.sort(key=lambda note: note[0])
+        return "\n".join(note for _, note in all_notes)
+    
+    def __is_weekly_loaded__(self) -> bool:
+        """ Check if the weekly assistance object is already loaded """
+        
+        return self._meta.get_field("weekly_assistance").is_cached(self)
+    
+    def __set_weekly_value__(self, field_name: str, value):
+        """ Update the loaded weekly assistance, if any, without saving it """
+        
+        if self.__is_weekly_loaded__():
+            setattr(self.weekly_assistance, field_name, value)
+            if field_name in ATTENDANCE_DAYS:
+                self.weekly_assistance.set_attendance_mask()
 
 
 class WeeklyAssistance(models.Model):
@@ -99,6 +446,12 @@ class WeeklyAssistance(models.Model):
     week_number = models.IntegerField(
         verbose_name='Número de semana',
     )
+    week_key = models.IntegerField(
+        verbose_name='Semana (año y número)',
+        help_text='Año y número de semana (ej. 202452)',
+        db_index=True,
+        editable=False,
+    )
     start_date = models.DateField(
         verbose_name='Fecha de inicio',
     )
@@ -146,23 +499,209 @@ class WeeklyAssistance(models.Model):
         null=True,
         blank=True
     )
+    attendance_mask = models.PositiveSmallIntegerField(
+        verbose_name='Días asistidos (bits)',
+        help_text='Un bit por día de la semana, desde el jueves (bit 0)',
+        default=0,
+        editable=False,
+    )
+    worked_days = models.PositiveSmallIntegerField(
+        verbose_name='Días trabajados',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Asistencia semanal'
         verbose_name_plural = 'Asistencias semanales'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['service', 'week_key'],
+                name='unique_weekly_assistance_service_week',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.service} - Semana {self.week_number}"
     
     def save(self, *args, **kwargs):
-        """ Calculate default values """
+        """ Calculate the dates of new weekly assistances
+        and the attendance mask """
+        
+        if self._state.adding:
+            self.set_dates()
+        self.set_attendance_mask()
+        
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and set(update_fields) & set(ATTENDANCE_DAYS):
+            kwargs["update_fields"] = {
+                *update_fields, "attendance_mask", "worked_days"
+            }
+        super(WeeklyAssistance, self).save(*args, **kwargs)
+    
+    def set_attendance_mask(self):
+        """ Calculate the attendance mask and worked days from the
+        week day flags (without saving) """
+        
+        self.attendance_mask = sum(
+            1 << bit for bit, day_name in enumerate(ATTENDANCE_DAYS)
+            if getattr(self, day_name)
+        )
+        self.worked_days = bin(self.attendance_mask).count("1")
+    
+    def set_dates(self, date=None):
+        """ Calculate the dates and week of the current day
+        (without saving, also used before bulk_create)
+        
+        Args:
+            date (date): Day of the week (default: today)
+        """
         
-        # Calculate dates
-        self.start_date = timezone.now().astimezone()
+        self.start_date = date or timezone.now().astimezone()
         self.end_date = self.start_date + timezone.timedelta(days=6)
-        self.week_number = get_current_week(self.start_date)
+        calendar_day = payroll_calendar.get_day(self.start_date)
+        self.week_number = calendar_day.week_number
+        self.week_key = calendar_day.week_key
     
-        super(WeeklyAssistance, self).save(*args, **kwargs)
+    @classmethod
+    def create_week(
+        cls, services=None, batch_size: int = 1000, date=None
+    ) -> dict:
+        """ Create the missing weekly assistances of the current week
+        (one query to find the existing ones, bulk inserts in chunks
+        and one query to count the inserted rows)
+        
+        Args:
+            services (iterable): Services to process, already loaded
+                (default: all the services, read in chunks)
+            batch_size (int): Weekly assistances created in each query
+            date (date): Day of the week to create (default: today)
+        
+        Returns:
+            dict: Number of weekly assistances inserted ("created") and
+                services that already had one ("existing")
+        """
+        
+        week_key = payroll_calendar.get_day(date).week_key
+        week_weekly_assistances = cls.objects.filter(week_key=week_key)
+        existing_services_ids = set(
+            week_weekly_assistances.values_list('service_id', flat=True)
+        )
+        if services is None:
+            services = services_models.Service.objects.select_related(
+                'agreement', 'employee'
+            ).order_by('id').iterator(chunk_size=batch_size)
+        
+        # Duplicated rows from concurrent runs are ignored by the constraint
+        services_num = 0
+        new_weekly_assistances = []
+        with transaction.atomic():
+            for service in services:
+                services_num += 1
+                if service.id in existing_services_ids:
+                    continue
+                
+                weekly_assistance = cls(service=service)
+                weekly_assistance.set_dates(date)
+                new_weekly_assistances.append(weekly_assistance)
+                
+                if len(new_weekly_assistances) == batch_size:
+                    cls.objects.bulk_create(
+                        new_weekly_assistances, ignore_conflicts=True
+                    )
+                    new_weekly_assistances = []
+            
+            cls.objects.bulk_create(new_weekly_assistances, ignore_conflicts=True)
+            
+            # Inserted rows (the ignored conflicts are not counted)
+            created = week_weekly_assistances.count() - len(existing_services_ids)
+        
+        return {
+            "created": created,
+            "existing": services_num - created,
+        }
+    
+    @classmethod
+    def update_days(cls, days_attendances: list) -> None:
+        """ Update the week day flags, attendance mask and worked days
+        of many weekly assistances (one query per week day)
+        
+        Args:
+            days_attendances (list): Tuples of
+                (weekly assistance id, date, attendance)
+        """
+        
+        # Group by week day: {day name: {weekly assistance id: attendance}}
+        days = {}
+        for weekly_assistance_id, date, attendance in days_attendances:
+            day_name = get_week_day(date, "en")
+            days.setdefault(day_name, {})[weekly_assistance_id] = attendance
+        
+        for day_name, attendances in days.items():
+            attended_ids = [
+                weekly_assistance_id
+                for weekly_assistance_id, attendance in attendances.items()
+                if attendance
+            ]
+            attended = Q(id__in=attended_ids)
+            bit = 1 << ATTENDANCE_DAYS.index(day_name)
+            
+            # Mask and worked days are calculated from the previous day value,
+            # so they are set before the day (MySQL applies them in order)
+            cls.objects.filter(id__in=attendances.keys()).update(**{
+                "worked_days": Case(
+                    When(
+                        attended & Q(**{day_name: False}),
+                        then=F("worked_days") + 1,
+                    ),
+                    When(
+                        ~attended & Q(**{day_name: True}, worked_days__gt=0),
+                        then=F("worked_days") - 1,
+                    ),
+                    default=F("worked_days"),
+                    output_field=models.PositiveSmallIntegerField(),
+                ),
+                "attendance_mask": Case(
+                    When(attended, then=F("attendance_mask").bitor(bit)),
+                    default=F("attendance_mask").bitand(ALL_DAYS_MASK - bit),
+                    output_field=models.PositiveSmallIntegerField(),
+                ),
+                day_name: Case(
+                    When(attended, then=Value(True)),
+                    default=Value(False),
+                ),
+            })
+    
+    @classmethod
+    def get_attendance_summary(cls, weekly_assistances) -> dict:
+        """ Calculate the attendance statistics of many weekly assistances
+        in a single aggregate query (without loading the rows)
+        
+        Args:
+            weekly_assistances (QuerySet): Weekly assistances to summarize
+        
+        Returns:
+            dict: Weeks, total worked days, total no attendance days
+                (by schedule) and attendances by week day ("{day}_attendances")
+        """
+        
+        no_attendance_days = Greatest(
+            F("service__schedule__weekly_attendances") - F("worked_days"),
+            Value(0),
+        )
+        day_attendances = {
+            f"{day_name}_attendances": Sum(F("attendance_mask").bitand(1 << bit).bitrightshift(bit))
+            for bit, day_name in enumerate(ATTENDANCE_DAYS)
+        }
+        summary = weekly_assistances.aggregate(
+            weeks=Count("id"),
+            total_worked_days=Sum("worked_days"),
+            total_no_attendance_days=Sum(no_attendance_days),
+            **day_attendances,
+        )
+        return {
+            name: value or 0 for name, value in summary.items()
+        }
     
     def get_data_header(self):
         
@@ -187,22 +726,11 @@ class WeeklyAssistance(models.Model):
         return ([
             self.service.agreement.company_name,
             self.service.employee.get_full_name(),
-            "a" if self.thursday else "f",
-            "a" if self.friday else "f",
-            "a" if self.saturday else "f",
-            "a" if self.sunday else "f",
-            "a" if self.monday else "f",
-            "a" if self.tuesday else "f",
-            "a" if self.wednesday else "f",
-            sum([
-                self.thursday,
-                self.friday,
-                self.saturday,
-                self.sunday,
-                self.monday,
-                self.tuesday,
-                self.wednesday
-            ]),
+            *[
+                "a" if self.get_day_assistance(day) else "f"
+                for day in ATTENDANCE_DAYS
+            ],
+            self.worked_days,
             self.total_extra_paid_hours,
             self.total_extra_unpaid_hours,
             self.notes
@@ -227,24 +755,16 @@ class WeeklyAssistance(models.Model):
             bool: True if the employee attended, False otherwise
         """
         
-        return getattr(self, day)
+        return bool(self.attendance_mask & (1 << ATTENDANCE_DAYS.index(day)))
     
     def get_worked_days(self) -> int:
         """ Get the number of days worked in the week
 
         Returns:
-            int: Number of days worked
+            int: Number of days worked (stored with the attendance mask)
         """
         
-        return sum([
-            self.thursday,
-            self.friday,
-            self.saturday,
-            self.sunday,
-            self.monday,
-            self.tuesday,
-            self.wednesday
-        ])
+        return self.worked_days
         
     def get_no_attendance_days(self) -> int:
         """ Get the number of days without attendance in the week
@@ -320,4 +840,288 @@ class ExtraPayment(models.Model):
     def __str__(self):
         employee = self.assistance.weekly_assistance.service.employee
         return f"{employee} - {self.category.name}"
-    
\ No newline at end of file
+    
+
+class CheckIn(models.Model):
+    """ QR scan pending to register (ingestion queue, drained in batches
+    by the process_check_ins command) """
+    
+    id = models.BigAutoField(primary_key=True)
+    code = models.CharField(
+        verbose_name='Código de empleado',
+        max_length=6,
+    )
+    scanned_at = models.DateTimeField(
+        verbose_name='Fecha de escaneo',
+        default=timezone.now,
+    )
+    processed_at = models.DateTimeField(
+        verbose_name='Fecha de registro',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+    error = models.CharField(
+        verbose_name='Error',
+        max_length=255,
+        null=True,
+        blank=True,
+    )
+    
+    class Meta:
+        verbose_name = 'Registro QR'
+        verbose_name_plural = 'Registros QR'
+    
+    def __str__(self):
+        return f"{self.code} - {self.scanned_at}"
+    
+    @classmethod
+    def process_pending(cls, batch_size: int = 500) -> list:
+        """ Register the attendance of the oldest pending check-ins with
+        bulk queries (rows locked by other workers are skipped)
+        
+        Args:
+            batch_size (int): Max number of check-ins to process
+        
+        Returns:
+            list: Processed check-ins
+        """
+        
+        with transaction.atomic():
+            check_ins = list(
+                cls.objects.select_for_update(skip_locked=True).filter(
+                    processed_at__isnull=True
+                ).order_by('id')[:batch_size]
+            )
+            if not check_ins:
+                return []
+            
+            # Calendar day of each scan
+            days = {
+                check_in.id: payroll_calendar.get_day(check_in.scanned_at)
+                for check_in in check_ins
+            }
+            
+            # Weekly assistances of the current (last) service of each code
+            weekly_assistances = WeeklyAssistance.objects.filter(
+                service__employee__code__in={
+                    check_in.code for check_in in check_ins
+                },
+                week_key__in={day.week_key for day in days.values()},
+            ).order_by('service_id').values_list(
+                'id', 'week_key', 'service__employee__code'
+            )
+            weekly_assistances_ids = {
+                (code, week_key): weekly_assistance_id
+                for weekly_assistance_id, week_key, code in weekly_assistances
+            }
+            
+            # Attendances to register: {(weekly assistance id, date)}
+            attendances = set()
+            for check_in in check_ins:
+                day = days[check_in.id]
+                weekly_assistance_id = weekly_assistances_ids.get(
+                    (check_in.code, day.week_key)
+                )
+                if weekly_assistance_id:
+                    attendances.add((weekly_assistance_id, day.date))
+                else:
+                    check_in.error = "Sin servicio activo para el código"
+            
+            # Update the existing assistances and create the missing ones
+            existing_assistances = Assistance.objects.filter(
+                weekly_assistance_id__in={
+                    weekly_assistance_id for weekly_assistance_id, _ in attendances
+                },
+                date__in={date for _, date in attendances},
+            ).values_list('id', 'weekly_assistance_id', 'date', 'attendance')
+            existing_attendances = set()
+            absent_ids = []
+            for assistance_id, weekly_assistance_id, date, attendance in \
+                    existing_assistances:
+                if (weekly_assistance_id, date) not in attendances:
+                    continue
+                existing_attendances.add((weekly_assistance_id, date))
+                if not attendance:
+                    absent_ids.append(assistance_id)
+            Assistance.objects.filter(id__in=absent_ids).update(attendance=True)
+            Assistance.objects.bulk_create([
+                Assistance(
+                    weekly_assistance_id=weekly_assistance_id,
+                    date=date,
+                    attendance=True,
+                )
+                for weekly_assistance_id, date in sorted(
+                    attendances - existing_attendances
+                )
+            ])
+            WeeklyAssistance.update_days([
+                (weekly_assistance_id, date, True)
+                for weekly_assistance_id, date in attendances
+            ])
+            
+            # Mark the check-ins as processed
+            processed_at = timezone.now()
+            for check_in in check_ins:
+                check_in.processed_at = processed_at
+            cls.objects.bulk_update(check_ins, ['processed_at', 'error'])
+        
+        if attendances:
+            weekly_assistances_updated.send(
+                sender=Assistance,
+                weekly_assistances_ids=list({
+                    weekly_assistance_id for weekly_assistance_id, _ in attendances
+                }),
+            )
+        
+        return check_ins
+
+
+class AttendanceWeekRollup(models.Model):
+    """ Attendance totals of a service in a week (analytics rollup,
+    rebuilt by the refresh_attendance_rollups command) """
+    
+    id = models.BigAutoField(primary_key=True)
+    week_key = models.IntegerField(
+        verbose_name='Semana (año y número)',
+        db_index=True,
+    )
+    weekly_assistance = models.OneToOneField(
+        WeeklyAssistance,
+        on_delete=models.CASCADE,
+        verbose_name='Asistencia semanal',
+    )
+    agreement = models.ForeignKey(
+        services_models.Agreement,
+        on_delete=models.CASCADE,
+        verbose_name='Contrato',
+    )
+    service = models.ForeignKey(
+        services_models.Service,
+        on_delete=models.CASCADE,
+        verbose_name='Servicio',
+    )
+    employee = models.ForeignKey(
+        'employees.Employee',
+        on_delete=models.CASCADE,
+        verbose_name='Empleado',
+    )
+    expected_attendances = models.IntegerField(
+        verbose_name='Asistencias esperadas',
+        default=0,
+    )
+    attendances = models.IntegerField(
+        verbose_name='Asistencias',
+        default=0,
+    )
+    absences = models.IntegerField(
+        verbose_name='Faltas',
+        default=0,
+    )
+    extra_paid_hours = models.IntegerField(
+        verbose_name='Horas extras pagadas',
+        default=0,
+    )
+    extra_unpaid_hours = models.IntegerField(
+        verbose_name='Horas extras no pagadas',
+        default=0,
+    )
+    
+    class Meta:
+        verbose_name = 'Resumen semanal de asistencia'
+        verbose_name_plural = 'Resúmenes semanales de asistencia'
+    
+    def __str__(self):
+        return f"{self.service} - Semana {self.week_key}"
+
+
+class AttendanceDayRollup(models.Model):
+    """ Attendance totals of an agreement in a day (analytics rollup,
+    rebuilt by the refresh_attendance_rollups command) """
+    
+    id = models.BigAutoField(primary_key=True)
+    date = models.DateField(
+        verbose_name='Fecha',
+        db_index=True,
+    )
+    week_key = models.IntegerField(
+        verbose_name='Semana (año y número)',
+        db_index=True,
+    )
+    agreement = models.ForeignKey(
+        services_models.Agreement,
+        on_delete=models.CASCADE,
+        verbose_name='Contrato',
+    )
+    services = models.IntegerField(
+        verbose_name='Servicios',
+        default=0,
+    )
+    expected_attendances = models.FloatField(
+        verbose_name='Asistencias esperadas',
+        help_text='Asistencias semanales de los horarios / 7',
+        default=0,
+    )
+    attendances = models.IntegerField(
+        verbose_name='Asistencias',
+        default=0,
+    )
+    extra_paid_hours = models.IntegerField(
+        verbose_name='Horas extras pagadas',
+        default=0,
+    )
+    extra_unpaid_hours = models.IntegerField(
+        verbose_name='Horas extras no pagadas',
+        default=0,
+    )
+    
+    class Meta:
+        verbose_name = 'Resumen diario de asistencia'
+        verbose_name_plural = 'Resúmenes diarios de asistencia'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'agreement'],
+                name='unique_attendance_day_rollup',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.agreement} - {self.date}"
+
+
+class AttendanceRollupChange(models.Model):
+    """ Week with assistance changes pending to refresh in the rollups """
+    
+    week_key = models.IntegerField(
+        verbose_name='Semana (año y número)',
+        primary_key=True,
+    )
+    changed_at = models.DateTimeField(
+        verbose_name='Fecha de cambio',
+        default=timezone.now,
+    )
+    
+    class Meta:
+        verbose_name = 'Semana pendiente de resumir'
+        verbose_name_plural = 'Semanas pendientes de resumir'
+    
+    def __str__(self):
+        return f"Semana {self.week_key}"
+    
+    @classmethod
+    def mark_weeks(cls, week_keys) -> None:
+        """ Register changed weeks (two queries: update the change date
+        of the weeks already registered and insert the others; portable
+        upsert, MySQL doesn't support conflict targets)
+        
+        Args:
+            week_keys (iterable): Week keys (year * 100 + week number)
+        """
+        
+        week_keys = set(week_keys)
+        now = timezone.now()
+        cls.objects.filter(week_key__in=week_keys).update(changed_at=now)
+        cls.objects.bulk_create(
+            [cls(week_key=week_key, changed_at=now) for week_key in week_keys],
+            ignore_conflicts=True,
+        )
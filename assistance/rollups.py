@@ -0,0 +1,184 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest
+
+from assistance import models as assistance_models
+from utils import payroll_calendar
+
+
+def refresh_week(week_key: int) -> int:
+    """ Rebuild the weekly and daily rollups of a week
+    (one aggregate query for each table)
+
+    Args:
+        week_key (int): Week key (year * 100 + week number)
+
+    Returns:
+        int: Number of weekly rollups created
+    """
+
+    # Weekly totals by service
+    weekly_assistances = assistance_models.WeeklyAssistance.objects.filter(
+        week_key=week_key
+    ).values(
+        "id",
+        "service_id",
+        "worked_days",
+        "total_extra_paid_hours",
+        "total_extra_unpaid_hours",
+        agreement_id=F("service__agreement_id"),
+        employee_id=F("service__employee_id"),
+        expected_attendances=F("service__schedule__weekly_attendances"),
+        absences=Greatest(
+            F("service__schedule__weekly_attendances") - F("worked_days"),
+            Value(0),
+        ),
+    )
+    week_rollups = [
+        assistance_models.AttendanceWeekRollup(
+            week_key=week_key,
+            weekly_assistance_id=row["id"],
+            agreement_id=row["agreement_id"],
+            service_id=row["service_id"],
+            employee_id=row["employee_id"],
+            expected_attendances=row["expected_attendances"],
+            attendances=row["worked_days"],
+            absences=row["absences"],
+            extra_paid_hours=row["total_extra_paid_hours"],
+            extra_unpaid_hours=row["total_extra_unpaid_hours"],
+        )
+        for row in weekly_assistances
+    ]
+
+    # Daily totals by agreement
+    week_start, week_end = payroll_calendar.get_week_dates(week_key)
+    days = assistance_models.Assistance.objects.filter(
+        weekly_assistance__week_key=week_key,
+        date__range=(week_start, week_end),
+    ).values(
+        "date",
+        agreement_id=F("weekly_assistance__service__agreement_id"),
+    ).annotate(
+        services=Count("weekly_assistance__service_id", distinct=True),
+        weekly_attendances=Sum(
+            "weekly_assistance__service__schedule__weekly_attendances"
+        ),
+        attendances=Count("id", filter=Q(attendance=True)),
+        total_extra_paid_hours=Sum("extra_paid_hours"),
+        total_extra_unpaid_hours=Sum("extra_unpaid_hours"),
+    ).order_by()
+    day_rollups = [
+        assistance_models.AttendanceDayRollup(
+            date=row["date"],
+            week_key=week_key,
+            agreement_id=row["agreement_id"],
+            services=row["services"],
+            expected_attendances=(row["weekly_attendances"] or 0) / 7,
+            attendances=row["attendances"],
+            extra_paid_hours=row["total_extra_paid_hours"] or 0,
+            extra_unpaid_hours=row["total_extra_unpaid_hours"] or 0,
+        )
+        for row in days
+    ]
+
+    with transaction.atomic():
+        assistance_models.AttendanceWeekRollup.objects.filter(
+            week_key=week_key
+        ).delete()
+        assistance_models.AttendanceWeekRollup.objects.bulk_create(
+            week_rollups, batch_size=1000
+        )
+        assistance_models.AttendanceDayRollup.objects.filter(
+            week_key=week_key
+        ).delete()
+        assistance_models.AttendanceDayRollup.objects.bulk_create(
+            day_rollups, batch_size=1000
+        )
+
+    return len(week_rollups)
+
+
+def refresh_changed_weeks() -> list:
+    """ Rebuild the rollups of the weeks changed since the last refresh
+
+    Returns:
+        list: Refreshed week keys
+    """
+
+    changes = list(
+        assistance_models.AttendanceRollupChange.objects.order_by("week_key")
+    )
+    for change in changes:
+        refresh_week(change.week_key)
+
+        # Keep the change if the week changed again during the refresh
+        assistance_models.AttendanceRollupChange.objects.filter(
+            week_key=change.week_key,
+            changed_at=change.changed_at,
+        ).delete()
+
+    return [change.week_key for change in changes]
+
+
+def get_report(start_week_key: int, end_week_key: int, group_by: str) -> list:
+    """ Return the attendance totals and absence rate of a weeks range,
+    read from the weekly rollups
+
+    Args:
+        start_week_key (int): First week key
+        end_week_key (int): Last week key (included)
+        group_by (str): "agreement", "employee" or "week"
+
+    Returns:
+        list: Rows with the group name, expected attendances, attendances,
+            absences, extra hours and absence rate (%)
+    """
+
+    groups_fields = {
+        "agreement": ["agreement__company_name", "agreement_id"],
+        "employee": [
+            "employee__name",
+            "employee__last_name_1",
+            "employee__last_name_2",
+            "employee_id",
+        ],
+        "week": ["week_key"],
+    }
+    group_fields = groups_fields[group_by]
+    rows = assistance_models.AttendanceWeekRollup.objects.filter(
+        week_key__range=(start_week_key, end_week_key)
+    ).values(
+        *group_fields
+    ).annotate(
+        total_expected_attendances=Sum("expected_attendances"),
+        total_attendances=Sum("attendances"),
+        total_absences=Sum("absences"),
+        total_extra_paid_hours=Sum("extra_paid_hours"),
+        total_extra_unpaid_hours=Sum("extra_unpaid_hours"),
+    ).order_by(*group_fields)
+
+    report = []
+    for row in rows:
+        if group_by == "agreement":
+            name = row["agreement__company_name"]
+        elif group_by == "employee":
+            name = " ".join(filter(None, [
+                row["employee__name"],
+                row["employee__last_name_1"],
+                row["employee__last_name_2"],
+            ]))
+        else:
+            name = f"{row['week_key'] // 100} - Semana {row['week_key'] % 100}"
+
+        expected = row["total_expected_attendances"] or 0
+        absences = row["total_absences"] or 0
+        report.append({
+            "name": name,
+            "expected_attendances": expected,
+            "attendances": row["total_attendances"] or 0,
+            "absences": absences,
+            "extra_paid_hours": row["total_extra_paid_hours"] or 0,
+            "extra_unpaid_hours": row["total_extra_unpaid_hours"] or 0,
+            "absence_rate": round(absences * 100 / expected, 2) if expected else 0,
+        })
+    return report
@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from utils import payroll_calendar
+
+# Sent after bulk changes that skip the model signals
+# (bulk_create / update), with the ids of the affected weekly assistances:
+# weekly_assistances_updated.send(sender=Model, weekly_assistances_ids=[...])
+weekly_assistances_updated = Signal()
+
+
+@receiver(post_save, sender="assistance.WeeklyAssistance")
+@receiver(post_delete, sender="assistance.WeeklyAssistance")
+def mark_rollup_weekly_assistance(sender, instance, **kwargs):
+    """ Register the week of the weekly assistance to refresh its rollups """
+    
+    # Import models here to avoid circular imports
+    from assistance.models import AttendanceRollupChange
+    AttendanceRollupChange.mark_weeks([instance.week_key])
+
+
+@receiver(post_save, sender="assistance.Assistance")
+@receiver(post_delete, sender="assistance.Assistance")
+def mark_rollup_assistance(sender, instance, **kwargs):
+    """ Register the week of the assistance to refresh its rollups """
+    
+    from assistance.models import AttendanceRollupChange
+    AttendanceRollupChange.mark_weeks(
+        [payroll_calendar.get_day(instance.date).week_key]
+    )
+
+
+@receiver(weekly_assistances_updated)
+def mark_rollup_weekly_assistances(sender, weekly_assistances_ids, **kwargs):
+    """ Register the weeks of the weekly assistances updated in bulk """
+    
+    from assistance.models import AttendanceRollupChange, WeeklyAssistance
+    week_keys = WeeklyAssistance.objects.filter(
+        id__in=weekly_assistances_ids
+    ).values_list("week_key", flat=True).distinct()
+    AttendanceRollupChange.mark_weeks(week_keys)
@@ -1,8 +1,12 @@
+import datetime
+from contextlib import redirect_stdout
 from time import sleep
-from io import BytesIO
+from io import BytesIO, StringIO
 
 import openpyxl
-from django.test import TestCase, LiveServerTestCase
+from django.db import IntegrityError
+from django.test import Client, TestCase, LiveServerTestCase, override_settings
+from django.core.cache import cache
 from django.core.management import call_command
 from django.utils import timezone
 from django.conf import settings
@@ -11,7 +15,7 @@ from selenium.webdriver.chrome.options import Options
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 
-from assistance import models
+from assistance import coverage, models, rollups
 from utils import test_data
 from utils.dates import get_week_day, get_current_week
 from utils.automation import get_selenium_elems
@@ -92,6 +96,146 @@ class AssistanceModelTest(TestCase):
         self.weekly_assistance.refresh_from_db()
         self.assertEqual(self.weekly_assistance.notes, "note 1\nnote 2")
 
+    def test_save_update_weekly_hours_delta(self):
+        """Validate weekly hours updated with the difference
+        when the same assistance is updated many times"""
+
+        # Update assistance hours twice
+        self.assistances[0].extra_paid_hours = 4
+        self.assistances[0].save()
+        self.assistances[0].extra_paid_hours = 1
+        self.assistances[0].save()
+
+        # Update a loaded assistance
+        assistance = models.Assistance.objects.get(id=self.assistances[1].id)
+        assistance.extra_paid_hours = 2
+        assistance.save()
+
+        # Validate weekly assistance total
+        self.weekly_assistance.refresh_from_db()
+        self.assertEqual(self.weekly_assistance.total_extra_paid_hours, 3)
+
+    def test_save_move_weekly_hours(self):
+        """Validate hours moved to the new weekly assistance
+        when change the assistance weekly assistance"""
+
+        self.assistances[0].extra_paid_hours = 2
+        self.assistances[0].save()
+
+        # Move assistance to other weekly assistance
+        other_weekly_assistance = test_data.create_weekly_assistance()
+        self.assistances[0].weekly_assistance = other_weekly_assistance
+        self.assistances[0].save()
+
+        # Validate totals of both weekly assistances
+        self.weekly_assistance.refresh_from_db()
+        other_weekly_assistance.refresh_from_db()
+        self.assertEqual(self.weekly_assistance.total_extra_paid_hours, 0)
+        self.assertEqual(other_weekly_assistance.total_extra_paid_hours, 2)
+
+    def test_save_change_date_clear_weekly_day(self):
+        """Validate the day of the previous date is cleared
+        when change the assistance date"""
+
+        assistance = models.Assistance.objects.get(id=self.assistances[0].id)
+        assistance.attendance = True
+        assistance.save()
+        old_day = get_week_day(assistance.date, "en")
+
+        # Change date
+        assistance.date -= timezone.timedelta(days=2)
+        assistance.save()
+        new_day = get_week_day(assistance.date, "en")
+
+        # Validate only the new day
+        self.weekly_assistance.refresh_from_db()
+        self.assertFalse(getattr(self.weekly_assistance, old_day))
+        self.assertTrue(getattr(self.weekly_assistance, new_day))
+
+    def test_save_move_clear_weekly_day(self):
+        """Validate the day is cleared in the previous weekly assistance
+        when change the assistance weekly assistance"""
+
+        assistance = models.Assistance.objects.get(id=self.assistances[0].id)
+        assistance.attendance = True
+        assistance.save()
+        week_day = get_week_day(assistance.date, "en")
+
+        # Move assistance to other weekly assistance
+        other_weekly_assistance = test_data.create_weekly_assistance()
+        assistance.weekly_assistance = other_weekly_assistance
+        assistance.save()
+
+        # Validate day of both weekly assistances
+        self.weekly_assistance.refresh_from_db()
+        other_weekly_assistance.refresh_from_db()
+        self.assertFalse(getattr(self.weekly_assistance, week_day))
+        self.assertTrue(getattr(other_weekly_assistance, week_day))
+
+    def test_bulk_save_change_date_clear_weekly_day(self):
+        """Validate the day of the previous date is cleared
+        when change the date in a bulk save"""
+
+        assistance = models.Assistance.objects.get(id=self.assistances[0].id)
+        assistance.attendance = True
+        assistance.save()
+        old_day = get_week_day(assistance.date, "en")
+
+        # Change date
+        assistance.date -= timezone.timedelta(days=2)
+        models.Assistance.bulk_save([assistance])
+        new_day = get_week_day(assistance.date, "en")
+
+        # Validate only the new day
+        self.weekly_assistance.refresh_from_db()
+        self.assertFalse(getattr(self.weekly_assistance, old_day))
+        self.assertTrue(getattr(self.weekly_assistance, new_day))
+
+    def test_unique_weekly_date(self):
+        """Validate only one assistance per weekly assistance and date"""
+
+        with self.assertRaises(IntegrityError):
+            test_data.create_assistance(
+                weekly_assistance=self.weekly_assistance,
+                date=self.assistances[0].date,
+            )
+
+    def test_save_keep_weekly_dates(self):
+        """Validate the weekly assistance dates don't change
+        when update an assistance"""
+
+        # Set the week dates in the past
+        start_date = timezone.now().date() - timezone.timedelta(days=30)
+        models.WeeklyAssistance.objects.filter(id=self.weekly_assistance.id).update(
+            start_date=start_date
+        )
+
+        # Update assistance
+        assistance = models.Assistance.objects.get(id=self.assistances[0].id)
+        assistance.attendance = False
+        assistance.notes = "note 1"
+        assistance.save()
+
+        # Validate start date not changed
+        self.weekly_assistance.refresh_from_db()
+        self.assertEqual(self.weekly_assistance.start_date, start_date)
+
+    def test_save_no_changes_no_weekly_update(self):
+        """Validate the weekly assistance is not updated
+        when no weekly field changed"""
+
+        assistance = models.Assistance.objects.get(id=self.assistances[0].id)
+        models.WeeklyAssistance.objects.filter(id=self.weekly_assistance.id).update(
+            total_extra_paid_hours=7
+        )
+
+        # Save without changes
+        assistance.save()
+
+        # Validate weekly assistance not recalculated
+        self.weekly_assistance.refresh_from_db()
+        self.assertEqual(self.weekly_assistance.total_extra_paid_hours, 7)
+
 
 class AssistanceAdminTest(TestCase):
     """Test custom features in admin/assistance"""
@@ -226,6 +370,50 @@ class AssistanceAdminTest(TestCase):
         rows = soup.select('tr[role="row"]')
         self.assertEqual(len(rows), 1)
 
+    def test_list_editable_batch_save(self):
+        """Validate list editable changes saved in batch
+        and weekly assistances recalculated"""
+
+        # Create today assistances of other services
+        assistances = [self.assistances[0]]
+        for _ in range(3):
+            assistances.append(test_data.create_assistance(attendance=False))
+
+        # Submit the changes of all the rows
+        data = {
+            "form-TOTAL_FORMS": len(assistances),
+            "form-INITIAL_FORMS": len(assistances),
+            "_save": "Guardar",
+        }
+        for index, assistance in enumerate(assistances):
+            data[f"form-{index}-id"] = assistance.id
+            data[f"form-{index}-attendance"] = "on"
+            data[f"form-{index}-extra_paid_hours"] = index + 1
+            data[f"form-{index}-extra_unpaid_hours"] = 0
+            data[f"form-{index}-notes"] = f"note {index}"
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        response = self.client.post(self.endpoint, data)
+        self.assertEqual(response.status_code, 302)
+
+        # Validate assistances and weekly assistances
+        day_name = get_week_day(self.assistances[0].date, "en")
+        for index, assistance in enumerate(assistances):
+            assistance.refresh_from_db()
+            self.assertTrue(assistance.attendance)
+            self.assertEqual(assistance.extra_paid_hours, index + 1)
+
+            weekly_assistance = assistance.weekly_assistance
+            weekly_assistance.refresh_from_db()
+            self.assertTrue(getattr(weekly_assistance, day_name))
+            self.assertEqual(
+                weekly_assistance.total_extra_paid_hours,
+                sum(
+                    week_assistance.extra_paid_hours
+                    for week_assistance in weekly_assistance.assistance_set.all()
+                ),
+            )
+            self.assertIn(f"note {index}", weekly_assistance.notes)
+
 
 class WeeklyAssistanceTest(TestCase):
     """ validate custom methods in WeeklyAssistance model """
@@ -258,6 +446,74 @@ class WeeklyAssistanceTest(TestCase):
         worked_days = self.weekly_assistance.get_worked_days()
         self.assertEqual(worked_days, 2)
         
+    def test_get_data_list_attendance_mask(self):
+        """ Validate the days and worked days of the export row
+        read from the stored attendance mask """
+        
+        weekly_assistance = models.WeeklyAssistance.objects.get(
+            id=self.weekly_assistance.id
+        )
+        data_row = weekly_assistance.get_data_list()
+        
+        self.assertEqual(data_row[2:9], [
+            "a" if weekly_assistance.attendance_mask & (1 << bit) else "f"
+            for bit in range(7)
+        ])
+        self.assertEqual(data_row[2:9].count("a"), 2)
+        self.assertEqual(data_row[9], weekly_assistance.worked_days)
+        
+    def test_attendance_mask(self):
+        """ Validate attendance mask and worked days updated by the
+        assistances changes """
+        
+        self.weekly_assistance.refresh_from_db()
+        self.assertEqual(self.weekly_assistance.worked_days, 2)
+        
+        # Validate the bits of the worked days
+        for assistance in [self.assistance_1, self.assistance_2]:
+            day_name = get_week_day(assistance.date, "en")
+            bit = 1 << models.ATTENDANCE_DAYS.index(day_name)
+            self.assertTrue(self.weekly_assistance.attendance_mask & bit)
+        
+        # Remove one attendance
+        self.assistance_1.attendance = False
+        self.assistance_1.save()
+        self.weekly_assistance.refresh_from_db()
+        self.assertEqual(self.weekly_assistance.worked_days, 1)
+        self.assertEqual(bin(self.weekly_assistance.attendance_mask).count("1"), 1)
+        
+    def test_attendance_mask_save(self):
+        """ Validate attendance mask calculated when save the week days """
+        
+        self.weekly_assistance.thursday = True
+        self.weekly_assistance.friday = True
+        self.weekly_assistance.monday = False
+        self.weekly_assistance.tuesday = False
+        self.weekly_assistance.wednesday = False
+        self.weekly_assistance.saturday = False
+        self.weekly_assistance.sunday = False
+        self.weekly_assistance.save()
+        
+        self.weekly_assistance.refresh_from_db()
+        self.assertEqual(self.weekly_assistance.attendance_mask, 0b11)
+        self.assertEqual(self.weekly_assistance.worked_days, 2)
+        
+    def test_attendance_summary(self):
+        """ Validate attendance statistics calculated in the database """
+        
+        weekly_attendances = self.weekly_assistance.service.schedule.weekly_attendances
+        summary = models.WeeklyAssistance.get_attendance_summary(
+            models.WeeklyAssistance.objects.all()
+        )
+        
+        self.assertEqual(summary["weeks"], 1)
+        self.assertEqual(summary["total_worked_days"], 2)
+        self.assertEqual(
+            summary["total_no_attendance_days"], weekly_attendances - 2
+        )
+        day_name = get_week_day(self.assistance_1.date, "en")
+        self.assertEqual(summary[f"{day_name}_attendances"], 1)
+        
     def test_no_attendance_days(self):
         """ Validate no attendance days based in shcedule weekly_attendances """
         
@@ -457,7 +713,9 @@ class WeeklyAssistanceAdminTest(TestCase):
             "attachment; filename=export.xlsx", response["Content-Disposition"]
         )
 
-        workbook = openpyxl.load_workbook(BytesIO(response.content))
+        workbook = openpyxl.load_workbook(
+            BytesIO(b"".join(response.streaming_content))
+        )
         worksheet = workbook.active
 
         # Check the sheet title
@@ -574,6 +832,431 @@ class WeeklyAssistanceAdminSeleniumTest(LiveServerTestCase):
             self.assertTrue(checkbox.is_selected())
 
 
+class ApiQrCheckInViewTest(TestCase):
+    """Test the QR check-in endpoint"""
+
+    def setUp(self):
+
+        # Create initial data
+        call_command("apps_loaddata")
+        cache.clear()
+        self.admin_user, self.admin_pass, _ = test_data.create_admin_user()
+        self.weekly_assistance = test_data.create_weekly_assistance()
+        self.employee = self.weekly_assistance.service.employee
+        self.endpoint = f"/api/qr/{self.employee.code}"
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+
+    def test_check_in(self):
+        """Validate today assistance created with attendance"""
+
+        response = self.client.post(self.endpoint)
+
+        # Validate response
+        self.assertEqual(response.status_code, 200)
+        json_data = response.json()
+        self.assertEqual(json_data["status"], "success")
+        self.assertEqual(json_data["data"]["employee_id"], self.employee.id)
+
+        # Validate assistance and week day
+        assistance = models.Assistance.objects.get(
+            weekly_assistance=self.weekly_assistance
+        )
+        self.assertTrue(assistance.attendance)
+        self.assertEqual(assistance.date, timezone.localdate())
+        self.weekly_assistance.refresh_from_db()
+        day_name = get_week_day(timezone.localdate(), "en")
+        self.assertTrue(getattr(self.weekly_assistance, day_name))
+
+    def test_confirmation_page(self):
+        """Validate opening the QR link only shows the confirmation form"""
+
+        response = self.client.get(self.endpoint)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.employee.get_full_name())
+        self.assertContains(response, 'method="post"')
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertFalse(models.Assistance.objects.exists())
+
+    def test_confirmation_page_invalid_code(self):
+        """Validate not found page (without form) with an unknown code"""
+
+        response = self.client.get("/api/qr/XXXXXX")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotContains(response, 'method="post"', status_code=404)
+
+    def test_check_in_csrf(self):
+        """Validate the attendance is not registered without CSRF token"""
+
+        client = Client(enforce_csrf_checks=True)
+        client.login(username=self.admin_user, password=self.admin_pass)
+        response = client.post(self.endpoint)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(models.Assistance.objects.exists())
+
+    def test_check_in_existing_assistance(self):
+        """Validate the assistance of the daily command is updated"""
+
+        call_command("create_assistance")
+        self.client.post(self.endpoint)
+
+        # Validate no duplicated assistances
+        assistances = models.Assistance.objects.filter(
+            weekly_assistance=self.weekly_assistance
+        )
+        self.assertEqual(assistances.count(), 1)
+        self.assertTrue(assistances[0].attendance)
+
+    def test_check_in_twice(self):
+        """Validate second scan doesn't duplicate the assistance"""
+
+        self.client.post(self.endpoint)
+        response = self.client.post(self.endpoint)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ya estaba", response.json()["message"])
+        assistances = models.Assistance.objects.filter(
+            weekly_assistance=self.weekly_assistance
+        )
+        self.assertEqual(assistances.count(), 1)
+
+    def test_check_in_outdated_cache(self):
+        """Validate the week is reloaded when the cached one was deleted"""
+
+        self.client.post(self.endpoint)
+
+        # Replace the weekly assistance
+        service = self.weekly_assistance.service
+        self.weekly_assistance.delete()
+        weekly_assistance = test_data.create_weekly_assistance(service=service)
+
+        response = self.client.post(self.endpoint)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            models.Assistance.objects.filter(
+                weekly_assistance=weekly_assistance, attendance=True
+            ).exists()
+        )
+
+    def test_check_in_invalid_code(self):
+        """Validate error with an unknown code"""
+
+        response = self.client.post("/api/qr/XXXXXX")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["status"], "error")
+
+    @override_settings(QR_CHECKIN_MODE="queue")
+    def test_check_in_queue_mode(self):
+        """Validate the scan is queued without registering the assistance"""
+
+        response = self.client.post(self.endpoint)
+
+        self.assertEqual(response.status_code, 202)
+        check_in = models.CheckIn.objects.get()
+        self.assertEqual(check_in.code, self.employee.code)
+        self.assertIsNone(check_in.processed_at)
+        self.assertFalse(models.Assistance.objects.exists())
+
+    def test_check_in_no_login(self):
+        """Validate redirect to login without session"""
+
+        self.client.logout()
+        response = self.client.post(self.endpoint)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(models.Assistance.objects.exists())
+
+
+class CommandProcessCheckInsTest(TestCase):
+    """Test running the command process_check_ins"""
+
+    def setUp(self):
+
+        # Create initial data
+        call_command("apps_loaddata")
+        self.weekly_assistance = test_data.create_weekly_assistance()
+        self.employee = self.weekly_assistance.service.employee
+
+    def test_run_new_assistance(self):
+        """Validate today assistance created from the queued scans"""
+
+        # Queue the same scan twice
+        models.CheckIn.objects.create(code=self.employee.code)
+        models.CheckIn.objects.create(code=self.employee.code)
+
+        call_command("process_check_ins")
+
+        # Validate one assistance with attendance
+        assistances = models.Assistance.objects.filter(
+            weekly_assistance=self.weekly_assistance
+        )
+        self.assertEqual(assistances.count(), 1)
+        self.assertTrue(assistances[0].attendance)
+        self.assertEqual(assistances[0].date, timezone.localdate())
+
+        # Validate week day and queue processed
+        self.weekly_assistance.refresh_from_db()
+        day_name = get_week_day(timezone.localdate(), "en")
+        self.assertTrue(getattr(self.weekly_assistance, day_name))
+        self.assertFalse(
+            models.CheckIn.objects.filter(processed_at__isnull=True).exists()
+        )
+
+    def test_run_existing_assistance(self):
+        """Validate the assistance of the daily command is updated"""
+
+        call_command("create_assistance")
+        models.CheckIn.objects.create(code=self.employee.code)
+
+        call_command("process_check_ins")
+
+        assistances = models.Assistance.objects.filter(
+            weekly_assistance=self.weekly_assistance
+        )
+        self.assertEqual(assistances.count(), 1)
+        self.assertTrue(assistances[0].attendance)
+
+    def test_run_invalid_code(self):
+        """Validate the error saved with unknown codes"""
+
+        check_in = models.CheckIn.objects.create(code="XXXXXX")
+
+        call_command("process_check_ins")
+
+        check_in.refresh_from_db()
+        self.assertIsNotNone(check_in.processed_at)
+        self.assertIsNotNone(check_in.error)
+        self.assertFalse(models.Assistance.objects.exists())
+
+    def test_run_batches(self):
+        """Validate all the queue processed in batches"""
+
+        for index in range(3):
+            employee = test_data.create_employee(
+                curp=f"{test_data.CURP[:-1]}{index}",
+                ine=f"INE{index}",
+                phone=f"111111111{index}",
+            )
+            weekly_assistance = test_data.create_weekly_assistance(
+                service=test_data.create_service(employee=employee)
+            )
+            models.CheckIn.objects.create(code=employee.code)
+
+        call_command("process_check_ins", batch_size=2)
+
+        self.assertEqual(
+            models.Assistance.objects.filter(attendance=True).count(), 3
+        )
+
+
+class CoverageGapsTest(TestCase):
+    """Test the services without attendance today"""
+
+    def setUp(self):
+
+        # Create initial data
+        call_command("apps_loaddata")
+        self.admin_user, self.admin_pass, _ = test_data.create_admin_user()
+        self.weekly_assistance = test_data.create_weekly_assistance()
+        self.service = self.weekly_assistance.service
+
+        # Schedule started at 08:00, checked at 12:00 of today
+        self.service.schedule.start_time = datetime.time(8, 0)
+        self.service.schedule.save()
+        self.now = timezone.localtime().replace(hour=12, minute=0)
+
+    def test_missing_assistance(self):
+        """Validate service without assistance today in gaps"""
+
+        with self.assertNumQueries(1):
+            gaps = coverage.get_coverage_gaps(self.now)
+
+        self.assertEqual(len(gaps), 1)
+        self.assertEqual(gaps[0]["id"], self.service.id)
+        self.assertFalse(gaps[0]["has_assistance"])
+
+    def test_no_attendance(self):
+        """Validate service with assistance without attendance in gaps"""
+
+        test_data.create_assistance(
+            service=self.service,
+            weekly_assistance=self.weekly_assistance,
+            date=self.now.date(),
+            attendance=False,
+        )
+
+        gaps = coverage.get_coverage_gaps(self.now)
+
+        self.assertEqual(len(gaps), 1)
+        self.assertTrue(gaps[0]["has_assistance"])
+        counts = coverage.get_agreements_counts(gaps)
+        company_name = self.service.agreement.company_name
+        self.assertEqual(
+            counts[company_name], {"missing": 0, "absent": 1, "total": 1}
+        )
+
+    def test_attendance(self):
+        """Validate service with attendance not in gaps"""
+
+        test_data.create_assistance(
+            service=self.service,
+            weekly_assistance=self.weekly_assistance,
+            date=self.now.date(),
+            attendance=True,
+        )
+
+        self.assertEqual(coverage.get_coverage_gaps(self.now), [])
+
+    def test_schedule_not_started(self):
+        """Validate service before the schedule start not in gaps"""
+
+        now = self.now.replace(hour=7)
+
+        self.assertEqual(coverage.get_coverage_gaps(now), [])
+
+    def test_admin_view(self):
+        """Validate the coverage gaps admin view"""
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        response = self.client.get("/admin/assistance/assistance/coverage-gaps/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Servicios sin cobertura")
+
+    def test_command(self):
+        """Validate the command runs and prints the counts"""
+
+        out = StringIO()
+        with redirect_stdout(out):
+            call_command("coverage_gaps", summary=True)
+
+        self.assertIn("coverage gaps", out.getvalue())
+
+
+class AttendanceRollupsTest(TestCase):
+    """Test the attendance rollups and the refresh command"""
+
+    def setUp(self):
+
+        # Create initial data
+        call_command("apps_loaddata")
+        self.admin_user, self.admin_pass, _ = test_data.create_admin_user()
+        self.weekly_assistance = test_data.create_weekly_assistance()
+        self.service = self.weekly_assistance.service
+        self.assistance = test_data.create_assistance(
+            service=self.service,
+            weekly_assistance=self.weekly_assistance,
+            date=timezone.localdate(),
+            attendance=True,
+        )
+
+    def test_changed_weeks_registered(self):
+        """Validate the week of the changed assistances is registered"""
+
+        self.assertTrue(
+            models.AttendanceRollupChange.objects.filter(
+                week_key=self.weekly_assistance.week_key
+            ).exists()
+        )
+
+    def test_changed_weeks_update_date(self):
+        """Validate the change date updated when the week is already
+        registered (single row per week)"""
+
+        old_date = timezone.now() - timezone.timedelta(days=1)
+        models.AttendanceRollupChange.objects.update(changed_at=old_date)
+
+        models.AttendanceRollupChange.mark_weeks(
+            [self.weekly_assistance.week_key]
+        )
+
+        change = models.AttendanceRollupChange.objects.get()
+        self.assertGreater(change.changed_at, old_date)
+
+    def test_refresh(self):
+        """Validate weekly and daily rollups created"""
+
+        call_command("refresh_attendance_rollups")
+
+        # Weekly rollup
+        weekly_attendances = self.service.schedule.weekly_attendances
+        week_rollup = models.AttendanceWeekRollup.objects.get()
+        self.assertEqual(week_rollup.agreement, self.service.agreement)
+        self.assertEqual(week_rollup.employee, self.service.employee)
+        self.assertEqual(week_rollup.expected_attendances, weekly_attendances)
+        self.assertEqual(week_rollup.attendances, 1)
+        self.assertEqual(week_rollup.absences, weekly_attendances - 1)
+
+        # Daily rollup
+        day_rollup = models.AttendanceDayRollup.objects.get()
+        self.assertEqual(day_rollup.date, timezone.localdate())
+        self.assertEqual(day_rollup.attendances, 1)
+
+        # Changes processed
+        self.assertFalse(models.AttendanceRollupChange.objects.exists())
+
+    def test_refresh_only_changed_weeks(self):
+        """Validate only the changed weeks are rebuilt"""
+
+        call_command("refresh_attendance_rollups")
+
+        # Change the rollup without changing the assistances
+        models.AttendanceWeekRollup.objects.update(attendances=99)
+        call_command("refresh_attendance_rollups")
+        self.assertEqual(models.AttendanceWeekRollup.objects.get().attendances, 99)
+
+        # Change an assistance
+        self.assistance.attendance = False
+        self.assistance.save()
+        call_command("refresh_attendance_rollups")
+        self.assertEqual(models.AttendanceWeekRollup.objects.get().attendances, 0)
+
+    def test_report(self):
+        """Validate the absences report by agreement"""
+
+        call_command("refresh_attendance_rollups")
+        week_key = self.weekly_assistance.week_key
+
+        report = rollups.get_report(week_key, week_key, "agreement")
+
+        weekly_attendances = self.service.schedule.weekly_attendances
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]["name"], self.service.agreement.company_name)
+        self.assertEqual(
+            report[0]["absence_rate"],
+            round((weekly_attendances - 1) * 100 / weekly_attendances, 2),
+        )
+
+    def test_admin_report(self):
+        """Validate the absences report admin view"""
+
+        call_command("refresh_attendance_rollups")
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        response = self.client.get(
+            "/admin/assistance/attendanceweekrollup/report/?group=employee"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.service.employee.name)
+
+    def test_report_invalid_date(self):
+        """Validate the form with an error (400) with an impossible date"""
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        response = self.client.get(
+            "/admin/assistance/attendanceweekrollup/report/?start=2024-13-45"
+        )
+
+        self.assertContains(response, "Fecha inválida", status_code=400)
+        self.assertContains(response, 'name="start"', status_code=400)
+
+
 class CommandCreateWeeklyAssistanceTest(TestCase):
     """Test running the command create_weekly_assistance"""
 
@@ -597,6 +1280,55 @@ class CommandCreateWeeklyAssistanceTest(TestCase):
         self.assertEqual(weekly_assistance.week_number, get_current_week())
         self.assertEqual(weekly_assistance.service, self.service)
 
+    def test_run_twice(self):
+        """Validate the command can be run again without duplicates"""
+
+        # Run command twice
+        call_command("create_weekly_assistance")
+        call_command("create_weekly_assistance")
+
+        # Validate only one weekly assistance
+        weekly_assistances = models.WeeklyAssistance.objects.filter(
+            service=self.service
+        )
+        self.assertEqual(weekly_assistances.count(), 1)
+
+    def test_run_many_services_queries(self):
+        """Validate the queries don't depend on the number of services"""
+
+        for _ in range(5):
+            test_data.create_service()
+
+        # Count: existing services, savepoint, services,
+        # bulk create, inserted rows and savepoint release
+        with self.assertNumQueries(6):
+            call_command("create_weekly_assistance")
+
+        self.assertEqual(models.WeeklyAssistance.objects.count(), 6)
+
+    def test_run_summary(self):
+        """Validate only a summary line, counting the inserted rows"""
+
+        existing_service = test_data.create_service()
+        test_data.create_weekly_assistance(service=existing_service)
+
+        output = StringIO()
+        with redirect_stdout(output):
+            call_command("create_weekly_assistance")
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith(
+            "Created 1 weekly assistances for 2 services (1 already existed)"
+        ))
+
+    def test_unique_service_week(self):
+        """Validate only one weekly assistance per service and week"""
+
+        test_data.create_weekly_assistance(service=self.service)
+        with self.assertRaises(IntegrityError):
+            test_data.create_weekly_assistance(service=self.service)
+
     def test_run_no_service(self):
         """Validate command create_weekly_assistance without services
         (no weekly assistance created)"""
@@ -648,6 +1380,47 @@ class CommandCreateAssistanceTest(TestCase):
         weekly_assistances_num_new = models.WeeklyAssistance.objects.count()
         self.assertEqual(weekly_assistances_num, weekly_assistances_num_new)
 
+    def test_run_twice(self):
+        """Validate the command can be run again without duplicates"""
+
+        # Run command twice
+        call_command("create_assistance")
+        call_command("create_assistance")
+
+        # Validate only one assistance
+        assistances = models.Assistance.objects.filter(
+            weekly_assistance=self.weekly_assistance
+        )
+        self.assertEqual(assistances.count(), 1)
+
+    def test_run_week_day_updated(self):
+        """Validate the week day of the weekly assistance is updated"""
+
+        # Set attendance in the current week day
+        day_name = get_week_day(timezone.now(), "en")
+        models.WeeklyAssistance.objects.update(**{day_name: True})
+
+        # Run command
+        call_command("create_assistance")
+
+        # Validate the week day without attendance
+        self.weekly_assistance.refresh_from_db()
+        self.assertFalse(getattr(self.weekly_assistance, day_name))
+
+    def test_run_many_services_queries(self):
+        """Validate the queries don't depend on the number of services"""
+
+        for _ in range(5):
+            test_data.create_weekly_assistance()
+
+        # Count: missing weekly assistances, savepoint, bulk create,
+        # week day update, savepoint release, payrolls, rollup weeks (3),
+        # summary counts
+        with self.assertNumQueries(11):
+            call_command("create_assistance")
+
+        self.assertEqual(models.Assistance.objects.count(), 6)
+
     def test_run_no_service(self):
         """Validate command create_assistance without services
         (no assistance created)"""
@@ -0,0 +1,11 @@
+from django.urls import path
+from assistance import views
+
+
+urlpatterns = [
+    path(
+        'qr/<str:code>',
+        views.ApiQrCheckInView.as_view(),
+        name='api-qr-check-in'
+    ),
+]
@@ -1,3 +1,197 @@
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.core.cache import cache
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.views import View
 
-# Create your views here.
+from assistance import models
+from utils.dates import get_week_key
+
+
+class ApiQrCheckInView(
+    LoginRequiredMixin,
+    PermissionRequiredMixin,
+    View,
+):
+    """ Endpoint of the employees QR codes: register the attendance
+    of today in the current service of the employee (GET shows a
+    confirmation page, the attendance is registered with POST) """
+
+    permission_required = 'assistance.change_assistance'
+
+    def get_cache_key(self, code: str, week_key: int) -> str:
+        """ Return the cache key of an employee code in a week """
+        return f"qr_checkin:{code}:{week_key}"
+
+    def get_week_data(self, code: str, week_key: int, use_cache=True) -> dict:
+        """ Return the employee, service and weekly assistance of a code
+        (one query, cached until the week ends or the timeout)
+
+        Args:
+            code (str): Employee code
+            week_key (int): Week key (year * 100 + week number)
+            use_cache (bool): Read the data from the cache if available
+
+        Returns:
+            dict: Employee name and ids, or None if there is no weekly
+                assistance of the employee in the week
+        """
+
+        cache_key = self.get_cache_key(code, week_key)
+        week_data = cache.get(cache_key) if use_cache else None
+        if week_data:
+            return week_data
+
+        # Weekly assistance of the current (last) service of the employee
+        weekly_assistance = models.WeeklyAssistance.objects.filter(
+            service__employee__code=code,
+            week_key=week_key,
+        ).select_related(
+            'service__employee'
+        ).order_by('-service_id').first()
+        if not weekly_assistance:
+            return None
+
+        employee = weekly_assistance.service.employee
+        week_data = {
+            "employee_id": employee.id,
+            "employee": employee.get_full_name(),
+            "service_id": weekly_assistance.service_id,
+            "weekly_assistance_id": weekly_assistance.id,
+        }
+        cache.set(cache_key, week_data, settings.QR_CHECKIN_CACHE_TIMEOUT)
+        return week_data
+
+    def check_in(self, weekly_assistance_id: int, today) -> tuple:
+        """ Register the attendance of today, locking the weekly assistance
+        so simultaneous scans don't create duplicated assistances
+
+        Args:
+            weekly_assistance_id (int): Id of the weekly assistance
+            today (date): Date of the attendance
+
+        Returns:
+            tuple: Assistance (None if the weekly assistance no longer exists)
+                and True if the attendance was already registered
+        """
+
+        with transaction.atomic():
+            locked = models.WeeklyAssistance.objects.select_for_update().filter(
+                id=weekly_assistance_id
+            ).values_list('id', flat=True)
+            if not locked:
+                return None, False
+
+            assistance = models.Assistance.objects.filter(
+                weekly_assistance_id=weekly_assistance_id,
+                date=today,
+            ).first()
+            if assistance and assistance.attendance:
+                return assistance, True
+
+            if not assistance:
+                assistance = models.Assistance(
+                    weekly_assistance_id=weekly_assistance_id,
+                    date=today,
+                )
+            assistance.attendance = True
+            assistance.save()
+
+        return assistance, False
+
+    def queue_check_in(self, code: str) -> JsonResponse:
+        """ Save the scan in the check-ins queue and answer immediately
+        (registered later by the process_check_ins command) """
+
+        if len(code) > models.CheckIn._meta.get_field('code').max_length:
+            return JsonResponse({
+                "status": "error",
+                "message": "Código inválido",
+                "data": {}
+            }, status=400)
+
+        check_in = models.CheckIn.objects.create(code=code)
+        return JsonResponse({
+            "status": "success",
+            "message": "Asistencia recibida",
+            "data": {
+                "check_in_id": check_in.id,
+                "scanned_at": check_in.scanned_at.isoformat(),
+            }
+        }, status=202)
+
+    def get(self, request, code, *args, **kwargs):
+        """ Confirmation page of the scan (opening the QR link doesn't
+        register the attendance: the page sends the form with POST) """
+
+        queue_mode = settings.QR_CHECKIN_MODE == "queue"
+        week_data = None
+        if not queue_mode:
+            week_data = self.get_week_data(code, get_week_key(timezone.localdate()))
+
+        return render(
+            request,
+            "assistance/qr-check-in.html",
+            {
+                "title": "Registro de asistencia",
+                "code": code,
+                "week_data": week_data,
+                "queue_mode": queue_mode,
+            },
+            status=200 if queue_mode or week_data else 404,
+        )
+
+    def post(self, request, code, *args, **kwargs):
+        """ Register the attendance of the scan (CSRF protected) """
+
+        # Ingestion mode: only queue the scan
+        if settings.QR_CHECKIN_MODE == "queue":
+            return self.queue_check_in(code)
+
+        today = timezone.localdate()
+        week_key = get_week_key(today)
+
+        # Validate employee week
+        week_data = self.get_week_data(code, week_key)
+        if not week_data:
+            return JsonResponse({
+                "status": "error",
+                "message": "No se encontró un servicio activo para el código",
+                "data": {}
+            }, status=404)
+
+        # Register attendance (reload the cached data once if outdated)
+        assistance, already_registered = self.check_in(
+            week_data["weekly_assistance_id"], today
+        )
+        if not assistance:
+            week_data = self.get_week_data(code, week_key, use_cache=False)
+            if week_data:
+                assistance, already_registered = self.check_in(
+                    week_data["weekly_assistance_id"], today
+                )
+        if not assistance:
+            cache.delete(self.get_cache_key(code, week_key))
+            return JsonResponse({
+                "status": "error",
+                "message": "No se encontró un servicio activo para el código",
+                "data": {}
+            }, status=404)
+
+        message = "Asistencia registrada"
+        if already_registered:
+            message = "La asistencia ya estaba registrada"
+        return JsonResponse({
+            "status": "success",
+            "message": message,
+            "data": {
+                "employee_id": week_data["employee_id"],
+                "employee": week_data["employee"],
+                "service_id": week_data["service_id"],
+                "assistance_id": assistance.id,
+                "date": today.isoformat(),
+            }
+        })
@@ -1,3 +1,30 @@
 from django.contrib import admin
 
-# Register your models here.
+from core import models
+
+
+@admin.register(models.PipelineStageRun)
+class PipelineStageRunAdmin(admin.ModelAdmin):
+    """ Nightly pipeline stages admin (read only) """
+
+    list_display = (
+        'run_date',
+        'stage',
+        'week_key',
+        'status',
+        'rows',
+        'attempts',
+        'started_at',
+        'finished_at',
+    )
+    list_filter = (
+        'status',
+        'stage',
+    )
+    ordering = ('-run_date', '-started_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
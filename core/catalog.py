@@ -0,0 +1,240 @@
+import copy
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor
+from django.db.models.signals import post_delete, post_save
+
+# Small and rarely changing tables, loaded once per process
+CATALOG_MODELS = [
+    "employees.MaritalStatus",
+    "employees.Status",
+    "employees.Bank",
+    "employees.Education",
+    "employees.Department",
+    "services.Schedule",
+    "assistance.ExtraPaymentCategory",
+]
+
+# Process-local cache backends: the catalog versions are not seen by the
+# other workers, so the catalogs are only kept during a request
+LOCAL_CACHE_BACKENDS = [
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+]
+
+# Loaded catalogs by model label:
+# {label: {"version", "checked_at", "objects", "by_id", "by_name"}}
+catalogs = {}
+
+
+def get_version_key(model) -> str:
+    """ Return the shared cache key with the version of a catalog
+
+    Args:
+        model (Model): Catalog model
+
+    Returns:
+        str: Cache key
+    """
+
+    return f"catalog:{model._meta.label_lower}:version"
+
+
+def get_version(model) -> int:
+    """ Return the current version of a catalog from the shared cache
+    (created if missing), so all the workers see the same changes
+
+    Args:
+        model (Model): Catalog model
+
+    Returns:
+        int: Catalog version
+    """
+
+    version_key = get_version_key(model)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, time.time_ns(), timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+def load(model) -> dict:
+    """ Return the loaded catalog of a model, reloading it from the
+    database when the shared version changed
+
+    Args:
+        model (Model): Catalog model
+
+    Returns:
+        dict: Loaded catalog
+    """
+
+    label = model._meta.label_lower
+    catalog = catalogs.get(label)
+    now = time.monotonic()
+
+    # Check the shared version at most once per interval
+    if catalog and now - catalog["checked_at"] < settings.CATALOG_CHECK_INTERVAL:
+        return catalog
+
+    version = get_version(model)
+    if catalog and catalog["version"] == version:
+        catalog["checked_at"] = now
+        return catalog
+
+    objects = list(model.objects.all())
+    catalog = {
+        "version": version,
+        "checked_at": now,
+        "objects": objects,
+        "by_id": {obj.pk: obj for obj in objects},
+        "by_name": {obj.name: obj for obj in objects},
+    }
+    catalogs[label] = catalog
+    return catalog
+
+
+def invalidate(model) -> None:
+    """ Delete the loaded catalog in this process and update the shared
+    version, so the other workers reload it too
+
+    Args:
+        model (Model): Catalog model
+    """
+
+    catalogs.pop(model._meta.label_lower, None)
+    cache.set(get_version_key(model), time.time_ns(), timeout=None)
+
+
+def get_all(model) -> list:
+    """ Return all the objects of a catalog
+
+    Args:
+        model (Model): Catalog model
+
+    Returns:
+        list: Catalog objects, in the model default order
+    """
+
+    return list(load(model)["objects"])
+
+
+def get(model, id: int):
+    """ Return a catalog object by id (reloading the catalog once
+    if the id is not found)
+
+    Args:
+        model (Model): Catalog model
+        id (int): Object id
+
+    Raises:
+        model.DoesNotExist: Object not found
+
+    Returns:
+        Model: Catalog object
+    """
+
+    obj = load(model)["by_id"].get(id)
+    if obj is None:
+        catalogs.pop(model._meta.label_lower, None)
+        obj = load(model)["by_id"].get(id)
+    if obj is None:
+        raise model.DoesNotExist(
+            f"{model._meta.object_name} matching id {id} does not exist."
+        )
+    return obj
+
+
+def get_by_name(model, name: str):
+    """ Return a catalog object by name
+
+    Args:
+        model (Model): Catalog model
+        name (str): Object name
+
+    Returns:
+        Model: Catalog object, or None if not found
+    """
+
+    return load(model)["by_name"].get(name)
+
+
+class CatalogForwardDescriptor(ForwardManyToOneDescriptor):
+    """ Foreign key descriptor that reads the related object
+    from the catalog instead of the database """
+
+    def get_object(self, instance):
+        """ Return a copy of the catalog object, so changes in the
+        instance don't affect the shared catalog """
+
+        model = self.field.remote_field.model
+        return copy.copy(get(model, getattr(instance, self.field.attname)))
+
+
+def is_shared_cache() -> bool:
+    """ Return True if the cache backend is shared by all the workers
+
+    Returns:
+        bool: False for process-local backends (e.g. LocMemCache)
+    """
+
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+def on_catalog_change(sender, **kwargs):
+    """ Invalidate the catalog when one of its objects changes, after the
+    commit (so other workers can't reload the uncommitted rows under
+    the new version) """
+    transaction.on_commit(lambda: invalidate(sender))
+
+
+def on_request_started(sender, **kwargs):
+    """ Discard the loaded catalogs at the start of each request when the
+    cache backend is process-local (the versions changed by other workers
+    would never be seen) """
+    if not is_shared_cache():
+        catalogs.clear()
+
+
+def connect():
+    """ Connect the catalog signals and set the catalog descriptor in the
+    foreign keys to the catalog models (called from CoreConfig.ready) """
+
+    catalog_models = [apps.get_model(label) for label in CATALOG_MODELS]
+
+    # Invalidate catalogs when they change
+    for model in catalog_models:
+        post_save.connect(
+            on_catalog_change,
+            sender=model,
+            dispatch_uid=f"catalog_save_{model._meta.label_lower}",
+        )
+        post_delete.connect(
+            on_catalog_change,
+            sender=model,
+            dispatch_uid=f"catalog_delete_{model._meta.label_lower}",
+        )
+
+    # Don't keep catalogs between requests without a shared cache
+    request_started.connect(
+        on_request_started,
+        dispatch_uid="catalog_request_started",
+    )
+
+    # Read foreign keys to catalogs from the catalog
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            is_catalog_key = (
+                field.many_to_one
+                and field.concrete
+                and field.related_model in catalog_models
+                and field.target_field.primary_key
+            )
+            if is_catalog_key:
+                setattr(model, field.name, CatalogForwardDescriptor(field))
@@ -0,0 +1,50 @@
+from datetime import date as Date
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import models
+from utils import payroll_calendar
+
+
+class Command(BaseCommand):
+    help = 'Save the payroll calendar days in the database'
+    
+    def add_arguments(self, parser):
+        current_year = timezone.localdate().year
+        parser.add_argument(
+            '--start-year',
+            type=int,
+            default=current_year - payroll_calendar.YEARS_BEFORE,
+            help='First year of the calendar',
+        )
+        parser.add_argument(
+            '--end-year',
+            type=int,
+            default=current_year + payroll_calendar.YEARS_AFTER,
+            help='Last year of the calendar',
+        )
+    
+    def handle(self, *args, **options):
+        
+        calendar_days = payroll_calendar.build_days(
+            Date(options['start_year'], 1, 1),
+            Date(options['end_year'], 12, 31),
+        )
+        models.PayrollCalendarDay.objects.bulk_create(
+            [
+                models.PayrollCalendarDay(
+                    date=calendar_day.date,
+                    week_number=calendar_day.week_number,
+                    year=calendar_day.year,
+                    week_key=calendar_day.week_key,
+                    week_start=calendar_day.week_start,
+                    week_end=calendar_day.week_end,
+                    week_day=calendar_day.week_day,
+                )
+                for calendar_day in calendar_days
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        print(f"Saved {len(calendar_days)} payroll calendar days")
@@ -0,0 +1,142 @@
+import time
+import traceback
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounting.management.commands.create_payrolls import create_payrolls_bulk
+from assistance import models as assistance_models
+from core.models import PipelineStageRun
+from services import models as services_models
+from utils import payroll_calendar
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the nightly stages (weekly assistances, daily assistances and '
+        'payrolls) in one process, resuming from the last failed stage '
+        '(the payrolls of a week are created by the first successful run '
+        'after the week ends)'
+    )
+
+    stages = [
+        'create_weekly_assistance',
+        'create_assistance',
+        'create_payrolls',
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Run again the stages already completed today',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows created in each query',
+        )
+        parser.add_argument(
+            '--date',
+            type=date.fromisoformat,
+            help='Run date (YYYY-MM-DD, default: today)',
+        )
+
+    def get_services(self) -> list:
+        """ Load the services once, with their related data
+        (only the weekly assistances stage reads the services: the daily
+        stage finds the missing assistances from the weekly assistances) """
+
+        if self.services is None:
+            self.services = list(
+                services_models.Service.objects.select_related(
+                    'agreement', 'employee', 'schedule'
+                ).order_by('id')
+            )
+        return self.services
+
+    def run_create_weekly_assistance(self, stage_run) -> int:
+        """ Create the weekly assistances of the current week """
+
+        stage_run.week_key = self.calendar_day.week_key
+        result = assistance_models.WeeklyAssistance.create_week(
+            services=self.get_services(),
+            batch_size=self.batch_size,
+            date=self.calendar_day.date,
+        )
+        return result['created']
+
+    def run_create_assistance(self, stage_run) -> int:
+        """ Create the assistances of today """
+
+        stage_run.week_key = self.calendar_day.week_key
+        result = assistance_models.Assistance.create_day(
+            batch_size=self.batch_size,
+            date=self.calendar_day.date,
+        )
+        return result['created']
+
+    def run_create_payrolls(self, stage_run) -> int:
+        """ Create the payrolls of the last ended week, keyed by its week
+        (skipped when a previous run already created them, so a failed
+        first day of the week is resumed by the next runs) """
+
+        last_week_day = self.calendar_day.week_start - timezone.timedelta(days=1)
+        stage_run.week_key = payroll_calendar.get_day(last_week_day).week_key
+
+        week_completed = PipelineStageRun.objects.filter(
+            stage='create_payrolls',
+            week_key=stage_run.week_key,
+            status='success',
+        ).exclude(id=stage_run.id).exists()
+        if week_completed and not self.force:
+            stage_run.status = 'skipped'
+            return 0
+
+        result = create_payrolls_bulk(stage_run.week_key)
+        return result['payrolls']
+
+    def handle(self, *args, **options):
+
+        self.calendar_day = payroll_calendar.get_day(options['date'])
+        self.batch_size = options['batch_size']
+        self.force = options['force']
+        self.services = None
+
+        for stage in self.stages:
+            stage_run, _ = PipelineStageRun.objects.get_or_create(
+                run_date=self.calendar_day.date,
+                stage=stage,
+            )
+
+            # Resume: skip the stages completed in a previous run
+            if stage_run.status in ['success', 'skipped'] and not options['force']:
+                print(f"{stage}: already completed ({stage_run.rows} rows)")
+                continue
+
+            stage_run.status = 'running'
+            stage_run.attempts += 1
+            stage_run.error = None
+            stage_run.started_at = timezone.now()
+            stage_run.finished_at = None
+            stage_run.save()
+            start_time = time.perf_counter()
+
+            try:
+                stage_run.rows = getattr(self, f"run_{stage}")(stage_run)
+            except Exception as error:
+                stage_run.status = 'error'
+                stage_run.error = traceback.format_exc()
+                stage_run.finished_at = timezone.now()
+                stage_run.save()
+                raise CommandError(f"{stage} failed: {error}") from error
+
+            if stage_run.status == 'running':
+                stage_run.status = 'success'
+            stage_run.finished_at = timezone.now()
+            stage_run.save()
+
+            elapsed = time.perf_counter() - start_time
+            print(f"{stage}: {stage_run.status} ({stage_run.rows} rows) in {elapsed:.2f}s")
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 23:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollCalendarDay',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False, verbose_name='Fecha')),
+                ('week_number', models.IntegerField(verbose_name='Número de semana')),
+                ('year', models.IntegerField(verbose_name='Año')),
+                ('week_key', models.IntegerField(db_index=True, verbose_name='Semana (año y número)')),
+                ('week_start', models.DateField(verbose_name='Inicio de semana')),
+                ('week_end', models.DateField(verbose_name='Fin de semana')),
+                ('week_day', models.CharField(max_length=10, verbose_name='Día de la semana')),
+            ],
+            options={
+                'verbose_name': 'Día de calendario de nómina',
+                'verbose_name_plural': 'Calendario de nómina',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_payrollcalendarday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineStageRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_date', models.DateField(verbose_name='Fecha de ejecución')),
+                ('stage', models.CharField(max_length=50, verbose_name='Etapa')),
+                ('week_key', models.IntegerField(blank=True, null=True, verbose_name='Semana (año y número)')),
+                ('status', models.CharField(choices=[('running', 'En proceso'), ('success', 'Completado'), ('skipped', 'Omitido'), ('error', 'Error')], default='running', max_length=10, verbose_name='Estado')),
+                ('rows', models.IntegerField(default=0, verbose_name='Registros')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Intentos')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Error')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Inicio')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+            ],
+            options={
+                'verbose_name': 'Etapa de proceso nocturno',
+                'verbose_name_plural': 'Etapas de proceso nocturno',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pipelinestagerun',
+            constraint=models.UniqueConstraint(fields=('run_date', 'stage'), name='unique_pipeline_stage_run'),
+        ),
+    ]
@@ -1,3 +1,105 @@
 from django.db import models
 
-# Create your models here.
+
+class PayrollCalendarDay(models.Model):
+    """ Payroll calendar (persisted utils.payroll_calendar days),
+    to group dates by payroll week with a join """
+    
+    date = models.DateField(
+        primary_key=True,
+        verbose_name='Fecha',
+    )
+    week_number = models.IntegerField(
+        verbose_name='Número de semana',
+    )
+    year = models.IntegerField(
+        verbose_name='Año',
+    )
+    week_key = models.IntegerField(
+        verbose_name='Semana (año y número)',
+        db_index=True,
+    )
+    week_start = models.DateField(
+        verbose_name='Inicio de semana',
+    )
+    week_end = models.DateField(
+        verbose_name='Fin de semana',
+    )
+    week_day = models.CharField(
+        max_length=10,
+        verbose_name='Día de la semana',
+    )
+    
+    class Meta:
+        verbose_name = 'Día de calendario de nómina'
+        verbose_name_plural = 'Calendario de nómina'
+        
+    def __str__(self):
+        return f"{self.date} (Semana {self.week_number} {self.year})"
+
+
+class PipelineStageRun(models.Model):
+    """ Result of a stage of the nightly pipeline (run_pipeline command),
+    used to resume a failed run from the failed stage """
+    
+    STATUS_CHOICES = [
+        ('running', 'En proceso'),
+        ('success', 'Completado'),
+        ('skipped', 'Omitido'),
+        ('error', 'Error'),
+    ]
+    
+    run_date = models.DateField(
+        verbose_name='Fecha de ejecución',
+    )
+    stage = models.CharField(
+        max_length=50,
+        verbose_name='Etapa',
+    )
+    week_key = models.IntegerField(
+        verbose_name='Semana (año y número)',
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='running',
+        verbose_name='Estado',
+    )
+    rows = models.IntegerField(
+        verbose_name='Registros',
+        default=0,
+    )
+    attempts = models.IntegerField(
+        verbose_name='Intentos',
+        default=0,
+    )
+    error = models.TextField(
+        verbose_name='Error',
+        null=True,
+        blank=True,
+    )
+    started_at = models.DateTimeField(
+        verbose_name='Inicio',
+        null=True,
+        blank=True,
+    )
+    finished_at = models.DateTimeField(
+        verbose_name='Fin',
+        null=True,
+        blank=True,
+    )
+    
+    class Meta:
+        verbose_name = 'Etapa de proceso nocturno'
+        verbose_name_plural = 'Etapas de proceso nocturno'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['run_date', 'stage'],
+                name='unique_pipeline_stage_run',
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.run_date} - {self.stage} ({self.status})"
@@ -1,6 +1,14 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_started
 from django.utils import timezone
-from utils import dates
+from core import catalog
+from core.models import PayrollCalendarDay, PipelineStageRun
+from accounting import models as accounting_models
+from assistance import models as assistance_models
+from employees import models as employees_models
+from utils import dates, payroll_calendar, test_data
 import os
 from django.conf import settings
 
@@ -48,4 +56,360 @@ class UtilsDatesGetCurrentWeekTest(TestCase):
         date = timezone.datetime(2024, 12, 28, 0, 0, 0, 0, time_zone)
         week = dates.get_current_week(date)
         
-        self.assertEqual(week, 52)
\ No newline at end of file
+        self.assertEqual(week, 52)
+
+
+class UtilsDatesGetWeekKeyTest(TestCase):
+    """ Test function "get_week_key" from utils.dates """
+    
+    def test_week_key_before_thursday_new_year(self):
+        """ Try to get the week key of a date before Thursday in a new year
+            Expected result: week 52 of the last year
+        """
+        
+        time_zone = timezone.get_current_timezone()
+        date = timezone.datetime(2025, 1, 1, 0, 0, 0, 0, time_zone)
+        week_key = dates.get_week_key(date)
+        
+        self.assertEqual(week_key, 202452)
+        
+    def test_week_key_thursday_new_year(self):
+        """ Try to get the week key of the first Thursday of the year
+            Expected result: week 1 of the new year
+        """
+        
+        time_zone = timezone.get_current_timezone()
+        date = timezone.datetime(2025, 1, 2, 0, 0, 0, 0, time_zone)
+        week_key = dates.get_week_key(date)
+        
+        self.assertEqual(week_key, 202501)
+        
+    def test_week_key_week_53(self):
+        """ Try to get the week key of a week 53 in the next year
+            Expected result: week 53 of the last year
+        """
+        
+        time_zone = timezone.get_current_timezone()
+        date = timezone.datetime(2027, 1, 1, 0, 0, 0, 0, time_zone)
+        week_key = dates.get_week_key(date)
+        
+        self.assertEqual(week_key, 202653)
+
+
+class PayrollCalendarTest(TestCase):
+    """ Test payroll calendar from utils.payroll_calendar """
+    
+    def test_week_start_end(self):
+        """ Validate payroll week from Thursday to Wednesday """
+        
+        date = timezone.datetime(2024, 12, 30).date()
+        calendar_day = payroll_calendar.get_day(date)
+        
+        self.assertEqual(calendar_day.week_start, date - timezone.timedelta(days=4))
+        self.assertEqual(calendar_day.week_end, date + timezone.timedelta(days=2))
+        self.assertEqual(calendar_day.week_key, 202452)
+        self.assertEqual(calendar_day.week_day, "monday")
+        self.assertEqual(calendar_day.week_day_es, "lunes")
+        
+    def test_datetime_time_zone(self):
+        """ Validate datetimes are converted to the current time zone """
+        
+        # Thursday 2 am in UTC is Wednesday in Mexico City
+        date = timezone.datetime(2025, 1, 2, 2, 0, 0, 0, timezone.utc)
+        calendar_day = payroll_calendar.get_day(date)
+        
+        self.assertEqual(calendar_day.week_day, "wednesday")
+        self.assertEqual(calendar_day.week_key, 202452)
+        
+    def test_week_dates(self):
+        """ Validate first and last dates of a week key """
+        
+        week_start, week_end = payroll_calendar.get_week_dates(202501)
+        
+        self.assertEqual(week_start, timezone.datetime(2025, 1, 2).date())
+        self.assertEqual(week_end, timezone.datetime(2025, 1, 8).date())
+        
+    def test_current_week_now(self):
+        """ Validate the current week is calculated with the current date """
+        
+        today = timezone.localdate()
+        self.assertEqual(
+            dates.get_current_week(), payroll_calendar.get_day(today).week_number
+        )
+        
+    def test_build_payroll_calendar(self):
+        """ Validate the calendar days saved in the database """
+        
+        call_command(
+            "build_payroll_calendar", "--start-year", "2024", "--end-year", "2025"
+        )
+        
+        calendar_days = PayrollCalendarDay.objects.all()
+        self.assertEqual(calendar_days.count(), 366 + 365)
+        calendar_day = calendar_days.get(date=timezone.datetime(2025, 1, 1).date())
+        self.assertEqual(calendar_day.week_key, 202452)
+
+
+class CatalogTest(TestCase):
+    """ Test lookup tables cached with the catalog """
+    
+    def setUp(self):
+        
+        # Load initial data
+        call_command("apps_loaddata")
+        
+    def test_get_all_cached(self):
+        """ Validate the catalog is loaded once from the database """
+        
+        educations = catalog.get_all(employees_models.Education)
+        self.assertEqual(
+            [education.id for education in educations],
+            list(employees_models.Education.objects.values_list("id", flat=True))
+        )
+        
+        with self.assertNumQueries(0):
+            catalog.get_all(employees_models.Education)
+            catalog.get_by_name(employees_models.Education, educations[0].name)
+            
+    def test_foreign_key_from_catalog(self):
+        """ Validate foreign keys to catalogs don't query the database """
+        
+        employee = test_data.create_employee()
+        employee = employees_models.Employee.objects.get(id=employee.id)
+        catalog.get_all(employees_models.Status)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(employee.status.id, employee.status_id)
+    
+    def test_invalidate_on_save(self):
+        """ Validate changes in the catalog models are visible """
+        
+        status = catalog.get_all(employees_models.Status)[0]
+        version = catalog.get_version(employees_models.Status)
+        with self.captureOnCommitCallbacks(execute=True):
+            status.name = "Nuevo estatus"
+            status.save()
+            
+            # Version updated only after the commit
+            self.assertEqual(version, catalog.get_version(employees_models.Status))
+        
+        self.assertNotEqual(version, catalog.get_version(employees_models.Status))
+        catalog_status = catalog.get(employees_models.Status, status.id)
+        self.assertEqual(catalog_status.name, "Nuevo estatus")
+        
+    @override_settings(CATALOG_CHECK_INTERVAL=0)
+    def test_invalidate_other_worker(self):
+        """ Validate the catalog is reloaded when the shared version changes
+        (changes saved by other worker) """
+        
+        status = catalog.get_all(employees_models.Status)[0]
+        employees_models.Status.objects.filter(id=status.id).update(
+            name="Nuevo estatus"
+        )
+        cache.set(catalog.get_version_key(employees_models.Status), 0)
+        
+        catalog_status = catalog.get(employees_models.Status, status.id)
+        self.assertEqual(catalog_status.name, "Nuevo estatus")
+    
+    def test_local_cache_reload_each_request(self):
+        """ Validate the catalogs are not kept between requests with
+        a process-local cache backend """
+        
+        catalog.get_all(employees_models.Status)
+        request_started.send(sender=self.__class__)
+        
+        self.assertNotIn("employees.status", catalog.catalogs)
+        
+    @override_settings(CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "cache_table",
+        }
+    })
+    def test_shared_cache_keep_between_requests(self):
+        """ Validate the catalogs are kept between requests with
+        a shared cache backend """
+        
+        catalog.catalogs["employees.status"] = {"version": 0}
+        self.addCleanup(catalog.catalogs.pop, "employees.status", None)
+        request_started.send(sender=self.__class__)
+        
+        self.assertIn("employees.status", catalog.catalogs)
+
+
+class CommandRunPipelineTest(TestCase):
+    """ Test running the command run_pipeline """
+    
+    def setUp(self):
+        
+        # Create initial data
+        call_command("apps_loaddata")
+        self.service = test_data.create_service()
+        self.today = timezone.localdate()
+        
+        # Fixed run dates: first days of the current week and last week key
+        self.thursday = payroll_calendar.get_day(self.today).week_start
+        self.friday = self.thursday + timezone.timedelta(days=1)
+        self.last_week_key = payroll_calendar.get_day(
+            self.thursday - timezone.timedelta(days=1)
+        ).week_key
+        
+    def create_last_week_assistance(self):
+        """ Create a weekly assistance of the last week (in a new service) """
+        
+        weekly_assistance = test_data.create_weekly_assistance()
+        assistance_models.WeeklyAssistance.objects.filter(
+            id=weekly_assistance.id
+        ).update(
+            week_key=self.last_week_key,
+            week_number=self.last_week_key % 100,
+        )
+        return weekly_assistance
+        
+    def test_run(self):
+        """ Validate the stages run in order and their records """
+        
+        call_command("run_pipeline")
+        
+        # Validate weekly assistance and assistance created
+        weekly_assistance = assistance_models.WeeklyAssistance.objects.get(
+            service=self.service
+        )
+        self.assertTrue(
+            assistance_models.Assistance.objects.filter(
+                weekly_assistance=weekly_assistance, date=self.today
+            ).exists()
+        )
+        
+        # Validate stages records
+        stage_runs = {
+            stage_run.stage: stage_run
+            for stage_run in PipelineStageRun.objects.filter(run_date=self.today)
+        }
+        self.assertEqual(stage_runs["create_weekly_assistance"].status, "success")
+        self.assertEqual(stage_runs["create_weekly_assistance"].rows, 1)
+        self.assertEqual(
+            stage_runs["create_weekly_assistance"].week_key,
+            weekly_assistance.week_key,
+        )
+        self.assertEqual(stage_runs["create_assistance"].status, "success")
+        self.assertEqual(stage_runs["create_payrolls"].status, "success")
+        self.assertEqual(
+            stage_runs["create_payrolls"].week_key, self.last_week_key
+        )
+        for stage_run in stage_runs.values():
+            self.assertIsNotNone(stage_run.finished_at)
+        
+    def test_resume_failed_stage(self):
+        """ Validate completed stages are skipped and the failed one
+        runs again """
+        
+        # Previous run failed in the daily assistances stage
+        PipelineStageRun.objects.create(
+            run_date=self.today,
+            stage="create_weekly_assistance",
+            status="success",
+            attempts=1,
+        )
+        test_data.create_weekly_assistance(service=self.service)
+        PipelineStageRun.objects.create(
+            run_date=self.today,
+            stage="create_assistance",
+            status="error",
+            attempts=1,
+            error="Error",
+        )
+        
+        call_command("run_pipeline")
+        
+        # Validate the completed stage not executed again
+        weekly_stage = PipelineStageRun.objects.get(
+            run_date=self.today, stage="create_weekly_assistance"
+        )
+        self.assertEqual(weekly_stage.attempts, 1)
+        
+        # Validate the failed stage retried
+        daily_stage = PipelineStageRun.objects.get(
+            run_date=self.today, stage="create_assistance"
+        )
+        self.assertEqual(daily_stage.status, "success")
+        self.assertEqual(daily_stage.attempts, 2)
+        self.assertEqual(daily_stage.rows, 1)
+        self.assertIsNone(daily_stage.error)
+        
+    def test_run_thursday_create_payrolls(self):
+        """ Validate the payrolls of the last week created on Thursday """
+        
+        weekly_assistance = self.create_last_week_assistance()
+        
+        call_command("run_pipeline", "--date", self.thursday.isoformat())
+        
+        # Validate payroll and stage record
+        self.assertTrue(
+            accounting_models.Payroll.objects.filter(
+                weekly_assistance=weekly_assistance
+            ).exists()
+        )
+        payrolls_stage = PipelineStageRun.objects.get(
+            run_date=self.thursday, stage="create_payrolls"
+        )
+        self.assertEqual(payrolls_stage.status, "success")
+        self.assertEqual(payrolls_stage.week_key, self.last_week_key)
+        self.assertEqual(payrolls_stage.rows, 1)
+        
+        # Validate the weekly and daily stages used the run date
+        self.assertTrue(
+            assistance_models.Assistance.objects.filter(
+                date=self.thursday,
+                weekly_assistance__week_key=payroll_calendar.get_day(
+                    self.thursday
+                ).week_key,
+            ).exists()
+        )
+        
+    def test_resume_failed_thursday_payrolls(self):
+        """ Validate the payrolls of a failed Thursday created on Friday """
+        
+        weekly_assistance = self.create_last_week_assistance()
+        PipelineStageRun.objects.create(
+            run_date=self.thursday,
+            stage="create_payrolls",
+            week_key=self.last_week_key,
+            status="error",
+            attempts=1,
+            error="Error",
+        )
+        
+        call_command("run_pipeline", "--date", self.friday.isoformat())
+        
+        # Validate payroll created by the Friday run
+        self.assertTrue(
+            accounting_models.Payroll.objects.filter(
+                weekly_assistance=weekly_assistance
+            ).exists()
+        )
+        payrolls_stage = PipelineStageRun.objects.get(
+            run_date=self.friday, stage="create_payrolls"
+        )
+        self.assertEqual(payrolls_stage.status, "success")
+        self.assertEqual(payrolls_stage.week_key, self.last_week_key)
+        
+    def test_skip_created_week_payrolls(self):
+        """ Validate the payrolls stage skipped after the week payrolls
+        were created by a previous run """
+        
+        call_command("run_pipeline", "--date", self.thursday.isoformat())
+        weekly_assistance = self.create_last_week_assistance()
+        
+        call_command("run_pipeline", "--date", self.friday.isoformat())
+        
+        payrolls_stage = PipelineStageRun.objects.get(
+            run_date=self.friday, stage="create_payrolls"
+        )
+        self.assertEqual(payrolls_stage.status, "skipped")
+        self.assertFalse(
+            accounting_models.Payroll.objects.filter(
+                weekly_assistance=weekly_assistance
+            ).exists()
+        )
+
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, reverse
 from django.contrib import admin
 from django.utils.html import format_html
 from django.shortcuts import render
@@ -90,7 +90,7 @@ class EmployeeAdmin(admin.ModelAdmin):
         "updated_at",
         "status_history",
         "balance",
-        "qr_image",
+        "qr_badge",
         "code",
     )
     fieldsets = (
@@ -133,7 +133,7 @@ class EmployeeAdmin(admin.ModelAdmin):
                     "status_change_details",
                     "knowledge",
                     "skills",
-                    "qr_image",
+                    "qr_badge",
                 ),
             },
         ),
@@ -187,8 +187,19 @@ class EmployeeAdmin(admin.ModelAdmin):
             f"/admin/employees/employee/{obj.id}/preview/",
         )
 
+    def qr_badge(self, obj):
+        """Render the QR image from the endpoint (no stored image needed)"""
+        if not obj.code:
+            return "-"
+        return format_html(
+            '<img src="{}" alt="QR {}" width="150" height="150" />',
+            reverse("employee-qr", args=[obj.code, "svg"]),
+            obj.code,
+        )
+
     # Labels for custom fields
     custom_links.short_description = "Acciones"
+    qr_badge.short_description = "Imagen QR"
 
     # CUSTOM VIEWS
 
@@ -5,3 +5,7 @@ class EmployeesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'employees'
     verbose_name = 'Empleados'
+
+    def ready(self):
+        # Revert the employees balances when the loans are deleted
+        from employees import signals  # noqa: F401
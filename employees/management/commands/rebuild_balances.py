@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, FloatField, Sum, Value, When
+
+from employees import models as employees_models
+
+
+class Command(BaseCommand):
+    help = "Recalculate the employees balances from their loans"
+
+    def handle(self, *args, **options):
+
+        with transaction.atomic():
+
+            # Loans totals by employee (one grouped aggregate)
+            loans_totals = dict(
+                employees_models.Loan.objects.values("employee_id").annotate(
+                    total=Sum("amount")
+                ).values_list("employee_id", "total")
+            )
+
+            # Employees with a different balance
+            employees = employees_models.Employee.objects.select_for_update()
+            balances = {}
+            for employee_id, balance in employees.values_list("id", "balance"):
+                loans_total = round(float(loans_totals.get(employee_id) or 0), 2)
+                if balance is None or round(balance, 2) != loans_total:
+                    balances[employee_id] = loans_total
+
+            # Save new balances
+            if balances:
+                employees_models.Employee.objects.filter(id__in=balances).update(
+                    balance=Case(
+                        *[
+                            When(id=employee_id, then=Value(balance))
+                            for employee_id, balance in balances.items()
+                        ],
+                        output_field=FloatField(),
+                    )
+                )
+
+        print(f"Rebuilt {len(balances)} employees balances")
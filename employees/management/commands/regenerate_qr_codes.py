@@ -0,0 +1,120 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from employees import models as employees_models
+from utils import qr
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate again the QR images of the employees (all or selected), '
+        'rendering them in worker processes and uploading them in parallel'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ids',
+            type=int,
+            nargs='+',
+            help='Only regenerate the QR images of these employees',
+        )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Only generate the QR images of the employees without image',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of worker processes rendering the images',
+        )
+        parser.add_argument(
+            '--upload-threads',
+            type=int,
+            default=8,
+            help='Number of parallel uploads to the storage',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Images saved in each batch (progress is reported by batch)',
+        )
+
+    def upload(self, employee, content: bytes) -> str:
+        """ Replace the QR image of an employee in the storage """
+        return qr.save_qr_file(employee.code, employee.qr_image.name, content)
+
+    def handle(self, *args, **options):
+
+        employees = employees_models.Employee.objects.only(
+            'id', 'code', 'qr_image'
+        ).order_by('id')
+        if options['ids']:
+            employees = employees.filter(id__in=options['ids'])
+        if options['missing']:
+            employees = employees.filter(qr_image='')
+        employees = list(employees)
+        total = len(employees)
+        if not total:
+            print("No employees found")
+            return
+
+        workers = options['workers']
+        batch_size = options['batch_size']
+        render_pool = None
+        if workers > 1:
+            # Close connections before fork (rendering doesn't use the database)
+            connections.close_all()
+            render_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=get_context("fork"),
+            )
+
+        start_time = time.perf_counter()
+        done = 0
+        try:
+            with ThreadPoolExecutor(max_workers=options['upload_threads']) as uploads:
+                for index in range(0, total, batch_size):
+                    batch = employees[index:index + batch_size]
+                    codes = [employee.code for employee in batch]
+
+                    # Render images
+                    if render_pool:
+                        images = list(render_pool.map(
+                            qr.render_qr_png,
+                            codes,
+                            chunksize=max(1, len(codes) // workers),
+                        ))
+                    else:
+                        images = [qr.render_qr_png(code) for code in codes]
+
+                    # Upload images and save their names (one query)
+                    names = uploads.map(self.upload, batch, images)
+                    for employee, name in zip(batch, names):
+                        employee.qr_image.name = name
+                    employees_models.Employee.objects.bulk_update(
+                        batch, ['qr_image']
+                    )
+
+                    done += len(batch)
+                    elapsed = time.perf_counter() - start_time
+                    print(
+                        f"{done}/{total} QR images "
+                        f"({done / elapsed:.1f} images/s)"
+                    )
+        finally:
+            if render_pool:
+                render_pool.shutdown()
+
+        elapsed = time.perf_counter() - start_time
+        print(
+            f"Regenerated {total} QR images in {elapsed:.2f}s "
+            f"({total / elapsed:.1f} images/s, {max(workers, 1)} workers, "
+            f"{options['upload_threads']} upload threads)"
+        )
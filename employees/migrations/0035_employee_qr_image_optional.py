@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0034_alter_employee_languages'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='employee',
+            name='qr_image',
+            field=models.ImageField(blank=True, upload_to='employees/qr_images/', verbose_name='Imagen QR'),
+        ),
+    ]
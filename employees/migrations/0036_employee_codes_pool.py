@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:28
+
+from django.db import migrations, models
+
+
+def create_counter(apps, schema_editor):
+    """ Create the single row of the codes sequence """
+    EmployeeCodeCounter = apps.get_model('employees', 'EmployeeCodeCounter')
+    EmployeeCodeCounter.objects.get_or_create(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0035_employee_qr_image_optional'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeCode',
+            fields=[
+                ('code', models.CharField(max_length=6, primary_key=True, serialize=False, verbose_name='Código')),
+            ],
+            options={
+                'verbose_name': 'Código disponible',
+                'verbose_name_plural': 'Códigos disponibles',
+            },
+        ),
+        migrations.CreateModel(
+            name='EmployeeCodeCounter',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('next_index', models.BigIntegerField(default=0, verbose_name='Siguiente posición')),
+            ],
+            options={
+                'verbose_name': 'Contador de códigos',
+                'verbose_name_plural': 'Contador de códigos',
+            },
+        ),
+        migrations.RunPython(create_counter, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,13 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from django.core.files.base import File
-from django.core.files.storage import default_storage
 
-import random
-from django.conf import settings
-import qrcode
-import os
 import string
+from django.conf import settings
+
+from utils import qr
 
 
 class Neighborhood(models.Model):
@@ -154,6 +154,144 @@ class Department(models.Model):
         return self.name
 
 
+class EmployeeCodeCounter(models.Model):
+    """Next position of the employee codes sequence (single row)"""
+
+    id = models.AutoField(primary_key=True)
+    next_index = models.BigIntegerField(
+        default=0, verbose_name="Siguiente posición"
+    )
+
+    class Meta:
+        """Model metadata"""
+
+        verbose_name = "Contador de códigos"
+        verbose_name_plural = "Contador de códigos"
+
+    def __str__(self):
+        """Text representation"""
+        return str(self.next_index)
+
+
+class EmployeeCode(models.Model):
+    """Pool of reserved employee codes not assigned yet"""
+
+    # Codes characters and length (36 ** 6 codes)
+    CHARACTERS = string.ascii_uppercase + string.digits
+    LENGTH = 6
+    SPACE = len(CHARACTERS) ** LENGTH
+
+    # Bijective scramble of the sequence positions (multiplier coprime
+    # with the codes space), so consecutive positions give unrelated codes
+    MULTIPLIER = 1_000_000_007
+    OFFSET = 170_123_456
+
+    code = models.CharField(
+        max_length=6, primary_key=True, verbose_name="Código"
+    )
+
+    class Meta:
+        """Model metadata"""
+
+        verbose_name = "Código disponible"
+        verbose_name_plural = "Códigos disponibles"
+
+    def __str__(self):
+        """Text representation"""
+        return self.code
+
+    @classmethod
+    def get_code(cls, index: int) -> str:
+        """ Return the code of a position of the sequence (each position
+        has a different code, until the codes space is exhausted)
+
+        Args:
+            index (int): Position of the sequence
+
+        Returns:
+            str: Employee code
+        """
+
+        if index >= cls.SPACE:
+            raise ValueError("No hay más códigos de empleado disponibles")
+
+        number = (index * cls.MULTIPLIER + cls.OFFSET) % cls.SPACE
+        characters = []
+        for _ in range(cls.LENGTH):
+            number, position = divmod(number, len(cls.CHARACTERS))
+            characters.append(cls.CHARACTERS[position])
+        return "".join(characters)
+
+    @classmethod
+    def reserve_block(cls, count: int) -> list:
+        """ Reserve the next positions of the sequence, skipping the codes
+        already used by employees (created before the sequence)
+
+        Args:
+            count (int): Number of codes to reserve
+
+        Returns:
+            list: Reserved codes (at least count)
+        """
+
+        codes = []
+        with transaction.atomic():
+            counter, _ = EmployeeCodeCounter.objects.select_for_update(
+            ).get_or_create(id=1)
+            while len(codes) < count:
+                size = max(count - len(codes), settings.EMPLOYEE_CODE_BLOCK_SIZE)
+                block = [
+                    cls.get_code(index)
+                    for index in range(
+                        counter.next_index, counter.next_index + size
+                    )
+                ]
+                counter.next_index += size
+                used_codes = set(
+                    Employee.objects.filter(code__in=block).values_list(
+                        "code", flat=True
+                    )
+                )
+                codes += [code for code in block if code not in used_codes]
+            counter.save()
+        return codes
+
+    @classmethod
+    def allocate(cls, count: int = 1) -> list:
+        """ Take codes from the pool (refilled by blocks when empty)
+
+        Args:
+            count (int): Number of codes
+
+        Returns:
+            list: Codes removed from the pool
+        """
+
+        with transaction.atomic():
+
+            # Codes of the pool not taken by other transactions
+            codes = list(
+                cls.objects.select_for_update(skip_locked=True).order_by(
+                    "code"
+                ).values_list("code", flat=True)[:count]
+            )
+            if codes:
+                cls.objects.filter(code__in=codes).delete()
+
+            # Reserve a new block and keep the unused codes in the pool
+            if len(codes) < count:
+                block = cls.reserve_block(count - len(codes))
+                missing = count - len(codes)
+                codes += block[:missing]
+                cls.objects.bulk_create(
+                    [cls(code=code) for code in block[missing:]],
+                    batch_size=1000,
+                    ignore_conflicts=True,
+                )
+
+        return codes
+
+
 class Employee(models.Model):
     """Primary model for employees"""
 
@@ -298,7 +436,7 @@ class Employee(models.Model):
         default=1
     )
     qr_image = models.ImageField(
-        upload_to="employees/qr_images/", verbose_name="Imagen QR"
+        upload_to="employees/qr_images/", verbose_name="Imagen QR", blank=True
     )
 
     # Contact info
@@ -394,8 +532,78 @@ class Employee(models.Model):
         """Text representation"""
         return f"{self.name} ({self.curp})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Keep the loaded values, to detect the changed fields"""
+
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_changed_fields(self) -> set:
+        """ Get the fields changed since the employee was loaded or saved
+        (all the fields if the loaded values are unknown)
+
+        Returns:
+            set: Changed field names
+        """
+
+        fields = [
+            field for field in self._meta.concrete_fields
+            if not field.primary_key
+        ]
+        loaded_values = getattr(self, "loaded_values", None)
+        if loaded_values is None:
+            return {field.name for field in fields}
+
+        changed_fields = set()
+        for field in fields:
+            if field.attname not in loaded_values:
+                # Deferred field: changed only if it was assigned
+                if field.attname in self.__dict__:
+                    changed_fields.add(field.name)
+            elif loaded_values[field.attname] != self.__get_field_value__(field):
+                changed_fields.add(field.name)
+        return changed_fields
+
+    def __get_field_value__(self, field):
+        """Return the value of a field as loaded from the database"""
+
+        value = getattr(self, field.attname)
+        if isinstance(value, FieldFile):
+            return value.name
+        return value
+
+    def __get_loaded_value__(self, attname: str):
+        """Return a loaded value (from the database if unknown)"""
+
+        loaded_values = getattr(self, "loaded_values", None)
+        if loaded_values is not None and attname in loaded_values:
+            return loaded_values[attname]
+        return Employee.objects.filter(pk=self.pk).values_list(
+            attname, flat=True
+        ).first()
+
+    def __set_loaded_values__(self, update_fields=None):
+        """Keep the saved values, to detect the next changes
+
+        Args:
+            update_fields (list): Saved fields (default: all)
+        """
+
+        self.loaded_values = {
+            **(getattr(self, "loaded_values", None) or {}),
+            **{
+                field.attname: self.__get_field_value__(field)
+                for field in self._meta.concrete_fields
+                if field.attname in self.__dict__
+                and (update_fields is None or field.name in update_fields)
+            },
+        }
+
     def save(self, *args, **kwargs):
-        """Custom save method"""
+        """ Save the employee, updating the status history only when the
+        status changed, and only the changed columns """
 
         is_new = self._state.adding
         now = timezone.now().astimezone()
@@ -405,78 +613,161 @@ class Employee(models.Model):
         if is_new:
             self.status_history += f"({now_str}) Estado: {self.status}"
 
-            # Generate unique code
-            self.code = self.generate_unique_code()
-
-            # Generate QR image
-            qr_image_path = self.generate_qr_image()
-            file_name = os.path.basename(qr_image_path)  # Solo el nombre del archivo
-            with open(qr_image_path, "rb") as f:
-                self.qr_image.name = default_storage.save(file_name, File(f))
+            # Generate unique code (unless assigned in a bulk import)
+            if not self.code:
+                self.code = self.generate_unique_code()
+
+            # Generate QR image (rendered in memory), or after the commit
+            # in a background thread ("none": only rendered by the endpoint)
+            if settings.QR_IMAGE_MODE == "deferred":
+                transaction.on_commit(
+                    lambda: qr.run_in_background(
+                        Employee.update_qr_image, self.pk
+                    )
+                )
+            elif settings.QR_IMAGE_MODE == "sync":
+                self.__save_qr_image__()
         else:
 
-            # Import services models avoiding circular imports
-            from services import models as services_models
-
-            # Get current emoloyee service
-            employee_services = services_models.Service.objects.filter(employee=self.pk)
-            if employee_services:
-                employee_service = employee_services.order_by("-id").first()
-            else:
-                employee_service = None
-
-            # Generate new status log
-            old_status = self._meta.model.objects.get(pk=self.pk).status
-            new_status = self.status
-            if old_status != new_status:
+            # Generate new status log (only when the status changed)
+            changed_fields = self.get_changed_fields()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                changed_fields &= set(update_fields)
+            old_status_id = self.status_id
+            if "status" in changed_fields:
+                old_status_id = self.__get_loaded_value__("status_id")
+            if old_status_id != self.status_id:
+
+                # Import models avoiding circular imports
+                from core import catalog
+                from services import models as services_models
+
+                # Get current employee service
+                employee_service = services_models.Service.objects.filter(
+                    employee=self.pk
+                ).select_related("agreement").order_by("-id").first()
+
+                old_status = catalog.get(Status, old_status_id)
+                new_status = self.status
                 text = f"\n({now_str}) Estado: {old_status} >>> {new_status}"
                 if self.status_change_details:
                     text += f" - Detalles: {self.status_change_details}"
                 if employee_service:
                     text += f" - Servicio: {employee_service.agreement.company_name}"
                 self.status_history += text
+                if update_fields is not None:
+                    kwargs["update_fields"] = set(update_fields) | {
+                        "status_history", "status_change_details"
+                    }
 
             # Reset status change details
             self.status_change_details = ""
 
+            # Save only the changed columns, never the balance
+            # (only updated by the loans)
+            if update_fields is None:
+                changed_fields = self.get_changed_fields() - {"balance"}
+                if changed_fields:
+                    changed_fields.add("updated_at")
+                kwargs["update_fields"] = changed_fields
+
         # Save the employee
-        super(Employee, self).save(*args, **kwargs)
+        if not is_new:
+            super(Employee, self).save(*args, **kwargs)
+            self.__set_loaded_values__(kwargs["update_fields"])
+            return
+
+        # Retry with a new code if it was taken (e.g. assigned by hand)
+        for attempt in range(settings.EMPLOYEE_CODE_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    super(Employee, self).save(*args, **kwargs)
+                self.__set_loaded_values__()
+                return
+            except IntegrityError:
+                is_last_attempt = attempt == settings.EMPLOYEE_CODE_ATTEMPTS - 1
+                code_taken = Employee.objects.filter(code=self.code).exists()
+                if is_last_attempt or not code_taken:
+                    raise
+                self.code = self.generate_unique_code()
+                if self.qr_image.name:
+                    self.__save_qr_image__()
+
+    @classmethod
+    def update_balances(cls, balances: dict) -> None:
+        """ Add amounts to the employees balances in a single atomic update
+        (balance = balance + amount), without the save side effects
+
+        Args:
+            balances (dict): Amounts to add by employee id
+        """
 
-    def generate_unique_code(self, length=6):
-        characters = string.ascii_uppercase + string.digits
-        while True:
-            code = "".join(random.choices(characters, k=length))
-            if not Employee.objects.filter(code=code).exists():
-                return code
+        balances = {
+            employee_id: float(amount)
+            for employee_id, amount in balances.items()
+            if amount
+        }
+        if not balances:
+            return
+
+        current_balance = Coalesce(F("balance"), Value(0.0))
+        cls.objects.filter(id__in=balances).update(
+            balance=Case(
+                *[
+                    When(id=employee_id, then=current_balance + Value(amount))
+                    for employee_id, amount in balances.items()
+                ],
+                output_field=FloatField(),
+            )
+        )
+
+    def generate_unique_code(self):
+        """Take a free code from the codes pool"""
+        return EmployeeCode.allocate()[0]
+
+    @classmethod
+    def assign_codes(cls, employees: list) -> None:
+        """ Assign codes to new employees of a bulk import
+        (all the codes taken from the pool at once)
+
+        Args:
+            employees (list): Unsaved employees without code
+        """
+
+        employees = [employee for employee in employees if not employee.code]
+        codes = EmployeeCode.allocate(len(employees)) if employees else []
+        for employee, code in zip(employees, codes):
+            employee.code = code
+
+    def __save_qr_image__(self):
+        """Save the QR image of the current code in the storage"""
+        self.qr_image.name = qr.save_qr_file(self.code, self.qr_image.name)
 
     def generate_qr_image(self):
-        """Generate QR image"""
-        host = settings.HOST
-        link = f"{host}/api/qr/{self.code}"
-
-        # Generate QR image
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(link)
-        qr.make(fit=True)
-        
-        # Calculate and create temp qr folder
-        current_path = os.path.dirname(os.path.abspath(__file__))
-        temp_qr_folder = os.path.join(current_path, "temp_qr_images")
-        os.makedirs(temp_qr_folder, exist_ok=True)
-        
-        # Generate qr image
-        qr_path = os.path.join(temp_qr_folder, f"{self.code}.png")
-        
-        # Save qr image
-        img = qr.make_image(fill="black", back_color="white")
-        img.save(qr_path)
-
-        return qr_path
+        """Generate QR image in memory
+
+        Returns:
+            ContentFile: PNG image named "{code}.png"
+        """
+        return qr.get_qr_file(self.code)
+
+    @classmethod
+    def update_qr_image(cls, employee_id: int) -> str:
+        """ Generate again the QR image of an employee and save only
+        the image field (without the save side effects)
+
+        Args:
+            employee_id (int): Id of the employee
+
+        Returns:
+            str: Storage name of the new image
+        """
+
+        employee = cls.objects.only("id", "code", "qr_image").get(pk=employee_id)
+        qr_image_name = qr.save_qr_file(employee.code, employee.qr_image.name)
+        cls.objects.filter(pk=employee_id).update(qr_image=qr_image_name)
+        return qr_image_name
 
     def get_age(self):
         """Calculate employee age"""
@@ -537,12 +828,30 @@ class Loan(models.Model):
     def save(self, *args, **kwargs):
         """Custom save method"""
 
-        # update employee balance when save a wekly loan
-        self.employee.balance += float(self.amount)
-        self.employee.save()
+        with transaction.atomic():
+
+            # Amounts to add to the balances (difference when editing,
+            # or the old amount reverted if the employee changed)
+            balances = {self.employee_id: float(self.amount)}
+            if not self._state.adding:
+                old_employee_id, old_amount = Loan.objects.select_for_update(
+                ).values_list("employee_id", "amount").get(pk=self.pk)
+                balances[old_employee_id] = (
+                    balances.get(old_employee_id, 0) - float(old_amount)
+                )
+
+            # Save the wekly loan
+            super(Loan, self).save(*args, **kwargs)
+
+            # update employees balances
+            Employee.update_balances(balances)
+            self.refresh_employee_balance()
+
+    def refresh_employee_balance(self):
+        """Refresh the balance of the loaded employee instance"""
 
-        # Save the wekly loan
-        super(Loan, self).save(*args, **kwargs)
+        if Loan.employee.is_cached(self):
+            self.employee.refresh_from_db(fields=["balance"])
 
 
 class Ref(models.Model):
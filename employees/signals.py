@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+
+@receiver(post_delete, sender="employees.Loan")
+def revert_loan_balance(sender, instance, **kwargs):
+    """ Revert the loan in the employee balance on every delete
+    (instance delete, admin bulk action or queryset delete) """
+
+    # Import models here to avoid circular imports
+    from employees.models import Employee
+    Employee.update_balances({instance.employee_id: -float(instance.amount)})
+    instance.refresh_employee_balance()
@@ -3,11 +3,13 @@ from time import sleep
 
 import pyzxing
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from utils import test_data
+from utils import qr, test_data
 from employees import models
 from core.test_base.test_admin import TestAdminBase
 from utils.test_data import CURP
@@ -73,6 +75,44 @@ class EmployeeModelTest(TestCase):
 
         self.assertIn(text, self.employee.status_history)
 
+    def test_save_no_changes(self):
+        """Test no queries when the employee didn't change"""
+
+        employee = models.Employee.objects.get(id=self.employee.id)
+
+        with self.assertNumQueries(0):
+            employee.save()
+
+    def test_save_only_changed_fields(self):
+        """Test only the changed columns updated, without status queries"""
+
+        employee = models.Employee.objects.get(id=self.employee.id)
+        employee.name = "Jane"
+
+        with CaptureQueriesContext(connection) as queries:
+            employee.save()
+
+        self.assertEqual(1, len(queries))
+        sql = queries[0]["sql"]
+        self.assertIn('"name"', sql)
+        self.assertIn('"updated_at"', sql)
+        self.assertNotIn('"status_history"', sql)
+        self.assertNotIn('"balance"', sql)
+        employee.refresh_from_db()
+        self.assertEqual("Jane", employee.name)
+
+    def test_save_status_update_fields(self):
+        """Test status history saved with update_fields restricted
+        to the status"""
+
+        employee = models.Employee.objects.get(id=self.employee.id)
+        employee.status = models.Status.objects.get(name="Despido")
+        employee.save(update_fields=["status"])
+
+        employee.refresh_from_db()
+        self.assertEqual("Despido", employee.status.name)
+        self.assertIn("Estado: Activo >>> Despido", employee.status_history)
+
     def test_get_age_already_birthday(self):
         """Test get age when birthday is 20 years ago on
         january 1st"""
@@ -142,6 +182,63 @@ class EmployeeModelTest(TestCase):
 
         self.assertNotEqual(employee_test1.code, employee_test2.code)
 
+    def test_allocate_codes_from_pool(self):
+        """Test codes taken from the pool, refilled by blocks"""
+
+        with self.settings(EMPLOYEE_CODE_BLOCK_SIZE=10):
+            pool_size = models.EmployeeCode.objects.count()
+            codes = models.EmployeeCode.allocate(pool_size + 3)
+
+            # Unique codes, not in the pool anymore
+            self.assertEqual(pool_size + 3, len(set(codes)))
+            self.assertEqual(7, models.EmployeeCode.objects.count())
+            self.assertFalse(
+                models.EmployeeCode.objects.filter(code__in=codes).exists()
+            )
+
+            # Next codes from the pool (savepoint, read, delete, release)
+            with self.assertNumQueries(4):
+                next_codes = models.EmployeeCode.allocate(5)
+            self.assertFalse(set(codes) & set(next_codes))
+
+    def test_reserve_block_skip_used_codes(self):
+        """Test codes used by old employees skipped in the new blocks"""
+
+        counter = models.EmployeeCodeCounter.objects.get(id=1)
+        used_code = models.EmployeeCode.get_code(counter.next_index)
+        models.Employee.objects.filter(id=self.employee.id).update(code=used_code)
+
+        codes = models.EmployeeCode.reserve_block(3)
+
+        self.assertNotIn(used_code, codes)
+        self.assertGreaterEqual(len(codes), 3)
+
+    def test_assign_codes(self):
+        """Test codes assigned to a bulk import at once"""
+
+        employees = [models.Employee(), models.Employee(), models.Employee()]
+        models.Employee.assign_codes(employees)
+
+        codes = [employee.code for employee in employees]
+        self.assertEqual(3, len(set(codes)))
+        self.assertTrue(all(len(code) == 6 for code in codes))
+
+    def test_save_retry_taken_code(self):
+        """Test new code when the assigned code is already taken"""
+
+        # Pool with a code already used
+        models.EmployeeCode.objects.all().delete()
+        models.EmployeeCode.objects.create(code=self.employee.code)
+
+        employee_test = test_data.create_employee(
+            curp=f"{CURP[:-1]}1", ine="INE1", phone="2222222222"
+        )
+
+        self.assertNotEqual(self.employee.code, employee_test.code)
+        self.assertEqual(
+            1, models.Employee.objects.filter(code=employee_test.code).count()
+        )
+
     def test_generate_qr_code(self):
         """Test generate qr code"""
 
@@ -166,6 +263,80 @@ class EmployeeModelTest(TestCase):
 
         self.assertIn(expected_qr_content, actual_qr_content)
 
+    def test_generate_qr_in_memory(self):
+        """Test qr image rendered in memory (no temp files)"""
+
+        employee_test = test_data.create_employee()
+
+        # Stored image is the in-memory render
+        with employee_test.qr_image.open("rb") as f:
+            stored_content = f.read()
+        self.assertTrue(stored_content.startswith(b"\x89PNG"))
+        self.assertEqual(stored_content, qr.render_qr_png(employee_test.code))
+
+        # No temp folder next to the source code
+        temp_qr_folder = os.path.join(
+            os.path.dirname(os.path.abspath(models.__file__)), "temp_qr_images"
+        )
+        self.assertFalse(os.path.exists(temp_qr_folder))
+
+    @override_settings(QR_IMAGE_MODE="deferred")
+    def test_generate_qr_deferred(self):
+        """Test qr image generated after the commit, out of the save"""
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            employee_test = test_data.create_employee(
+                curp=f"{CURP[:-1]}1", ine="INE1", phone="2222222222"
+            )
+
+        # Saved without image, generation registered after the commit
+        self.assertEqual("", employee_test.qr_image.name)
+        self.assertEqual(1, len(callbacks))
+
+        # Background job saves only the image
+        qr_image_name = models.Employee.update_qr_image(employee_test.id)
+        employee_test.refresh_from_db()
+        self.assertEqual(qr_image_name, employee_test.qr_image.name)
+        self.assertTrue(os.path.exists(employee_test.qr_image.path))
+
+    def test_generate_qr_background_error(self):
+        """Test background qr errors logged and kept in the future"""
+
+        def upload_qr_image(code):
+            raise OSError(f"Storage unavailable ({code})")
+
+        with self.assertLogs("utils.qr", level="ERROR") as logs:
+            future = qr.run_in_background(upload_qr_image, "ABC123")
+            error = future.exception(timeout=10)
+
+        self.assertIsInstance(error, OSError)
+        self.assertIn("upload_qr_image('ABC123',)", logs.output[0])
+        self.assertIn("Storage unavailable", logs.output[0])
+
+    def test_regenerate_qr_codes(self):
+        """Test regenerate qr images of selected employees"""
+
+        employee_test = test_data.create_employee(
+            curp=f"{CURP[:-1]}1", ine="INE1", phone="2222222222"
+        )
+        with self.settings(HOST="https://new-host.com"):
+            call_command(
+                "regenerate_qr_codes", "--ids", str(employee_test.id),
+                "--workers", "1",
+            )
+
+            # New image replaces the old one
+            employee_test.refresh_from_db()
+            with employee_test.qr_image.open("rb") as f:
+                self.assertEqual(
+                    f.read(), qr.render_qr_png(employee_test.code)
+                )
+        self.assertTrue(os.path.exists(employee_test.qr_image.path))
+
+        # Other employees keep their image
+        self.employee.refresh_from_db()
+        self.assertTrue(os.path.exists(self.employee.qr_image.path))
+
 
 class LoanModelTest(TestCase):
     """Test custom methods in Loan Model"""
@@ -196,6 +367,85 @@ class LoanModelTest(TestCase):
 
         self.assertEqual(-100, self.employee.balance)
 
+    def test_save_update_balance_edit(self):
+        """Update employee balance with the difference when edit a loan"""
+
+        loan = models.Loan.objects.create(
+            employee=self.employee,
+            amount=-100,
+        )
+        loan.amount = -150
+        loan.save()
+
+        self.employee.refresh_from_db()
+        self.assertEqual(-150, self.employee.balance)
+
+    def test_delete_update_balance(self):
+        """Revert employee balance when delete a loan"""
+
+        loan = models.Loan.objects.create(
+            employee=self.employee,
+            amount=-100,
+        )
+        loan.delete()
+
+        self.employee.refresh_from_db()
+        self.assertEqual(0, self.employee.balance)
+
+    def test_queryset_delete_update_balance(self):
+        """Revert employee balance when delete loans in bulk
+        (admin delete selected action)"""
+
+        for amount in [-100, -50]:
+            models.Loan.objects.create(employee=self.employee, amount=amount)
+        models.Loan.objects.filter(employee=self.employee).delete()
+
+        self.employee.refresh_from_db()
+        self.assertEqual(0, self.employee.balance)
+
+    def test_save_change_employee_update_balances(self):
+        """Move the loan amount between balances when change the employee"""
+
+        other_employee = test_data.create_employee(
+            curp=f"{CURP[:-1]}1", ine="INE1", phone="2222222222"
+        )
+        loan = models.Loan.objects.create(employee=self.employee, amount=-100)
+        loan.employee = other_employee
+        loan.amount = -150
+        loan.save()
+
+        self.employee.refresh_from_db()
+        other_employee.refresh_from_db()
+        self.assertEqual(0, self.employee.balance)
+        self.assertEqual(-150, other_employee.balance)
+
+    def test_save_keep_balance_stale_employee(self):
+        """Keep the loans balance when save an outdated employee instance"""
+
+        stale_employee = models.Employee.objects.get(id=self.employee.id)
+        models.Loan.objects.create(
+            employee=self.employee,
+            amount=-100,
+        )
+        stale_employee.name = "Nuevo nombre"
+        stale_employee.save()
+
+        self.employee.refresh_from_db()
+        self.assertEqual(-100, self.employee.balance)
+        self.assertEqual("Nuevo nombre", self.employee.name)
+
+    def test_rebuild_balances(self):
+        """Recalculate employee balance from the loans"""
+
+        models.Loan.objects.create(employee=self.employee, amount=-100)
+        models.Loan.objects.create(employee=self.employee, amount=40)
+        models.Employee.objects.filter(id=self.employee.id).update(balance=0)
+
+        call_command("rebuild_balances")
+
+        self.employee.refresh_from_db()
+        self.assertEqual(-60, self.employee.balance)
+
 
 class EmployeeAdminTest(TestCase):
     """Test custom features in admin/employee"""
@@ -765,3 +1015,82 @@ class ApiValidateCurpViewTestCase(TestCase):
         self.assertEqual(json_data["status"], "success")
         self.assertEqual(json_data["message"], "CURP válido")
         self.assertEqual(json_data["data"], {})
+
+
+class QrImageViewTestCase(TestCase):
+    """Test custom view to render the employee QR image"""
+
+    def setUp(self):
+
+        # Create initial data
+        call_command("apps_loaddata")
+        self.admin_user, self.admin_pass, self.admin = test_data.create_admin_user()
+        self.employee = test_data.create_employee()
+        self.endpoint = f"/employees/qr/{self.employee.code}"
+
+    def test_no_logged(self):
+        """Validate redirect when user is not logged"""
+
+        response = self.client.get(f"{self.endpoint}.png")
+
+        self.assertEqual(302, response.status_code)
+
+    def test_png(self):
+        """Validate png image rendered with cache headers"""
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        response = self.client.get(f"{self.endpoint}.png")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("image/png", response["Content-Type"])
+        self.assertEqual(qr.render_qr_png(self.employee.code), response.content)
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertIn("max-age=", response["Cache-Control"])
+
+    def test_svg(self):
+        """Validate svg image rendered"""
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        response = self.client.get(f"{self.endpoint}.svg")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("image/svg+xml", response["Content-Type"])
+        self.assertIn(b"<svg", response.content)
+
+    def test_not_modified(self):
+        """Validate empty response when the browser has the same image"""
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        etag = self.client.get(f"{self.endpoint}.png")["ETag"]
+        response = self.client.get(
+            f"{self.endpoint}.png", HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b"", response.content)
+        self.assertEqual(etag, response["ETag"])
+
+    def test_host_change(self):
+        """Validate new image and etag when the host changes"""
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+        etag = self.client.get(f"{self.endpoint}.png")["ETag"]
+        with self.settings(HOST="https://new-host.com"):
+            response = self.client.get(
+                f"{self.endpoint}.png", HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_invalid_code(self):
+        """Validate not found when the code or format are invalid"""
+
+        self.client.login(username=self.admin_user, password=self.admin_pass)
+
+        self.assertEqual(
+            404, self.client.get("/employees/qr/XXXXXXX.png").status_code
+        )
+        self.assertEqual(
+            404, self.client.get(f"{self.endpoint}.gif").status_code
+        )
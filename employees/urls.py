@@ -12,5 +12,10 @@ urlpatterns = [
         'api/validate-curp/',
         views.ApiValidateCurpView.as_view(),
         name='api-validate-curp'
+    ),
+    path(
+        'qr/<str:code>.<str:image_format>',
+        views.QrImageView.as_view(),
+        name='employee-qr'
     )
 ]
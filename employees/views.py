@@ -4,11 +4,18 @@ import json
 from django.forms.models import model_to_dict
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import (
+    Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+)
+from django.urls import reverse
+from django.utils.http import parse_etags
 from django.views import View
 
+from core import catalog
 from employees import models
 from services import models as services_models
+from utils import qr
 from utils.media import get_media_url
 
 
@@ -79,7 +86,7 @@ class ReportEmployeeDetailsView(
         context['relatives'] = relatives_data
 
         # add education options and selected
-        education_options = models.Education.objects.all()
+        education_options = catalog.get_all(models.Education)
         education_options_names = []
         for option in education_options:
             education_options_names.append(option.name)
@@ -95,6 +102,9 @@ class ReportEmployeeDetailsView(
         if employee.photo:
             context["photo"] = get_media_url(employee.photo)
 
+        # add qr image (rendered by the endpoint)
+        context["qr"] = reverse("employee-qr", args=[employee.code, "svg"])
+
         # Auto print
         context["auto_print"] = True
 
@@ -197,3 +207,36 @@ class ApiValidateCurpView(
             "message": "CURP válido",
             "data": {}
         })
+
+
+class QrImageView(
+    LoginRequiredMixin,
+    PermissionRequiredMixin,
+    View,
+):
+    """ Render the QR image of an employee code on demand (PNG or SVG),
+    without reading the stored image """
+
+    permission_required = 'employees.view_employee'
+
+    def get(self, request, code, image_format, *args, **kwargs):
+
+        # Validate format and employee code
+        if image_format not in qr.CONTENT_TYPES:
+            raise Http404("Formato de imagen no válido")
+        if not models.Employee.objects.filter(code=code).exists():
+            raise Http404("No se encontró un empleado con el código")
+
+        # Render image (cached in memory) and validate browser cache
+        content, etag = qr.render_qr(qr.get_qr_link(code), image_format)
+        cache_control = f"private, max-age={settings.QR_IMAGE_MAX_AGE}"
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                content, content_type=qr.CONTENT_TYPES[image_format]
+            )
+        response["ETag"] = etag
+        response["Cache-Control"] = cache_control
+        return response
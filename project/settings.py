@@ -23,6 +23,19 @@ TEST_HEADLESS = os.getenv('TEST_HEADLESS', 'False') == 'True'
 EXTRA_HOUR_RATE = float(os.getenv('EXTRA_HOUR_RATE', 0))
 PENALTY_NO_ATTENDANCE = float(os.getenv('PENALTY_NO_ATTENDANCE', 0))
 LOCALE_VALUE = os.getenv('LOCALE_VALUE')
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+CATALOG_CHECK_INTERVAL = float(os.getenv('CATALOG_CHECK_INTERVAL', 5))
+DISBURSEMENT_LAYOUT = os.getenv('DISBURSEMENT_LAYOUT', 'csv')
+QR_CHECKIN_CACHE_TIMEOUT = int(os.getenv('QR_CHECKIN_CACHE_TIMEOUT', 3600))
+QR_CHECKIN_MODE = os.getenv('QR_CHECKIN_MODE', 'sync')
+QR_IMAGE_MODE = os.getenv('QR_IMAGE_MODE', 'sync')
+QR_IMAGE_THREADS = int(os.getenv('QR_IMAGE_THREADS', 2))
+QR_IMAGE_MAX_AGE = int(os.getenv('QR_IMAGE_MAX_AGE', 60 * 60 * 24 * 30))
+EMPLOYEE_CODE_BLOCK_SIZE = int(os.getenv('EMPLOYEE_CODE_BLOCK_SIZE', 100))
+EMPLOYEE_CODE_ATTEMPTS = int(os.getenv('EMPLOYEE_CODE_ATTEMPTS', 3))
 
 print(f"DEBUG: {DEBUG}")
 print(f"STORAGE_AWS: {STORAGE_AWS}")
@@ -119,6 +132,17 @@ else:
         }
     }
 
+# Cache
+# Use a shared backend (redis, memcached or database) in production,
+# so all the workers see the catalogs versions (with a process-local
+# backend the catalogs are reloaded on each request)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -239,6 +263,17 @@ JAZZMIN_SETTINGS = {
         #     "icon": "fas fa-comments",
         #     "permissions": ["books.view_book"]
         # }]
+        "assistance": [{
+            "name": "Servicios sin cobertura",
+            "url": "admin:assistance_coverage_gaps",
+            "icon": "fas fa-user-times",
+            "permissions": ["assistance.view_assistance"]
+        }, {
+            "name": "Reporte de faltas",
+            "url": "admin:assistance_attendance_report",
+            "icon": "fas fa-chart-bar",
+            "permissions": ["assistance.view_attendanceweekrollup"]
+        }]
     },
 
     # Custom icons for side menu apps/models
@@ -5,6 +5,7 @@ from django.urls import include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from assistance import urls as assistance_urls
 from employees import urls as employees_urls
 
 urlpatterns = [
@@ -23,6 +24,7 @@ urlpatterns = [
     # Apps
     path('admin/', admin.site.urls),
     path('employees/', include(employees_urls)),
+    path('api/', include(assistance_urls)),
 ]
 
 if not settings.STORAGE_AWS:
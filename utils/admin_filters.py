@@ -1,7 +1,24 @@
 from django.contrib import admin
 from django.utils import timezone
 
-from utils.dates import get_current_week
+from utils.dates import get_current_week, get_week_key, get_year_week_keys
+
+
+def get_selected_year(request) -> int:
+    """ Returns the year selected in the year filter
+    (default: year of the current payroll week)
+
+    Args:
+        request (HttpRequest): Admin request
+
+    Returns:
+        int: Selected year
+    """
+    
+    year = request.GET.get(YearFilter.parameter_name)
+    if year:
+        return int(year)
+    return get_week_key() // 100
 
 
 class TodayDateFilter(admin.SimpleListFilter):
@@ -47,14 +64,23 @@ class WeekNumberFilter(admin.SimpleListFilter):
     def lookups(self, request, model_admin):
         """ Defines the available options in the filter """
         
-        # Get field name
+        # Get field names
         field_name = getattr(model_admin, "week_filter_field", "week_number")
         WeekNumberFilter.field_name = field_name
+        self.week_key_field = getattr(model_admin, "week_key_filter_field", None)
         
         # Get all distinct week numbers from the dataset
-        week_numbers = model_admin.get_queryset(
-            request
-        ).values(WeekNumberFilter.field_name).distinct()
+        # (only the selected year if the week key is available)
+        queryset = model_admin.get_queryset(request)
+        if self.week_key_field:
+            first_key, next_year_key = get_year_week_keys(
+                get_selected_year(request)
+            )
+            queryset = queryset.filter(**{
+                f"{self.week_key_field}__gte": first_key,
+                f"{self.week_key_field}__lt": next_year_key,
+            })
+        week_numbers = queryset.values(WeekNumberFilter.field_name).distinct()
         current_week = get_current_week()
         
         # Generate the options
@@ -78,8 +104,12 @@ class WeekNumberFilter(admin.SimpleListFilter):
         return options
 
     def queryset(self, request, queryset):
-        """ Filters the queryset based on the selected value """
+        """ Filters the queryset based on the selected value
+        (by week key in the selected year when available) """
         if self.value():
+            if self.week_key_field:
+                week_key = get_selected_year(request) * 100 + int(self.value())
+                return queryset.filter(**{self.week_key_field: week_key})
             return queryset.filter(**{WeekNumberFilter.field_name: self.value()})
         return queryset
 
@@ -99,15 +129,23 @@ class YearFilter(admin.SimpleListFilter):
     def lookups(self, request, model_admin):
         """ Defines the available options in the filter """
         
-        # Get field name
+        # Get field names
         field_name = getattr(model_admin, "year_filter_field", "start_date")
         YearFilter.field_name = field_name
+        self.week_key_field = getattr(model_admin, "week_key_filter_field", None)
         
-        years = model_admin.get_queryset(request).values(
-            f"{YearFilter.field_name}__year"
-        ).distinct()
-        years_values = [year[f"{YearFilter.field_name}__year"]
-                        for year in years]
+        if self.week_key_field:
+            # Years from the week keys (index only)
+            week_keys = model_admin.get_queryset(request).values_list(
+                self.week_key_field, flat=True
+            ).distinct()
+            years_values = [week_key // 100 for week_key in week_keys]
+        else:
+            years = model_admin.get_queryset(request).values(
+                f"{YearFilter.field_name}__year"
+            ).distinct()
+            years_values = [year[f"{YearFilter.field_name}__year"]
+                            for year in years]
         years_unique = list(set(years_values))
         options = []
         for year in years_unique:
@@ -117,12 +155,47 @@ class YearFilter(admin.SimpleListFilter):
     def queryset(self, request, queryset):
         """ Filters the queryset based on the selected value """
         if self.value():
+            if self.week_key_field:
+                first_key, next_year_key = get_year_week_keys(int(self.value()))
+                return queryset.filter(**{
+                    f"{self.week_key_field}__gte": first_key,
+                    f"{self.week_key_field}__lt": next_year_key,
+                })
             return queryset.filter(**{f"{YearFilter.field_name}__year": self.value()})
         return queryset
 
     def value(self):
-        """ Sets the default value to the current year """
+        """ Sets the default value to the current year
+        (year of the current payroll week if the week key is available) """
         value = super().value()
         if value is None:
+            if getattr(self, "week_key_field", None):
+                return str(get_week_key() // 100)
             return str(timezone.now().year)
-        return value
\ No newline at end of file
+        return value
+
+
+class TotalFilter(admin.SimpleListFilter):
+    """ Custom filter for payments with and without amount to pay """
+    title = "A pagar"
+    parameter_name = "total"
+    field_name = ""
+
+    def lookups(self, request, model_admin):
+        """ Defines the available options in the filter """
+        
+        # Get field name
+        self.field_name = getattr(model_admin, "total_filter_field", "total")
+        
+        return [
+            ("positive", "Con pago"),
+            ("zero", "Sin pago"),
+        ]
+
+    def queryset(self, request, queryset):
+        """ Filters the queryset based on the selected value """
+        if self.value() == "positive":
+            return queryset.filter(**{f"{self.field_name}__gt": 0})
+        if self.value() == "zero":
+            return queryset.filter(**{f"{self.field_name}__lte": 0})
+        return queryset
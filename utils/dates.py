@@ -1,7 +1,6 @@
 from django.utils import timezone
-import logging
 
-logger = logging.getLogger(__name__)
+from utils import payroll_calendar
 
 
 def get_week_day(date: timezone.datetime, lang: str = "es") -> str:
@@ -14,61 +13,49 @@ def get_week_day(date: timezone.datetime, lang: str = "es") -> str:
     Returns:
         str: The week day name in the selected language
     """
-    week_days = {
-        "es": [
-            'lunes',
-            'martes',
-            'miércoles',
-            'jueves',
-            'viernes',
-            'sábado',
-            'domingo'
-        ],
-        "en": [
-            'monday',
-            'tuesday',
-            'wednesday',
-            'thursday',
-            'friday',
-            'saturday',
-            'sunday'
-        ]
-    }
-    week_days_lang = week_days[lang]
-    time_zone = timezone.get_current_timezone()
-    try:
-        date = date.astimezone(time_zone)
-    except Exception:
-        pass
-    return week_days_lang[date.weekday()]
+    
+    calendar_day = payroll_calendar.get_day(date)
+    if lang == "es":
+        return calendar_day.week_day_es
+    return calendar_day.week_day
 
 
-def get_current_week(date: timezone.datetime = timezone.now()) -> int:
+def get_current_week(date: timezone.datetime = None) -> int:
     """ Returns the current week number
         using Thursday as the first day of the week
     
     Args:
-        date (timezone.datetime): The date to get the week number
+        date (timezone.datetime): The date to get the week number (default: now)
         
     Returns:
         int: The week number
     """
     
-    time_zone = timezone.get_current_timezone()
-    logger.debug(f"Time zone: {time_zone}")
-    try:
-        date = date.astimezone(time_zone)
-        logger.debug(f"Date: {date}")
-    except Exception as e:
-        logger.debug(f"Error: {e}")
-        pass
+    return payroll_calendar.get_day(date).week_number
+
+
+def get_week_key(date: timezone.datetime = None) -> int:
+    """ Returns the year-qualified payroll week key (year * 100 + week number)
+        using Thursday as the first day of the week
+    
+    Args:
+        date (timezone.datetime): The date to get the week key (default: now)
+        
+    Returns:
+        int: The week key (e.g. 202452)
+    """
+    
+    return payroll_calendar.get_day(date).week_key
+
+
+def get_year_week_keys(year: int) -> tuple:
+    """ Returns the range of week keys of a year
+    
+    Args:
+        year (int): The year of the weeks
+        
+    Returns:
+        tuple: First week key and the first week key of the next year
+    """
     
-    # Get last Thursday if today is not Thursday
-    week_day = date.weekday()
-    logger.debug(f"Week day: {week_day}")
-    if week_day < 3:
-        date = date - timezone.timedelta(
-            days=week_day + 3
-        )
-        logger.debug(f"New date: {date}")
-    return date.isocalendar()[1]
\ No newline at end of file
+    return (year * 100, (year + 1) * 100)
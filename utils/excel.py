@@ -1,40 +1,70 @@
-from django.http import HttpResponse
+import pickle
+import tempfile
+
+from django.http import FileResponse
 
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Font, PatternFill
 from openpyxl.utils import get_column_letter
 
 
-def get_excel_response(queryset, sheet_name_prefix):
-    """ Export a queryset to an Excel file with a single sheet
-    
+def get_excel_response(queryset, sheet_name_prefix, chunk_size=500):
+    """ Export a queryset to an Excel file with a single sheet,
+    streaming the rows (write-only workbook) with constant memory
+
     Args:
         queryset (QuerySet): The queryset to export
         sheet_name (str): The name of the sheet
+        chunk_size (int): Rows loaded from the database in each query
+
+    Returns:
+        FileResponse: Excel file response (backed by a temporary file)
     """
 
-    # Create file and sheet
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    week_num = queryset.first().week_number
-    worksheet.title = f"{sheet_name_prefix} {week_num}"
+    # Header and sheet title from the first row
+    first_object = queryset.first()
+    header = first_object.get_data_header()
+    week_num = first_object.week_number
+
+    # Save the rows in a temporary file, calculating the columns widths
+    columns_widths = [len(str(value)) if value else 0 for value in header]
+    rows_file = tempfile.TemporaryFile()
+    for object in queryset.iterator(chunk_size=chunk_size):
+        data = object.get_data_list()
+        is_highlighted = object.get_is_highlighted()
+        pickle.dump((data, is_highlighted), rows_file)
+        for col_index, value in enumerate(data):
+            if value:
+                columns_widths[col_index] = max(
+                    columns_widths[col_index], len(str(value))
+                )
+    rows_file.seek(0)
 
-    # Save sales header
-    header = queryset.first().get_data_header()
-    worksheet.append(header)
+    # Create file and sheet (columns widths must be set before the rows)
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet(f"{sheet_name_prefix} {week_num}")
+    for col_num, width in enumerate(columns_widths, start=1):
+        column_letter = get_column_letter(col_num)
+        worksheet.column_dimensions[column_letter].width = width + 4
 
-    # Apply header styles (dark grey background, white bold text, larger font size)
+    # Save header with styles
+    # (dark grey background, white bold text, larger font size)
     header_fill = PatternFill(
         start_color="404040", end_color="404040", fill_type="solid"
     )
     header_font = Font(color="FFFFFF", bold=True, size=12)
-    # Assuming header is row 1
-    for col_num, cell in enumerate(worksheet[1], start=1):
+    header_alignment = Alignment(
+        horizontal="center", vertical="center", wrap_text=True
+    )
+    header_cells = []
+    for value in header:
+        cell = WriteOnlyCell(worksheet, value=value)
         cell.fill = header_fill
         cell.font = header_font
-        cell.alignment = Alignment(
-            horizontal="center", vertical="center", wrap_text=True
-        )
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    worksheet.append(header_cells)
 
     # Append data rows and alternate row colors (white and light grey)
     row_fill_white = PatternFill(
@@ -46,41 +76,41 @@ def get_excel_response(queryset, sheet_name_prefix):
     row_fill_yellow = PatternFill(
         start_color="FFFF00", end_color="FFFF00", fill_type="solid"
     )
+    row_alignment = Alignment(wrap_text=True)
 
     # Start at row 2 for data
-    for row_num, object in enumerate(queryset, start=2):
-        data = object.get_data_list()
-        is_highlighted = object.get_is_highlighted()
-        worksheet.append(data)
+    row_num = 2
+    while True:
+        try:
+            data, is_highlighted = pickle.load(rows_file)
+        except EOFError:
+            break
 
         # Apply alternating row colors
         if is_highlighted:
             fill = row_fill_yellow
         else:
             fill = row_fill_white if row_num % 2 == 0 else row_fill_grey
-            
-        for cell in worksheet[row_num]:
+
+        row_cells = []
+        for value in data:
+            cell = WriteOnlyCell(worksheet, value=value)
             cell.fill = fill
-            cell.alignment = Alignment(wrap_text=True)
+            cell.alignment = row_alignment
+            row_cells.append(cell)
+        worksheet.append(row_cells)
+        row_num += 1
+    rows_file.close()
 
-    # Auto-adjust column widths
-    for col_num in range(1, len(header) + 1):
-        column_letter = get_column_letter(col_num)
-        max_length = 0
-        for cell in worksheet[column_letter]:
-            try:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            except Exception:
-                pass
-        adjusted_width = max_length + 4  # Add some padding
-        worksheet.column_dimensions[column_letter].width = adjusted_width
+    # Save the workbook in a temporary file (deleted when the response ends)
+    excel_file = tempfile.TemporaryFile()
+    workbook.save(excel_file)
+    excel_file.seek(0)
 
     # Set up response
     content_type = "application/vnd.openxmlformats-officedocument"
     content_type += ".spreadsheetml.sheet"
-    response = HttpResponse(content_type=content_type)
+    response = FileResponse(excel_file, content_type=content_type)
     response["Content-Disposition"] = "attachment; filename=export.xlsx"
-    workbook.save(response)
 
     return response
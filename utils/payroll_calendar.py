@@ -0,0 +1,144 @@
+from datetime import date as Date, datetime as DateTime, timedelta
+from typing import NamedTuple
+
+from django.utils import timezone
+
+# Week days names by language (index: date.weekday())
+WEEK_DAYS = {
+    "es": [
+        'lunes',
+        'martes',
+        'miércoles',
+        'jueves',
+        'viernes',
+        'sábado',
+        'domingo'
+    ],
+    "en": [
+        'monday',
+        'tuesday',
+        'wednesday',
+        'thursday',
+        'friday',
+        'saturday',
+        'sunday'
+    ]
+}
+
+# Payroll weeks start on Thursday
+WEEK_START_DAY = 3
+
+# Years loaded at once around the current year
+YEARS_BEFORE = 5
+YEARS_AFTER = 2
+
+
+class CalendarDay(NamedTuple):
+    """ Payroll calendar data of a single date """
+
+    date: Date
+    week_number: int
+    year: int
+    week_key: int
+    week_start: Date
+    week_end: Date
+    week_day: str
+    week_day_es: str
+
+
+# Calendar days of this process, by date
+days = {}
+
+
+def build_day(date: Date) -> CalendarDay:
+    """ Calculate the payroll calendar data of a date
+
+    Args:
+        date (Date): Date to calculate
+
+    Returns:
+        CalendarDay: Payroll week, year, week start / end and week day names
+    """
+
+    week_start = date - timedelta(days=(date.weekday() - WEEK_START_DAY) % 7)
+    year, week_number, _ = week_start.isocalendar()
+    return CalendarDay(
+        date=date,
+        week_number=week_number,
+        year=year,
+        week_key=year * 100 + week_number,
+        week_start=week_start,
+        week_end=week_start + timedelta(days=6),
+        week_day=WEEK_DAYS["en"][date.weekday()],
+        week_day_es=WEEK_DAYS["es"][date.weekday()],
+    )
+
+
+def build_days(start_date: Date, end_date: Date) -> list:
+    """ Calculate the calendar days of a dates range
+
+    Args:
+        start_date (Date): First date
+        end_date (Date): Last date (included)
+
+    Returns:
+        list: Calendar days of the range
+    """
+
+    return [
+        build_day(start_date + timedelta(days=offset))
+        for offset in range((end_date - start_date).days + 1)
+    ]
+
+
+def load():
+    """ Load the calendar days around the current year in this process """
+
+    current_year = timezone.localdate().year
+    start_date = Date(current_year - YEARS_BEFORE, 1, 1)
+    end_date = Date(current_year + YEARS_AFTER, 12, 31)
+    for calendar_day in build_days(start_date, end_date):
+        days[calendar_day.date] = calendar_day
+
+
+def get_day(date: Date = None) -> CalendarDay:
+    """ Return the calendar data of a date (dict lookup)
+
+    Args:
+        date (Date): Date or datetime (converted to the current time zone).
+            Default: today
+
+    Returns:
+        CalendarDay: Calendar data of the date
+    """
+
+    if date is None:
+        date = timezone.localdate()
+    elif isinstance(date, DateTime):
+        if timezone.is_aware(date):
+            date = timezone.localtime(date)
+        date = date.date()
+
+    if not days:
+        load()
+
+    # Dates out of the loaded range are calculated once
+    calendar_day = days.get(date)
+    if calendar_day is None:
+        calendar_day = build_day(date)
+        days[date] = calendar_day
+    return calendar_day
+
+
+def get_week_dates(week_key: int) -> tuple:
+    """ Return the first and last dates of a payroll week
+
+    Args:
+        week_key (int): Week key (year * 100 + week number)
+
+    Returns:
+        tuple: Week start (Thursday) and week end (Wednesday)
+    """
+
+    week_start = Date.fromisocalendar(week_key // 100, week_key % 100, 4)
+    return (week_start, week_start + timedelta(days=6))
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Background threads of the deferred QR images (created on first use)
+executor = None
+
+# Rendered images kept in memory by each process
+RENDER_CACHE_SIZE = 4096
+
+# Content type of each image format
+CONTENT_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def get_qr_link(code: str) -> str:
+    """ Return the check-in link encoded in the QR of an employee code
+
+    Args:
+        code (str): Employee code
+
+    Returns:
+        str: Link of the QR check-in endpoint
+    """
+
+    return f"{settings.HOST}/api/qr/{code}"
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_qr(link: str, image_format: str = "png") -> tuple:
+    """ Render the QR image of a link in memory (cached by link and format)
+
+    Args:
+        link (str): Link encoded in the QR
+        image_format (str): "png" or "svg"
+
+    Returns:
+        tuple: Image content (bytes) and its strong ETag
+    """
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(link)
+    qr.make(fit=True)
+
+    buffer = BytesIO()
+    if image_format == "svg":
+        img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        img.save(buffer)
+    else:
+        img = qr.make_image(fill="black", back_color="white")
+        img.save(buffer, format="PNG")
+    content = buffer.getvalue()
+    return content, f'"{hashlib.sha256(content).hexdigest()}"'
+
+
+def render_qr_png(code: str) -> bytes:
+    """ Render the QR image of an employee code in memory
+
+    Args:
+        code (str): Employee code
+
+    Returns:
+        bytes: PNG image content
+    """
+
+    return render_qr(get_qr_link(code), "png")[0]
+
+
+def get_qr_file(code: str) -> ContentFile:
+    """ Return the QR image of an employee code as a file for the storage
+    (no temporary files)
+
+    Args:
+        code (str): Employee code
+
+    Returns:
+        ContentFile: PNG image named "{code}.png"
+    """
+
+    return ContentFile(render_qr_png(code), name=f"{code}.png")
+
+
+def save_qr_file(code: str, old_name: str = "", content: bytes = None) -> str:
+    """ Upload the QR image of an employee code to the storage,
+    replacing the previous image
+
+    Args:
+        code (str): Employee code
+        old_name (str): Storage name of the previous image (deleted)
+        content (bytes): PNG image already rendered (default: render it)
+
+    Returns:
+        str: Storage name of the new image
+    """
+
+    if old_name:
+        default_storage.delete(old_name)
+    if content is None:
+        content = render_qr_png(code)
+    return default_storage.save(f"{code}.png", ContentFile(content))
+
+
+def run_in_background(function, *args) -> Future:
+    """ Run a function in the QR background threads, closing the
+    database connections of the thread when it ends (errors are logged
+    and kept in the returned future)
+
+    Args:
+        function (callable): Function to run
+        *args: Function arguments
+
+    Returns:
+        Future: Result or exception of the function
+    """
+
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=settings.QR_IMAGE_THREADS,
+            thread_name_prefix="qr_image",
+        )
+
+    def task():
+        try:
+            return function(*args)
+        except Exception:
+            logger.exception(
+                "Error generating QR image: %s%s",
+                getattr(function, "__name__", function), args,
+            )
+            raise
+        finally:
+            connections.close_all()
+
+    return executor.submit(task)